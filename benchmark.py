@@ -0,0 +1,401 @@
+"""Benchmarks of the game states, simulators and genome evaluation.
+
+Every case reports its throughput, latency percentiles and the peak memory
+traced while it runs, as JSON::
+
+    python benchmark.py                      # every case, printed to stdout
+    python benchmark.py --quick -o out.json  # fewer operations, to a file
+    python benchmark.py --cases rubik        # cases whose name contains rubik
+
+Inputs are generated from fixed seeds, so two runs on the same tree do the
+same work and their results can be compared.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import neat
+import numpy as np
+
+import neattetris.gamestates
+import neattetris.simulator
+
+
+WIDTH = 10
+HEIGHT = 20
+SEED = 0
+MAX_PIECES = 1000
+ENGINES = {
+    'tetris': neattetris.gamestates.GameStateTetris,
+    'tetris_bitboard': neattetris.gamestates.GameStateTetrisBitboard,
+}
+
+
+class RandomNet:
+    """Fixed random linear network, so episodes only measure the game logic
+    and are the same for every run.
+    """
+    def __init__(self, n_inputs: int, n_outputs: int, seed: int = SEED):
+        self.weights = np.random.default_rng(seed).normal(size=(n_inputs, n_outputs))
+
+    def activate(self, inputs: np.ndarray) -> np.ndarray:
+        return np.tanh(np.asarray(inputs) @ self.weights)
+
+
+def _summary(latencies: List[int], ops_per_call: int = 1) -> Dict[str, float]:
+    """Throughput and latency percentiles of a list of timed calls.
+
+    Args:
+        latencies (List[int]): Nanoseconds of every call.
+        ops_per_call (int): Operations performed by each call.
+
+    Returns:
+        Dict[str, float]: Operations, seconds, ops/sec and latency
+            percentiles (microseconds per call).
+    """
+    latencies = np.array(latencies, dtype=float)
+    seconds = latencies.sum() / 1e9
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) / 1e3
+    return {
+        'ops': len(latencies) * ops_per_call,
+        'seconds': seconds,
+        'ops_per_sec': len(latencies) * ops_per_call / seconds if seconds else float('inf'),
+        'latency_us': {'p50': p50, 'p90': p90, 'p99': p99, 'max': latencies.max() / 1e3},
+    }
+
+
+def _time_calls(operation: Callable, ops: int, setup: Optional[Callable] = None) -> List[int]:
+    """Times an operation, excluding its setup.
+
+    Args:
+        operation (Callable): Function receiving the value returned by the
+            setup, or None.
+        ops (int): Number of calls.
+        setup (Optional[Callable]): Function called before every call.
+
+    Returns:
+        List[int]: Nanoseconds of every call.
+    """
+    latencies = []
+    for _ in range(ops):
+        context = setup() if setup is not None else None
+        start = time.perf_counter_ns()
+        operation(context)
+        latencies.append(time.perf_counter_ns() - start)
+
+    return latencies
+
+
+def _peak_memory(run: Callable) -> int:
+    """Peak memory allocated by a function, traced in a separate run since
+    tracing slows down every allocation.
+
+    Args:
+        run (Callable): Function to trace.
+
+    Returns:
+        int: Peak traced bytes.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(operation: Callable, ops: int, setup: Optional[Callable] = None) -> Dict:
+    """Benchmarks an operation: a timed run and a traced run.
+
+    Args:
+        operation (Callable): Function receiving the value returned by the
+            setup, or None.
+        ops (int): Number of calls.
+        setup (Optional[Callable]): Function called before every call.
+
+    Returns:
+        Dict: Summary of the timed run and peak memory of the traced one.
+    """
+    result = _summary(_time_calls(operation, ops, setup))
+    result['peak_memory_bytes'] = _peak_memory(lambda: _time_calls(operation, min(ops, 1000), setup))
+    return result
+
+
+def _midgame(engine, pieces: int = 20):
+    """Game state after placing some pieces at random coordinates.
+
+    Args:
+        engine: GameStateTetris class.
+        pieces (int): Pieces to place.
+
+    Returns:
+        GameStateTetris: Game state.
+    """
+    rng = random.Random(SEED)
+    state = engine(WIDTH, HEIGHT, seed=SEED)
+    for _ in range(pieces):
+        state.perform_action_coords(rng.randrange(WIDTH), rng.randrange(4))
+        if not state.post_checks(no_gravity=True)[0]:
+            break
+
+    return state
+
+
+def _full_rows(engine, lines: int = 2):
+    """Game state with its bottom rows complete, filled with O pieces.
+
+    Args:
+        engine: GameStateTetris class.
+        lines (int): Complete rows, an even number.
+
+    Returns:
+        GameStateTetris: Game state.
+    """
+    state = engine(WIDTH, HEIGHT, seed=SEED)
+    state.active_piece_id = 3
+    state.active_rotation = 0
+    for y in range(0, lines, 2):
+        for x in range(0, WIDTH, 2):
+            state.active_piece_position = (x, y)
+            state._leave_piece()
+
+    return state
+
+
+def bench_tetris_primitives(engine_name: str, ops: int) -> Dict[str, Dict]:
+    """Benchmarks the primitives of a Tetris engine.
+
+    Args:
+        engine_name (str): Key of ``ENGINES``.
+        ops (int): Calls per primitive.
+
+    Returns:
+        Dict[str, Dict]: Results by case name.
+    """
+    engine = ENGINES[engine_name]
+    state = _midgame(engine)
+    rng = random.Random(SEED)
+    actions = [((rng.randrange(-2, WIDTH), rng.randrange(HEIGHT - 4)), rng.randrange(4)) for _ in range(ops)]
+    action_iter = iter(actions * 2)
+
+    def next_action():
+        return next(action_iter)
+
+    def step():
+        # Moves the active piece, so the data overlay has to be refreshed
+        state.perform_action(rng.randrange(2))
+        return None
+
+    def lock():
+        game = _midgame(engine, 0)
+        game.perform_action_coords(rng.randrange(WIDTH), rng.randrange(4))
+        game.post_checks(no_gravity=True)
+        return game
+
+    def next_move():
+        return rng.randrange(WIDTH + 2), rng.randrange(4)
+
+    def make_unmake(move):
+        state.make_move(*move)
+        state.unmake_move()
+
+    results = {
+        'check_action': _measure(lambda action: state._check_action(*action), ops, next_action),
+        'rotate': _measure(lambda _: state._rotate(1), ops),
+        'check_lines': _measure(lambda game: game._check_lines(), ops, lambda: _full_rows(engine)),
+        'data': _measure(lambda _: state.data, ops, step),
+        'hand_picked_data': _measure(lambda game: game.hand_picked_data, ops, lock),
+        'snapshot': _measure(lambda _: state.snapshot(), ops),
+        'restore': _measure(lambda snapshot: state.restore(snapshot), ops, state.snapshot),
+        'make_unmake': _measure(make_unmake, ops, next_move),
+    }
+    return {'{}.{}'.format(engine_name, name): result for name, result in results.items()}
+
+
+def bench_episode(simulator: neattetris.simulator.Simulator,
+                  make_state: Callable,
+                  net,
+                  episodes: int) -> Dict:
+    """Benchmarks full simulations, timing every simulation step.
+
+    Args:
+        simulator (Simulator): Simulator to run.
+        make_state (Callable): Function creating the game state of an
+            episode from its index.
+        net: Network playing the episodes.
+        episodes (int): Number of episodes.
+
+    Returns:
+        Dict: Step summary, episode throughput, fitness of every episode and
+            peak memory.
+    """
+    latencies = []
+    simulation_step = simulator.simulation_step
+
+    def timed_step(*args):
+        start = time.perf_counter_ns()
+        flag = simulation_step(*args)
+        latencies.append(time.perf_counter_ns() - start)
+        return flag
+
+    simulator.simulation_step = timed_step
+    fitnesses = []
+    start = time.perf_counter()
+    for i in range(episodes):
+        fitnesses.append(simulator.simulation(net, make_state(i)))
+    seconds = time.perf_counter() - start
+    del simulator.simulation_step
+
+    result = _summary(latencies)
+    result['episodes'] = episodes
+    result['episodes_per_sec'] = episodes / seconds
+    result['fitness'] = fitnesses
+    result['peak_memory_bytes'] = _peak_memory(lambda: simulator.simulation(net, make_state(0)))
+    return result
+
+
+def bench_episodes(episodes: int) -> Dict[str, Dict]:
+    """Benchmarks Tetris episodes with fixed random networks and seeds.
+
+    Args:
+        episodes (int): Episodes per case.
+
+    Returns:
+        Dict[str, Dict]: Results by case name.
+    """
+    results = {}
+    for engine_name, engine in ENGINES.items():
+        coord_net = RandomNet(len(engine(WIDTH, HEIGHT).hand_picked_data), WIDTH + 4)
+        results['{}.coord_episode'.format(engine_name)] = bench_episode(
+            neattetris.simulator.CoordSimulator(max_pieces=MAX_PIECES),
+            lambda i: engine(WIDTH, HEIGHT, seed=SEED + i), coord_net, episodes)
+
+        step_net = RandomNet(WIDTH * HEIGHT, 5)
+        results['{}.episode'.format(engine_name)] = bench_episode(
+            neattetris.simulator.Simulator(max_pieces=MAX_PIECES),
+            lambda i: engine(WIDTH, HEIGHT, seed=SEED + i), step_net, episodes)
+
+    return results
+
+
+def bench_rubik(ops: int, batch: int = 1024) -> Dict[str, Dict]:
+    """Benchmarks Rubik's cube moves, one cube at a time and in batches.
+
+    Args:
+        ops (int): Moves of the single cube and batch moves.
+        batch (int): Cubes per batch.
+
+    Returns:
+        Dict[str, Dict]: Results by case name.
+    """
+    rng = np.random.default_rng(SEED)
+    cube = neattetris.gamestates.GameStateRubik(3, seed=SEED)
+    moves = rng.integers(0, 12, size=2 * ops)
+    move_iter = iter(moves.tolist())
+
+    stickers = np.stack([neattetris.gamestates.GameStateRubik(3, seed=i).stickers for i in range(batch)])
+    batch_moves = rng.integers(0, 12, size=batch)
+
+    def turn_batch(_):
+        nonlocal stickers
+        stickers = neattetris.gamestates.GameStateRubik.turn_batch(stickers, batch_moves)
+
+    batch_ops = max(1, ops // batch)
+    batch_result = _summary(_time_calls(turn_batch, batch_ops), ops_per_call=batch)
+    batch_result['peak_memory_bytes'] = _peak_memory(lambda: _time_calls(turn_batch, min(batch_ops, 100)))
+    return {
+        'rubik.move': _measure(lambda _: cube.perform_action(next(move_iter)), ops),
+        'rubik.data': _measure(lambda _: cube.data, ops),
+        'rubik.move_batch': batch_result,
+    }
+
+
+def bench_generation(repeat: int) -> Dict[str, Dict]:
+    """Benchmarks the evaluation of a generation with the evaluator of
+    ``main.eval_genomes``, without its fitness cache so every repeat plays
+    the games again.
+
+    Args:
+        repeat (int): Evaluations of the same generation.
+
+    Returns:
+        Dict[str, Dict]: Results by case name.
+    """
+    import main
+
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config'))
+    random.seed(SEED)
+    genomes = list(neat.Population(config).population.items())
+    evaluator = copy.copy(main.EVALUATOR)
+    evaluator.cache = None
+
+    result = _summary(_time_calls(lambda _: evaluator.evaluate(genomes, config), repeat), ops_per_call=len(genomes))
+    result['genomes'] = len(genomes)
+    result['best_fitness'] = max(genome.fitness for _, genome in genomes)
+    result['peak_memory_bytes'] = _peak_memory(lambda: evaluator.evaluate(genomes, config))
+    return {'neat.eval_genomes': result}
+
+
+def run(quick: bool = False, cases: Optional[List[str]] = None) -> Dict:
+    """Runs the benchmarks.
+
+    Args:
+        quick (bool): If fewer operations are measured.
+        cases (Optional[List[str]]): Substrings selecting the benchmark
+            groups to run, all if None.
+
+    Returns:
+        Dict: Metadata of the run and results by case name.
+    """
+    ops = 2000 if quick else 20000
+    groups = {
+        'tetris.primitives': lambda: bench_tetris_primitives('tetris', ops),
+        'tetris_bitboard.primitives': lambda: bench_tetris_primitives('tetris_bitboard', ops),
+        'tetris.episodes': lambda: bench_episodes(2 if quick else 10),
+        'rubik': lambda: bench_rubik(ops * 5),
+        'neat.generation': lambda: bench_generation(1 if quick else 3),
+    }
+
+    results = {}
+    for name, group in groups.items():
+        if cases is None or any(case in name for case in cases):
+            results.update(group())
+
+    return {
+        'metadata': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'quick': quick,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NeatTetris benchmarks')
+    parser.add_argument('--quick', action='store_true', help='measure fewer operations')
+    parser.add_argument('--cases', nargs='+', help='run the benchmark groups containing these names')
+    parser.add_argument('-o', '--output', help='JSON output file, stdout by default')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.quick, args.cases), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,49 @@
 import neat
 
+import neattetris.cache
+import neattetris.checkpoint
+import neattetris.distributed
+import neattetris.evaluation
 import neattetris.gamestates
+import neattetris.nn
+import neattetris.parallel
+import neattetris.profiling
+import neattetris.recording
+import neattetris.simulator
+import neattetris.steady_state
+import neattetris.viewer
+import asyncio
+import configparser
+import multiprocessing
 import numpy as np
 import sys
 import select
 import os
+import tempfile
 
 WIDTH = 10
 HEIGHT = 20
+SEEDS = list(range(5))
+AGGREGATE = 'min'  # Fitness of a genome over SEEDS: 'mean', 'min' or 'quantile'
+MAX_PIECES = 5000
+WORKERS = os.cpu_count()
+SHARED_MEMORY = False  # Send genomes to the workers and fitnesses back through shared memory
+COORDINATOR = None  # Address of the workers started with 'python main.py worker HOST', e.g. ('0.0.0.0', 47475)
+STEADY_STATE = False  # Replace genomes as soon as they are evaluated instead of whole generations
+AUTHKEY = os.environ.get('NEATTETRIS_AUTHKEY', '').encode()  # Key shared by the coordinator and its workers, required
+GENERATIONS = 2000
+CHECKPOINT_INTERVAL = 10
+EPISODE_LOG = None  # File recording the games of the best genome of every generation
+PROFILE = False
+LIVE_VIEW = False  # Publish the games of the best genomes, watched with 'python main.py view'
+CACHE = neattetris.cache.FitnessCache()
+EVALUATOR = neattetris.evaluation.TetrisEvaluator(WIDTH, HEIGHT, SEEDS, AGGREGATE, max_pieces=MAX_PIECES,
+                                                 cache=CACHE)
+SEARCH_EVALUATOR = neattetris.evaluation.TetrisEvaluator(WIDTH, HEIGHT, SEEDS, AGGREGATE, max_pieces=MAX_PIECES,
+                                                        simulator=neattetris.simulator.SearchSimulator)
+RUBIK_SIZE = 3
+RUBIK_SEEDS = list(range(10))
+RUBIK_EVALUATOR = neattetris.evaluation.RubikEvaluator(RUBIK_SIZE, RUBIK_SEEDS)
 
 
 class HumanActivation:
@@ -30,12 +66,37 @@ class HumanActivation:
         return response
 
 
+def load_config(name='config'):
+    # Experiment files only hold the options that differ from 'config'
+    directory = os.path.dirname(os.path.abspath(__file__))
+    parameters = configparser.ConfigParser()
+    parameters.read([os.path.join(directory, 'config'), os.path.join(directory, name)])
+    with tempfile.NamedTemporaryFile('w', suffix='.cfg', delete=False) as f:
+        parameters.write(f)
+    try:
+        return neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                           neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                           f.name)
+    finally:
+        os.remove(f.name)
+
+
 def eval_genomes(genomes, config):
-    for genome_id, genome in genomes:
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        state = neattetris.gamestates.GameStateTetris(WIDTH, HEIGHT)
-        sim = neattetris.simulator.CoordSimulator()
-        genome.fitness = sim.simulation(net, state)
+    EVALUATOR.evaluate(genomes, config)
+
+
+def eval_search_genomes(genomes, config):
+    SEARCH_EVALUATOR.evaluate(genomes, config)
+
+
+def eval_rubik_genomes(genomes, config):
+    RUBIK_EVALUATOR.evaluate(genomes, config)
+
+
+def parallel_evaluator(*args, **kwargs):
+    if SHARED_MEMORY:
+        return neattetris.parallel.SharedMemoryEvaluator(*args, **kwargs)
+    return neattetris.parallel.ParallelEvaluator(*args, **kwargs)
 
 
 def main_human():
@@ -45,12 +106,81 @@ def main_human():
     print(sim.simulation(HumanActivation(), state, True))
 
 
-def main_nn():
+def main_nn(checkpoint=None):
+    if checkpoint is None:
+        # Load configuration
+        config_path = os.path.join(os.path.dirname(__file__), 'config')
+        config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                             neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                             config_path)
+
+        # Create population
+        p = neat.Population(config)
+        stats = neat.StatisticsReporter()
+    else:
+        # Resume population, statistics, fitness cache and elite fitness
+        p, stats, cache, best_fitness = neattetris.checkpoint.AsyncCheckpointer.restore(checkpoint)
+        config = p.config
+        stats = stats or neat.StatisticsReporter()
+        if cache is not None:
+            EVALUATOR.cache = cache
+        EVALUATOR.best_fitness = best_fitness
+
+    # Add stdout reporter to show progress in the terminal
+    p.add_reporter(neat.StdOutReporter(True))
+    p.add_reporter(stats)
+
+    # Profile the simulations of every generation (serial evaluation only)
+    if PROFILE:
+        EVALUATOR.profiler = neattetris.profiling.SimulationProfiler()
+        p.add_reporter(neattetris.profiling.ProfilingReporter(EVALUATOR.profiler))
+
+    # Record the games of the best genomes
+    if EPISODE_LOG is not None:
+        p.add_reporter(neattetris.recording.EliteRecorder(EVALUATOR, EPISODE_LOG))
+
+    # Show the best genome of the latest generation in the live viewer
+    live_view = None
+    if LIVE_VIEW:
+        live_view = neattetris.viewer.LiveViewReporter(EVALUATOR, neattetris.viewer.FramePublisher())
+        p.add_reporter(live_view)
+
+    # Checkpoint the run every few generations
+    checkpointer = neattetris.checkpoint.AsyncCheckpointer(p, CHECKPOINT_INTERVAL, stats=stats,
+                                                           cache=EVALUATOR.cache, evaluator=EVALUATOR)
+    p.add_reporter(checkpointer)
+
+    # Run the remaining generations
+    with checkpointer:
+        if COORDINATOR is not None:
+            require_authkey()
+            with neattetris.distributed.DistributedEvaluator(EVALUATOR, COORDINATOR, AUTHKEY,
+                                                             elite_cutoff=True) as evaluator:
+                evaluator.best_fitness = checkpointer.evaluator.best_fitness
+                checkpointer.evaluator = evaluator
+                winner = p.run(evaluator.evaluate, GENERATIONS - p.generation)
+        elif STEADY_STATE:
+            evolution = neattetris.steady_state.SteadyStateEvolution(p, EVALUATOR, WORKERS, elite_cutoff=True)
+            winner = evolution.run(GENERATIONS - p.generation)
+        elif WORKERS > 1 and not PROFILE:
+            with parallel_evaluator(EVALUATOR, WORKERS, elite_cutoff=True) as evaluator:
+                evaluator.best_fitness = checkpointer.evaluator.best_fitness
+                checkpointer.evaluator = evaluator
+                winner = p.run(evaluator.evaluate, GENERATIONS - p.generation)
+        else:
+            winner = p.run(eval_genomes, GENERATIONS - p.generation)
+    if live_view is not None:
+        live_view.close()
+    #with open('winner', 'w') as f:
+    #    winner.write_config(f, config)
+
+    # Best genome, its games are replayed with the live viewer or EPISODE_LOG
+    print('\nBest genome:\n{!s}'.format(winner))
+
+
+def main_search():
     # Load configuration
-    config_path = os.path.join(os.path.dirname(__file__), 'config')
-    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
-                         config_path)
+    config = load_config('config_search')
 
     # Create population
     p = neat.Population(config)
@@ -60,17 +190,68 @@ def main_nn():
     stats = neat.StatisticsReporter()
     p.add_reporter(stats)
 
-    # Run 2000 generations
-    winner = p.run(eval_genomes, 2000)
-    #with open('winner', 'w') as f:
-    #    winner.write_config(f, config)
+    # Run the generations, the genomes scoring the boards of a two ply search
+    if WORKERS > 1:
+        with parallel_evaluator(SEARCH_EVALUATOR, WORKERS, elite_cutoff=True) as evaluator:
+            winner = p.run(evaluator.evaluate, GENERATIONS)
+    else:
+        winner = p.run(eval_search_genomes, GENERATIONS)
 
     # Simulation for best genome
-    while input('TRAINING FINISHED, SIMULATE WINNER') == '':
-        net = neat.nn.FeedForwardNetwork.create(winner, config)
-        state = neattetris.gamestates.GameStateTetris(WIDTH, HEIGHT)
-        sim = neattetris.simulator.CoordSimulator()
-        _ = sim.simulation(net, state, visual=True)
+    net = neattetris.nn.CompiledNetwork.create(winner, config)
+    state = neattetris.gamestates.GameStateTetrisBitboard(WIDTH, HEIGHT)
+    sim = neattetris.simulator.SearchSimulator(max_pieces=MAX_PIECES)
+    print(sim.simulation(net, state, visual=True))
+
+
+def main_rubik():
+    # Load configuration
+    config = load_config('config_rubik')
+
+    # Create population
+    p = neat.Population(config)
+
+    # Add stdout reporter to show progress in the terminal
+    p.add_reporter(neat.StdOutReporter(True))
+    stats = neat.StatisticsReporter()
+    p.add_reporter(stats)
+
+    # Run 2000 generations
+    if WORKERS > 1:
+        with neattetris.parallel.ParallelEvaluator(RUBIK_EVALUATOR, WORKERS, elite_cutoff=True) as evaluator:
+            winner = p.run(evaluator.evaluate, 2000)
+    else:
+        winner = p.run(eval_rubik_genomes, 2000)
+
+    # Simulation for best genome on a new scramble
+    net = neattetris.nn.CompiledNetwork.create(winner, config)
+    state = neattetris.gamestates.GameStateRubik(RUBIK_SIZE)
+    sim = neattetris.simulator.RubikSimulator(max_steps=RUBIK_EVALUATOR.max_steps)
+    print(sim.simulation(net, state, visual=True))
+
+
+def main_replay(path):
+    # Show every recorded game of an episode file
+    for episode in neattetris.recording.read_episodes(path):
+        replayer = neattetris.simulator.EpisodeReplayer(episode)
+        print(replayer.replay(visual=True, frame_delay=0.1))
+
+
+def require_authkey():
+    # Coordinator and workers exchange pickled objects, never without a key
+    if not AUTHKEY:
+        sys.exit('Set NEATTETRIS_AUTHKEY to the key shared by the coordinator and its workers')
+
+
+def main_worker(host, port=neattetris.distributed.DEFAULT_PORT):
+    # Evaluate the genomes of a coordinator with one process per CPU
+    require_authkey()
+    workers = [multiprocessing.Process(target=neattetris.distributed.run_worker, args=((host, int(port)), AUTHKEY))
+               for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
 
 
 if __name__ == '__main__':
@@ -78,3 +259,15 @@ if __name__ == '__main__':
         main_nn()
     elif sys.argv[1] == 'human':
         main_human()
+    elif sys.argv[1] == 'rubik':
+        main_rubik()
+    elif sys.argv[1] == 'search':
+        main_search()
+    elif sys.argv[1] == 'resume':
+        main_nn(sys.argv[2])
+    elif sys.argv[1] == 'replay':
+        main_replay(sys.argv[2])
+    elif sys.argv[1] == 'view':
+        asyncio.run(neattetris.viewer.watch())
+    elif sys.argv[1] == 'worker':
+        main_worker(*sys.argv[2:4])
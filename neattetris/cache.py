@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import os
+import struct
+import numpy as np
+
+
+_KEY_SIZE = 16
+
+
+def genome_key(genome) -> bytes:
+    """Canonical hash of the network encoded by a genome.
+
+    Hashes every node gene (key, bias, response, activation and aggregation)
+    and every enabled connection (nodes and weight) in key order, so genomes
+    building the same network get the same key, whatever their fitness,
+    disabled connections or genome id.
+
+    Args:
+        genome (neat.DefaultGenome): Genome to hash.
+
+    Returns:
+        bytes: Hash of the genome.
+    """
+    h = hashlib.blake2b(digest_size=_KEY_SIZE)
+    for key in sorted(genome.nodes):
+        node = genome.nodes[key]
+        h.update(struct.pack('<qdd', key, node.bias, node.response))
+        h.update('{}\0{}\0'.format(node.activation, node.aggregation).encode())
+
+    h.update(b'|')
+    for key in sorted(genome.connections):
+        connection = genome.connections[key]
+        if connection.enabled:
+            h.update(struct.pack('<qqd', key[0], key[1], connection.weight))
+
+    return h.digest()
+
+
+class FitnessCache:
+    """Least recently used cache of game fitnesses.
+
+    Games are keyed by the genome hash (``genome_key``) and the parameters
+    that define the game (seed, board size, budgets...), so a genome
+    repeated across generations, like the elites, is only simulated once per
+    game. Keys and fitnesses can be saved to and loaded from a ``.npz`` file.
+    """
+    def __init__(self, max_size: int = 1000000, path: Optional[str] = None):
+        """
+        Args:
+            max_size (int): Maximum number of cached games.
+            path (Optional[str]): File the cache is loaded from, if it
+                exists, and saved to by default.
+        """
+        self.max_size = max_size
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def key(genome_hash: bytes, *game) -> bytes:
+        """Key of a game played by a genome.
+
+        Args:
+            genome_hash (bytes): Hash of the genome (``genome_key``).
+            *game: Parameters of the game (ints, floats, strings or None).
+
+        Returns:
+            bytes: Key of the game.
+        """
+        return hashlib.blake2b(genome_hash + repr(game).encode(), digest_size=_KEY_SIZE).digest()
+
+    def get(self, key: bytes) -> Optional[float]:
+        """Fitness of a cached game, marking it as recently used.
+
+        Args:
+            key (bytes): Key of the game.
+
+        Returns:
+            Optional[float]: Fitness of the game, None if it is not cached.
+        """
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return fitness
+
+    def put(self, key: bytes, fitness: float):
+        """Caches the fitness of a game, evicting the least recently used
+        games over the maximum size.
+
+        Args:
+            key (bytes): Key of the game.
+            fitness (float): Fitness of the game.
+        """
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy of the cached games, from least to most recently used.
+
+        Returns:
+            np.ndarray: (games, 16) keys.
+            np.ndarray: (games,) fitnesses.
+        """
+        keys = np.frombuffer(b''.join(self.entries.keys()), dtype=np.uint8).reshape(-1, _KEY_SIZE)
+        fitnesses = np.fromiter(self.entries.values(), dtype=float, count=len(self.entries))
+        return keys, fitnesses
+
+    def add_arrays(self, keys: np.ndarray, fitnesses: np.ndarray):
+        """Adds games given as arrays (see ``arrays``) as the most recently
+        used.
+
+        Args:
+            keys (np.ndarray): (games, 16) keys.
+            fitnesses (np.ndarray): (games,) fitnesses.
+        """
+        for key, fitness in zip(keys, fitnesses.tolist()):
+            self.put(key.tobytes(), fitness)
+
+    def save(self, path: Optional[str] = None):
+        """Saves the cache, from least to most recently used.
+
+        Args:
+            path (Optional[str]): Destination file, ``path`` by default.
+        """
+        path = path or self.path
+        keys, fitnesses = self.arrays()
+
+        # Write and rename, so an interrupted save keeps the previous file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=keys, fitnesses=fitnesses)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None):
+        """Loads a saved cache, adding its games as the most recently used.
+
+        Args:
+            path (Optional[str]): Source file, ``path`` by default.
+        """
+        with np.load(path or self.path) as data:
+            self.add_arrays(data['keys'], data['fitnesses'])
@@ -0,0 +1,269 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import count
+from typing import List, NamedTuple, Optional
+from neat.reporting import BaseReporter
+from neattetris.cache import FitnessCache
+import copy
+import neat
+import numpy as np
+import os
+import pickle
+import random
+import time
+import zlib
+
+
+_MAGIC = b'NTCK\x01'
+
+
+class Checkpoint(NamedTuple):
+    """Training run restored from a checkpoint.
+    """
+    population: neat.Population
+    stats: Optional[neat.StatisticsReporter]
+    cache: Optional[FitnessCache]
+    best_fitness: Optional[float]
+
+
+def _copy_containers(obj):
+    """Shallow copy of an object whose list, dict and set attributes are
+    copied too, so appending to them does not change the copy.
+
+    Args:
+        obj: Object to copy.
+
+    Returns:
+        Copy of the object.
+    """
+    obj = copy.copy(obj)
+    for name, value in vars(obj).items():
+        if isinstance(value, (list, dict, set)):
+            setattr(obj, name, copy.copy(value))
+    return obj
+
+
+def _take_count(obj, attribute: str) -> int:
+    """Next value of an ``itertools.count`` attribute, replacing it by an
+    equivalent counter so the value is not consumed.
+
+    Args:
+        obj: Object owning the counter.
+        attribute (str): Attribute name of the counter.
+
+    Returns:
+        int: Next value of the counter.
+    """
+    value = next(getattr(obj, attribute))
+    setattr(obj, attribute, count(value))
+    return value
+
+
+class AsyncCheckpointer(BaseReporter):
+    """Saves the state of a population every few generations, writing the
+    files from a background thread.
+
+    A checkpoint holds everything needed to continue the run exactly as if it
+    had not stopped: the genomes, species and counters of the population, the
+    state of the random number generators, the best fitness of the evaluator
+    (the elite of the early cutoff, see ``neattetris.evaluation.Evaluator``),
+    and optionally the statistics reporter and fitness cache of the run.
+    When the generation ends, only a cheap snapshot of the state is taken:
+    containers and species are copied and the cache is copied to arrays.
+    The background thread pickles, compresses and writes it, so the next
+    generation is evaluated meanwhile. Files are written under a temporary
+    name and renamed once complete.
+
+    Runs with ``neat.Population.run`` and the serial, parallel or
+    distributed evaluators resume exactly. ``SteadyStateEvolution`` is
+    asynchronous, so its resumed run evaluates the saved population again
+    but does not replay the same evaluations.
+
+    Runs are resumed with ``AsyncCheckpointer.restore``::
+
+        population, stats, cache, best_fitness = AsyncCheckpointer.restore('checkpoint-99')
+        evaluator.best_fitness = best_fitness
+    """
+    def __init__(self,
+                 population: neat.Population,
+                 generation_interval: Optional[int] = 10,
+                 time_interval: Optional[float] = None,
+                 prefix: str = 'checkpoint-',
+                 stats: Optional[neat.StatisticsReporter] = None,
+                 cache: Optional[FitnessCache] = None,
+                 evaluator=None,
+                 compression: int = 6):
+        """
+        Args:
+            population (neat.Population): Population to checkpoint.
+            generation_interval (Optional[int]): Generations between
+                checkpoints, if any.
+            time_interval (Optional[float]): Seconds between checkpoints, if
+                any.
+            prefix (str): Prefix of the checkpoint files, followed by the
+                generation they resume from.
+            stats (Optional[neat.StatisticsReporter]): Statistics reporter
+                saved with the population, if any.
+            cache (Optional[FitnessCache]): Fitness cache saved with the
+                population, if any.
+            evaluator: Evaluator whose ``best_fitness`` is saved with the
+                population, if any. Can be replaced once the evaluator of
+                the run is created.
+            compression (int): zlib compression level.
+        """
+        self.population = population
+        self.generation_interval = generation_interval
+        self.time_interval = time_interval
+        self.prefix = prefix
+        self.stats = stats
+        self.cache = cache
+        self.evaluator = evaluator
+        self.compression = compression
+        self.current_generation = None
+        # Resumed runs keep checkpointing every generation_interval
+        # generations from the start of the run
+        self.last_generation = population.generation - 1
+        self.last_time = time.time()
+        self.files: List[str] = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: List[Future] = []
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+
+    def end_generation(self, config, population, species_set):
+        due = False
+        if self.generation_interval is not None:
+            due = self.current_generation - self.last_generation >= self.generation_interval
+        if self.time_interval is not None:
+            due = due or time.time() - self.last_time >= self.time_interval
+
+        if due:
+            self.save_checkpoint(config, population, species_set, self.current_generation)
+            self.last_generation = self.current_generation
+            self.last_time = time.time()
+
+    def save_checkpoint(self, config, population, species_set, generation: int) -> str:
+        """Snapshots the state of the population at the end of a generation
+        and queues it to be written.
+
+        Args:
+            config (neat.Config): NEAT configuration.
+            population (dict): Genomes of the next generation.
+            species_set (neat.DefaultSpeciesSet): Species of the genomes.
+            generation (int): Generation that just ended.
+
+        Returns:
+            str: File the checkpoint is written to.
+        """
+        # Genomes are shared with the run, whose next evaluation only sets
+        # fitnesses that a resumed run evaluates again
+        reproduction = self.population.reproduction
+        state = {
+            'generation': generation + 1,
+            'config': config,
+            'population': dict(population),
+            'species': {key: _copy_containers(s) for key, s in species_set.species.items()},
+            'genome_to_species': dict(species_set.genome_to_species),
+            'species_index': _take_count(species_set, 'indexer'),
+            'genome_index': _take_count(reproduction, 'genome_indexer'),
+            'ancestors': dict(reproduction.ancestors),
+            'best_genome': self.population.best_genome,
+            'best_fitness': getattr(self.evaluator, 'best_fitness', None),
+            'random_state': random.getstate(),
+            'numpy_random_state': np.random.get_state(),
+            'stats': _copy_containers(self.stats) if self.stats is not None else None,
+            'cache': (self.cache.max_size, self.cache.path, *self.cache.arrays()) if self.cache is not None else None,
+        }
+
+        filename = '{}{}'.format(self.prefix, generation + 1)
+        # Raise the errors of finished writes, keep track of the rest
+        pending = []
+        for future in self._pending:
+            if future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self._pending = pending
+        self._pending.append(self._executor.submit(self._write, filename, state))
+        self.files.append(filename)
+        return filename
+
+    def _write(self, filename: str, state: dict):
+        """Pickles, compresses and writes a checkpoint.
+
+        Args:
+            filename (str): Destination file.
+            state (dict): Snapshot of the state.
+        """
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(zlib.compress(data, self.compression))
+        os.replace(tmp_filename, filename)
+
+    def wait(self):
+        """Blocks until every queued checkpoint is written, raising the errors
+        of the writes.
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        """Waits for the queued checkpoints and stops the writer thread.
+        """
+        self.wait()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def restore(filename: str, config: Optional[neat.Config] = None) -> Checkpoint:
+        """Restores a population from a checkpoint, along with the random
+        number generator states.
+
+        Reporters are not saved, so they have to be added again to the
+        population, including the restored statistics reporter.
+
+        Args:
+            filename (str): Checkpoint file.
+            config (Optional[neat.Config]): Configuration replacing the saved
+                one, if any.
+
+        Returns:
+            Checkpoint: Population, statistics reporter, fitness cache and
+                best fitness of the evaluator.
+        """
+        with open(filename, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError('{} is not a checkpoint'.format(filename))
+            state = pickle.loads(zlib.decompress(f.read()))
+
+        config = config or state['config']
+        species_set = config.species_set_type(config.species_set_config, None)
+        species_set.species = state['species']
+        species_set.genome_to_species = state['genome_to_species']
+        species_set.indexer = count(state['species_index'])
+
+        population = neat.Population(config, (state['population'], species_set, state['generation']))
+        species_set.reporters = population.reporters
+        population.reproduction.genome_indexer = count(state['genome_index'])
+        population.reproduction.ancestors = state['ancestors']
+        population.best_genome = state['best_genome']
+
+        random.setstate(state['random_state'])
+        np.random.set_state(state['numpy_random_state'])
+
+        cache = None
+        if state['cache'] is not None:
+            max_size, path, keys, fitnesses = state['cache']
+            cache = FitnessCache(max_size)
+            cache.path = path
+            cache.add_arrays(keys, fitnesses)
+
+        return Checkpoint(population, state['stats'], cache, state['best_fitness'])
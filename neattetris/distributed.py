@@ -0,0 +1,423 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from multiprocessing.connection import Client, Connection, Listener, answer_challenge, deliver_challenge
+from multiprocessing import AuthenticationError
+from neattetris.nn import genome_from_array, genome_to_array
+from neattetris.parallel import _evaluate_genome, _lookup, _store, _worker_function
+import collections
+import itertools
+import os
+import socket
+import threading
+import time
+
+
+DEFAULT_PORT = 47475
+
+# Seconds between the checks for expired leases of the workers waiting for
+# work
+_POLL_INTERVAL = 1.0
+# Seconds a connecting worker has to authenticate
+_HANDSHAKE_TIMEOUT = 10.0
+
+
+def _check_authkey(authkey: bytes):
+    """Refuses empty keys, which would turn authentication off.
+
+    Args:
+        authkey (bytes): Key shared by the coordinator and the workers.
+    """
+    if not authkey:
+        raise ValueError('An authkey is required, the coordinator and its workers exchange pickled objects')
+
+
+def _shutdown(connection: Connection):
+    """Shuts a connection down, waking up the threads blocked on it.
+
+    Args:
+        connection (Connection): Socket connection.
+    """
+    try:
+        with socket.socket(fileno=os.dup(connection.fileno())) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _Lease:
+    """Batch of genomes of a generation evaluated by a worker.
+    """
+    __slots__ = ('lease_id', 'generation', 'indices', 'deadline', 'worker')
+
+    def __init__(self, lease_id: int, generation: int, indices: List[int], deadline: float, worker: int):
+        self.lease_id = lease_id
+        self.generation = generation
+        self.indices = indices
+        self.deadline = deadline
+        self.worker = worker
+
+
+class DistributedEvaluator:
+    """Evaluates genomes on worker processes of other hosts, connected to a
+    coordinator running in the training process.
+
+    Workers (``run_worker``, e.g. ``python main.py worker HOST``) connect to
+    the coordinator over TCP and ask for work. Every generation is split in
+    leases of ``lease_size`` genomes, sent as flat weight arrays
+    (``neattetris.nn.genome_to_array``), and workers stream the fitness of
+    every genome back as soon as it is computed. The leases of a worker that
+    disconnects are issued again at once, and those not finished within
+    ``lease_timeout`` seconds are issued again to the next worker asking for
+    work, the first fitness received for a genome being kept. Workers can
+    join or leave at any time. The fitness cache stays in the coordinator,
+    as in ``neattetris.parallel.ParallelEvaluator``.
+
+    Connections are authenticated with ``authkey``, which cannot be empty:
+    messages, the evaluation function and the NEAT configuration are
+    pickled, so only trusted hosts must know the key. Every connection
+    authenticates in its own thread within a few seconds, so a client that
+    never answers does not hold back other workers.
+
+    Instances can be passed directly as the fitness function of
+    ``neat.Population.run``::
+
+        with DistributedEvaluator(eval_genome, ('0.0.0.0', DEFAULT_PORT), b'key') as evaluator:
+            winner = p.run(evaluator.evaluate, 2000)
+    """
+    def __init__(self,
+                 eval_function: Callable,
+                 address: Tuple[str, int] = ('127.0.0.1', DEFAULT_PORT),
+                 authkey: bytes = b'',
+                 lease_size: int = 4,
+                 lease_timeout: float = 600.0,
+                 timeout: Optional[float] = None,
+                 elite_cutoff: bool = False):
+        """
+        Args:
+            eval_function (Callable): Function receiving a genome and the
+                NEAT configuration and returning its fitness, e.g. a
+                ``neattetris.evaluation.Evaluator``. It must be picklable.
+            address (Tuple[str, int]): Host and port the coordinator listens
+                on. Port 0 picks a free port, see ``address``.
+            authkey (bytes): Key shared with the workers, required.
+            lease_size (int): Genomes leased to a worker at once.
+            lease_timeout (float): Seconds a lease is given before it is
+                issued again.
+            timeout (Optional[float]): Maximum seconds to wait for a
+                generation to be evaluated.
+            elite_cutoff (bool): If the best fitness of the previous
+                generation is passed to the evaluation function as a third
+                argument, see ``neattetris.parallel.ParallelEvaluator``.
+        """
+        _check_authkey(authkey)
+        self.eval_function = eval_function
+        self.lease_size = lease_size
+        self.lease_timeout = lease_timeout
+        self.timeout = timeout
+        self.elite_cutoff = elite_cutoff
+        self.best_fitness = None
+        self.reissued = 0
+        self._authkey = authkey
+        # Connections authenticate in their own thread, see _serve
+        self._listener = Listener(address)
+        self.address = self._listener.address
+        self._condition = threading.Condition()
+        self._closed = False
+        self._config = None
+        self._worker_function = None
+        self._setup = 0
+        self._generation = 0
+        self._genomes = []
+        self._knowns = []
+        self._elite = None
+        self._fitnesses: List[Optional[float]] = []
+        self._played = []
+        self._remaining = 0
+        self._pending = collections.deque()
+        self._leases: Dict[int, _Lease] = {}
+        self._lease_ids = itertools.count()
+        self._workers = itertools.count()
+        self._connections: Dict[int, Connection] = {}
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    @property
+    def workers(self) -> int:
+        """Number of workers connected.
+
+        Returns:
+            int: Workers connected.
+        """
+        with self._condition:
+            return len(self._connections)
+
+    def _accept(self):
+        """Accepts the connections of the workers until the coordinator is
+        closed, serving each one in its own thread.
+        """
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                continue
+
+            if self._closed:
+                connection.close()
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _authenticate(self, connection: Connection) -> bool:
+        """Authenticates both ends of a new connection, shutting it down if
+        the worker does not answer in time.
+
+        Args:
+            connection (Connection): Connection with the worker.
+
+        Returns:
+            bool: True if the worker knows the key, False otherwise.
+        """
+        timer = threading.Timer(_HANDSHAKE_TIMEOUT, _shutdown, (connection,))
+        timer.start()
+        try:
+            deliver_challenge(connection, self._authkey)
+            answer_challenge(connection, self._authkey)
+            return True
+        except (AuthenticationError, EOFError, OSError):
+            return False
+        finally:
+            timer.cancel()
+
+    def _serve(self, connection: Connection):
+        """Authenticates a worker and answers its messages until it
+        disconnects.
+
+        Workers send ('lease',) to ask for work, answered with a lease or
+        ('stop',), and ('result', generation, index, fitness, played) and
+        ('done', lease_id) while they evaluate a lease.
+
+        Args:
+            connection (Connection): Connection with the worker.
+        """
+        if not self._authenticate(connection):
+            connection.close()
+            return
+
+        with self._condition:
+            if self._closed:
+                connection.close()
+                return
+            worker = next(self._workers)
+            self._connections[worker] = connection
+
+        setup = None
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'lease':
+                    leased = self._lease(worker)
+                    if leased is None:
+                        connection.send(('stop',))
+                        return
+                    lease, genomes, elite, (version, eval_function, config) = leased
+                    connection.send(('lease', lease.generation, lease.lease_id,
+                                     None if version == setup else (eval_function, config), genomes, elite))
+                    setup = version
+                elif message[0] == 'result':
+                    self._record(*message[1:])
+                elif message[0] == 'done':
+                    with self._condition:
+                        self._leases.pop(message[1], None)
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            self._release(worker)
+
+    def _lease(self, worker: int) -> Optional[tuple]:
+        """Waits for genomes to evaluate and leases them to a worker.
+
+        Args:
+            worker (int): Identifier of the worker.
+
+        Returns:
+            Optional[tuple]: Lease, its encoded genomes as (index, array,
+                cached game fitnesses) triples, elite fitness and (version, evaluation function, NEAT
+                configuration) setup of the generation, None if the
+                coordinator is closed.
+        """
+        with self._condition:
+            while not self._closed:
+                self._expire()
+                while self._pending:
+                    indices = [i for i in self._pending.popleft() if self._fitnesses[i] is None]
+                    if not indices:
+                        continue
+                    lease = _Lease(next(self._lease_ids), self._generation, indices,
+                                   time.monotonic() + self.lease_timeout, worker)
+                    self._leases[lease.lease_id] = lease
+                    genomes = [(i, self._genomes[i], self._knowns[i]) for i in indices]
+                    return lease, genomes, self._elite, (self._setup, self._worker_function, self._config)
+                self._condition.wait(_POLL_INTERVAL)
+
+        return None
+
+    def _expire(self):
+        """Issues again the leases past their deadline. Must be called with
+        the lock held.
+        """
+        now = time.monotonic()
+        for lease in [lease for lease in self._leases.values() if lease.deadline <= now]:
+            self._reissue(lease)
+
+    def _reissue(self, lease: _Lease):
+        """Puts the unfinished genomes of a lease back in the queue. Must be
+        called with the lock held.
+
+        Args:
+            lease (_Lease): Lease issued again.
+        """
+        del self._leases[lease.lease_id]
+        if lease.generation != self._generation:
+            return
+        indices = [i for i in lease.indices if self._fitnesses[i] is None]
+        if indices:
+            self._pending.appendleft(indices)
+            self.reissued += 1
+            self._condition.notify_all()
+
+    def _release(self, worker: int):
+        """Forgets a disconnected worker, issuing its leases again.
+
+        Args:
+            worker (int): Identifier of the worker.
+        """
+        with self._condition:
+            self._connections.pop(worker, None)
+            for lease in [lease for lease in self._leases.values() if lease.worker == worker]:
+                self._reissue(lease)
+
+    def _record(self, generation: int, index: int, fitness: float, played: Optional[Dict[int, float]]):
+        """Records the fitness of a genome, unless it belongs to a previous
+        generation or was already received from another lease.
+
+        Args:
+            generation (int): Generation of the genome.
+            index (int): Position of the genome in its generation.
+            fitness (float): Fitness of the genome.
+            played (Optional[Dict[int, float]]): Fitness of the games played,
+                cached once the generation is evaluated.
+        """
+        with self._condition:
+            if generation != self._generation or self._fitnesses[index] is not None:
+                return
+            self._fitnesses[index] = fitness
+            self._played[index] = played
+            self._remaining -= 1
+            if not self._remaining:
+                self._condition.notify_all()
+
+    def evaluate(self, genomes: List[Tuple[int, object]], config):
+        """Evaluates a generation, setting the fitness of every genome.
+
+        Args:
+            genomes (List[Tuple[int, object]]): (genome_id, genome) pairs.
+            config (neat.Config): NEAT configuration.
+        """
+        genomes = [genome for _, genome in genomes]
+        elite = self.best_fitness if self.elite_cutoff else None
+        missing, keys, knowns = _lookup(self.eval_function, genomes, config, elite)
+        arrays = [None] * len(genomes)
+        for i in missing:
+            arrays[i] = genome_to_array(genomes[i], config)
+        with self._condition:
+            if config is not self._config:
+                self._config = config
+                self._worker_function = _worker_function(self.eval_function)
+                self._setup += 1
+            self._generation += 1
+            self._genomes = arrays
+            self._knowns = knowns
+            self._elite = elite
+            self._fitnesses = [genome.fitness if arrays[i] is None else None for i, genome in enumerate(genomes)]
+            self._played = [None] * len(genomes)
+            self._remaining = len(missing)
+            self._leases.clear()
+            self._pending = collections.deque(missing[i:i + self.lease_size]
+                                              for i in range(0, len(missing), self.lease_size))
+            self._condition.notify_all()
+
+            if not self._condition.wait_for(lambda: not self._remaining or self._closed, self.timeout):
+                raise TimeoutError('{} genomes were not evaluated in time'.format(self._remaining))
+            if self._remaining:
+                raise RuntimeError('The coordinator was closed')
+            fitnesses = self._fitnesses
+            played = self._played
+
+        for genome, fitness, genome_keys, genome_played in zip(genomes, fitnesses, keys, played):
+            genome.fitness = fitness
+            _store(self.eval_function, genome_keys, genome_played)
+
+        self.best_fitness = max(genome.fitness for genome in genomes)
+
+    def close(self):
+        """Stops the coordinator. Workers are told to stop the next time they
+        ask for work.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+
+        # Wake up the thread accepting connections
+        try:
+            socket.create_connection(self.address, timeout=1.0).close()
+        except OSError:
+            pass
+        self._listener.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_worker(address: Tuple[str, int], authkey: bytes = b'') -> int:
+    """Evaluates the genomes leased by a ``DistributedEvaluator`` until it
+    stops or the connection is lost.
+
+    Args:
+        address (Tuple[str, int]): Host and port of the coordinator.
+        authkey (bytes): Key shared with the coordinator, required.
+
+    Returns:
+        int: Number of genomes evaluated.
+    """
+    _check_authkey(authkey)
+    connection = Client(address, authkey=authkey)
+    eval_function = config = None
+    evaluated = 0
+    try:
+        while True:
+            connection.send(('lease',))
+            message = connection.recv()
+            if message[0] == 'stop':
+                break
+
+            _, generation, lease_id, setup, genomes, elite = message
+            if setup is not None:
+                eval_function, config = setup
+            for index, array, known in genomes:
+                genome = genome_from_array(array, config)
+                fitness, played = _evaluate_genome(eval_function, genome, config, elite, known)
+                connection.send(('result', generation, index, fitness, played))
+                evaluated += 1
+            connection.send(('done', lease_id))
+    except (EOFError, OSError):
+        pass
+    finally:
+        connection.close()
+
+    return evaluated
@@ -0,0 +1,486 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from neattetris.gamestates import GameState, GameStateRubik, GameStateTetrisBitboard
+from neattetris.gamestates.gamestate_tetris import _INITIAL_BAGS, _N_PIECES, _SCORE_MULTIPLIER, piece_sequence
+from neattetris.simulator import BatchSimulator, CoordSimulator, RubikSimulator, SearchSimulator, Simulator
+from neattetris.cache import FitnessCache, genome_key
+from neattetris.nn import CompiledNetwork
+from neattetris.profiling import SimulationProfiler
+from neattetris.recording import EpisodeRecorder
+import numpy as np
+
+
+_AGGREGATES = ('mean', 'min', 'quantile')
+
+
+def _max_tetris_fitness(grid_width: int, max_pieces: int) -> float:
+    """Upper bound of the fitness of a Tetris game placing at most
+    ``max_pieces`` pieces, one per step.
+
+    Every piece adds 4 cells and every line cleared removes ``grid_width``
+    of them, so at most ``4 * max_pieces // grid_width`` lines are cleared,
+    each scoring at most a quarter of a tetris at the last level reached.
+
+    Args:
+        grid_width (int): Width of the Tetris grid.
+        max_pieces (int): Maximum pieces placed per game.
+
+    Returns:
+        float: Upper bound of the fitness of a game.
+    """
+    lines = 4 * max_pieces // grid_width
+    return float(max_pieces + _SCORE_MULTIPLIER[4] / 4 * (lines // 10 + 1) * lines)
+
+
+class Evaluator:
+    """Scores genomes by playing one game per seed.
+
+    The fitness of a genome aggregates the fitness of its games (mean, min or
+    a quantile). Seeds are played one after another, and a genome stops
+    playing once it cannot beat the elite fitness anymore: the aggregate is
+    computed with every remaining seed at its best possible fitness
+    (``max_seed_fitness``, unbounded by default, bounded by the pieces
+    placed in ``TetrisEvaluator``) and, if that optimistic
+    aggregate does not exceed the elite, the genome stops. Its fitness is
+    then the aggregate of the games it played, capped by the optimistic
+    aggregate, so it is never above what the genome scored and never ranks
+    it above the elite.
+
+    The elite is the best fitness of the previous generation, as in the
+    evaluators of ``neattetris.parallel`` and ``neattetris.distributed``, so
+    a generation gets the same fitnesses whatever the order or the process
+    its genomes are evaluated in.
+
+    Without a bound for the fitness of a game, the mean never allows an early
+    cutoff, while the min and low quantiles do.
+
+    With a ``FitnessCache``, the fitness of every game is cached by genome
+    network, seed and the game parameters given by ``_game``, and games
+    already cached are not played again. The evaluators of
+    ``neattetris.parallel`` and ``neattetris.distributed`` keep the cache in
+    the training process: they look the games up before sending a genome to
+    a worker (``lookup``), the worker only plays the missing games
+    (``games``) and their fitness is cached back (``store``).
+
+    Subclasses implement ``game`` and ``_game``. Instances are picklable, so they can be
+    used as the evaluation function of
+    ``neattetris.parallel.ParallelEvaluator``, and genomes can be given as
+    ``neattetris.nn.ArrayGenome``, as ``SharedMemoryEvaluator`` does.
+    """
+    def __init__(self,
+                 seeds: Sequence[int] = (0,),
+                 aggregate: str = 'mean',
+                 quantile: float = 0.5,
+                 max_seed_fitness: float = np.inf,
+                 early_cutoff: bool = True,
+                 profiler: Optional[SimulationProfiler] = None,
+                 cache: Optional[FitnessCache] = None):
+        """
+        Args:
+            seeds (Sequence[int]): Seeds of the games played by each genome.
+            aggregate (str): Aggregation of the fitness of the games: 'mean',
+                'min' or 'quantile'.
+            quantile (float): Quantile used by the 'quantile' aggregation.
+            max_seed_fitness (float): Upper bound of the fitness of a game,
+                used by the early cutoff.
+            early_cutoff (bool): If genomes that cannot beat the elite stop
+                playing their remaining seeds.
+            profiler (Optional[SimulationProfiler]): Profiler of the
+                simulations, if any.
+            cache (Optional[FitnessCache]): Cache of the game fitnesses, if
+                any.
+        """
+        if aggregate not in _AGGREGATES:
+            raise ValueError('Unknown aggregate {}, expected one of {}'.format(aggregate, _AGGREGATES))
+        if not len(seeds):
+            raise ValueError('At least one seed is required')
+        self.seeds = list(seeds)
+        self.aggregate = aggregate
+        self.quantile = quantile
+        self.max_seed_fitness = max_seed_fitness
+        self.early_cutoff = early_cutoff
+        self.profiler = profiler
+        self.cache = cache
+        self.best_fitness = None
+
+    def _aggregate(self, fitnesses: List[float]) -> float:
+        """Aggregates the fitness of several games.
+
+        Args:
+            fitnesses (List[float]): Fitness of each game.
+
+        Returns:
+            float: Aggregated fitness.
+        """
+        if self.aggregate == 'mean':
+            return float(np.mean(fitnesses))
+        elif self.aggregate == 'min':
+            return float(np.min(fitnesses))
+        else:
+            # Interpolating between two unbounded fitnesses gives nan
+            with np.errstate(invalid='ignore'):
+                value = float(np.quantile(fitnesses, self.quantile))
+            return np.inf if np.isnan(value) else value
+
+    def game(self, seed: int, recorder: Optional[EpisodeRecorder] = None) -> Tuple[Simulator, GameState]:
+        """Creates the simulator and initial game state of a single game.
+
+        Args:
+            seed (int): Seed of the game.
+            recorder (Optional[EpisodeRecorder]): Recorder of the game, if
+                any.
+
+        Returns:
+            Simulator: Simulator of the game.
+            GameState: Initial game state.
+        """
+        raise NotImplementedError()
+
+    def play(self, net, seed: int, recorder: Optional[EpisodeRecorder] = None) -> float:
+        """Plays a single game.
+
+        Args:
+            net: Neural network agent.
+            seed (int): Seed of the game.
+            recorder (Optional[EpisodeRecorder]): Recorder of the game, if
+                any.
+
+        Returns:
+            float: Fitness of the game.
+        """
+        simulator, state = self.game(seed, recorder)
+        return simulator.simulation(net, state)
+
+    def _game(self) -> Optional[tuple]:
+        """Parameters defining the games besides their seed, used to key the
+        fitness cache.
+
+        Returns:
+            Optional[tuple]: Game parameters, None if games cannot be cached.
+        """
+        return None
+
+    def _cache_keys(self, genome) -> Optional[List[bytes]]:
+        """Fitness cache keys of the games of a genome.
+
+        Args:
+            genome (neat.DefaultGenome): Genome to evaluate.
+
+        Returns:
+            Optional[List[bytes]]: Key of the game of every seed, None if
+                there is no cache or games cannot be cached.
+        """
+        game = self._game() if self.cache is not None else None
+        if game is None:
+            return None
+
+        genome_hash = genome_key(genome)
+        return [self.cache.key(genome_hash, seed, *game) for seed in self.seeds]
+
+    def lookup(self, genome) -> Tuple[Optional[List[bytes]], List[Optional[float]]]:
+        """Looks up the games of a genome in the fitness cache.
+
+        Args:
+            genome (neat.DefaultGenome): Genome to evaluate.
+
+        Returns:
+            Optional[List[bytes]]: Key of the game of every seed, None if
+                there is no cache or games cannot be cached.
+            List[Optional[float]]: Cached fitness of the game of every seed,
+                None if it is not cached.
+        """
+        keys = self._cache_keys(genome)
+        if keys is None:
+            return None, [None] * len(self.seeds)
+        return keys, [self.cache.get(key) for key in keys]
+
+    def store(self, keys: Optional[List[bytes]], played: Dict[int, float]):
+        """Caches the games played by a genome.
+
+        Args:
+            keys (Optional[List[bytes]]): Key of the game of every seed, as
+                returned by ``lookup``.
+            played (Dict[int, float]): Fitness of the games played, by seed
+                index.
+        """
+        if keys is not None:
+            for i, fitness in played.items():
+                self.cache.put(keys[i], fitness)
+
+    def games(self,
+              genome,
+              config,
+              elite: Optional[float] = None,
+              known: Optional[List[Optional[float]]] = None) -> Tuple[float, Dict[int, float]]:
+        """Evaluates a genome, playing the games whose fitness is not known
+        yet. The fitness cache is not used, so the games can be played in a
+        worker process and cached by the parent process (see ``lookup`` and
+        ``store``).
+
+        Args:
+            genome (neat.DefaultGenome): Genome to evaluate.
+            config (neat.Config): NEAT configuration.
+            elite (Optional[float]): Fitness of the elite the genome has to
+                beat to keep playing, if any.
+            known (Optional[List[Optional[float]]]): Fitness of the game of
+                every seed, None for the games to play.
+
+        Returns:
+            float: Fitness of the genome.
+            Dict[int, float]: Fitness of the games played, by seed index.
+        """
+        known = known or [None] * len(self.seeds)
+        net = None
+        fitnesses = []
+        played = {}
+        for i, seed in enumerate(self.seeds):
+            fitness = known[i]
+            if fitness is None:
+                if net is None:
+                    net = CompiledNetwork.create(genome, config)
+                fitness = played[i] = self.play(net, seed)
+            fitnesses.append(fitness)
+
+            remaining = len(self.seeds) - i - 1
+            if remaining and self.early_cutoff and elite is not None:
+                optimistic = self._aggregate(fitnesses + [self.max_seed_fitness] * remaining)
+                if optimistic <= elite:
+                    return min(self._aggregate(fitnesses), optimistic), played
+
+        return self._aggregate(fitnesses), played
+
+    def __call__(self, genome, config, elite: Optional[float] = None) -> float:
+        """Evaluates a genome.
+
+        Args:
+            genome (neat.DefaultGenome): Genome to evaluate.
+            config (neat.Config): NEAT configuration.
+            elite (Optional[float]): Fitness of the elite the genome has to
+                beat to keep playing, if any.
+
+        Returns:
+            float: Fitness of the genome.
+        """
+        keys, known = self.lookup(genome)
+        fitness, played = self.games(genome, config, elite, known)
+        self.store(keys, played)
+        return fitness
+
+    def evaluate(self, genomes: List[Tuple[int, object]], config):
+        """Evaluates a generation, setting the fitness of every genome. Can be
+        passed as the fitness function of ``neat.Population.run``.
+
+        The elite of the early cutoff is the best fitness of the previous
+        generation (``best_fitness``). With elitism and deterministic games
+        the best genome of a generation is kept in the next one with the same
+        fitness, so it is a lower bound of the next elite.
+
+        Args:
+            genomes (List[Tuple[int, object]]): (genome_id, genome) pairs.
+            config (neat.Config): NEAT configuration.
+        """
+        for genome_id, genome in genomes:
+            if self.profiler is not None:
+                self.profiler.genome = genome_id
+            genome.fitness = self(genome, config, self.best_fitness)
+
+        self.best_fitness = max(genome.fitness for _, genome in genomes)
+
+
+class TetrisEvaluator(Evaluator):
+    """Scores genomes by playing Tetris with the coordinate simulator (or the
+    search simulator) over one or more piece sequence seeds, see
+    ``Evaluator``.
+
+    Seeds are integers or tuples of integers such as (run seed, generation,
+    genome, episode), see ``piece_sequence``. The piece sequence of every
+    seed is generated once, long enough for ``max_pieces``, and shared
+    read-only by all the games of the evaluator (and of its copies in worker
+    processes).
+    """
+    def __init__(self,
+                 grid_width: int = 10,
+                 grid_height: int = 20,
+                 seeds: Sequence[Union[int, Tuple[int, ...]]] = (0,),
+                 aggregate: str = 'mean',
+                 quantile: float = 0.5,
+                 max_seed_fitness: Optional[float] = None,
+                 early_cutoff: bool = True,
+                 batch: bool = False,
+                 game_state=GameStateTetrisBitboard,
+                 simulator=CoordSimulator,
+                 max_pieces: Optional[int] = None,
+                 max_time: Optional[float] = None,
+                 profiler: Optional[SimulationProfiler] = None,
+                 cache: Optional[FitnessCache] = None):
+        """
+        Args:
+            grid_width (int): Width of the Tetris grid.
+            grid_height (int): Height of the Tetris grid.
+            seeds (Sequence[Union[int, Tuple[int, ...]]]): Piece sequence
+                seeds played by each genome.
+            aggregate (str): Aggregation of the fitness of the games: 'mean',
+                'min' or 'quantile'.
+            quantile (float): Quantile used by the 'quantile' aggregation.
+            max_seed_fitness (Optional[float]): Upper bound of the fitness
+                of a game, used by the early cutoff. Defaults to the bound
+                given by ``max_pieces``, unbounded without it.
+            early_cutoff (bool): If genomes that cannot beat the elite stop
+                playing their remaining seeds.
+            batch (bool): If all seeds are played in lockstep by a
+                ``BatchSimulator``, disabling the early cutoff.
+            game_state: GameStateTetris class used by the sequential games.
+            simulator: CoordSimulator class of the sequential games, e.g.
+                ``SearchSimulator`` to use the genomes as value functions.
+            max_pieces (Optional[int]): Maximum pieces placed per game.
+            max_time (Optional[float]): Maximum wall clock seconds per game.
+            profiler (Optional[SimulationProfiler]): Profiler of the
+                sequential games, if any.
+            cache (Optional[FitnessCache]): Cache of the game fitnesses, if
+                any. Games bounded by wall clock time are not cached.
+        """
+        if max_seed_fitness is None:
+            max_seed_fitness = _max_tetris_fitness(grid_width, max_pieces) if max_pieces is not None else np.inf
+        super().__init__(seeds, aggregate, quantile, max_seed_fitness, early_cutoff, profiler, cache)
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.batch = batch
+        self.game_state = game_state
+        self.simulator = simulator
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        if batch and simulator is not CoordSimulator:
+            raise ValueError('Batch games are only supported with CoordSimulator')
+        # The games need one piece after the last one placed
+        n_bags = -(-(max_pieces + 2) // _N_PIECES) if max_pieces is not None else _INITIAL_BAGS
+        self.pieces = {seed: piece_sequence(seed, n_bags) for seed in self.seeds}
+
+    def game(self,
+             seed: Union[int, Tuple[int, ...]],
+             recorder: Optional[EpisodeRecorder] = None) -> Tuple[Simulator, GameState]:
+        """Creates the simulator and initial game state of a single game.
+
+        Args:
+            seed (Union[int, Tuple[int, ...]]): Piece sequence seed.
+            recorder (Optional[EpisodeRecorder]): Recorder of the game, if
+                any.
+
+        Returns:
+            Simulator: Simulator of the game.
+            GameState: Initial game state.
+        """
+        state = self.game_state(self.grid_width, self.grid_height, seed=seed, pieces=self.pieces.get(seed))
+        simulator = self.simulator(max_pieces=self.max_pieces, max_time=self.max_time,
+                                   profiler=self.profiler, recorder=recorder)
+        return simulator, state
+
+    def _game(self) -> Optional[tuple]:
+        """Parameters defining the games besides their seed, used to key the
+        fitness cache. Both Tetris engines play the same games.
+
+        Returns:
+            Optional[tuple]: Game parameters, None if games cannot be cached.
+        """
+        if self.max_time is not None:
+            return None
+
+        return 'tetris', self.grid_width, self.grid_height, self.max_pieces, self.simulator.__name__
+
+    def games(self,
+              genome,
+              config,
+              elite: Optional[float] = None,
+              known: Optional[List[Optional[float]]] = None) -> Tuple[float, Dict[int, float]]:
+        """Evaluates a genome, playing the games whose fitness is not known
+        yet, see ``Evaluator.games``. Batch games are played in lockstep.
+
+        Args:
+            genome (neat.DefaultGenome): Genome to evaluate.
+            config (neat.Config): NEAT configuration.
+            elite (Optional[float]): Fitness of the elite the genome has to
+                beat to keep playing, if any.
+            known (Optional[List[Optional[float]]]): Fitness of the game of
+                every seed, None for the games to play.
+
+        Returns:
+            float: Fitness of the genome.
+            Dict[int, float]: Fitness of the games played, by seed index.
+        """
+        if not self.batch:
+            return super().games(genome, config, elite, known)
+
+        fitnesses = list(known or [None] * len(self.seeds))
+        missing = [i for i, fitness in enumerate(fitnesses) if fitness is None]
+        played = {}
+        if missing:
+            net = CompiledNetwork.create(genome, config)
+            simulator = BatchSimulator(self.grid_width, self.grid_height,
+                                       max_pieces=self.max_pieces, max_time=self.max_time)
+            results = simulator.simulation([net] * len(missing), [self.seeds[i] for i in missing])
+            for i, fitness in zip(missing, results.tolist()):
+                fitnesses[i] = played[i] = fitness
+
+        return self._aggregate(fitnesses), played
+
+
+class RubikEvaluator(Evaluator):
+    """Scores genomes by solving scrambled Rubik's cubes, one scramble per
+    seed, see ``Evaluator``.
+
+    The fitness of a game is the fraction of stickers fixed from the scramble
+    plus 1 if the cube is solved, so it is at most 2.
+    """
+    def __init__(self,
+                 size: int = 3,
+                 seeds: Sequence[int] = (0,),
+                 scramble_moves: int = 20,
+                 max_steps: int = 100,
+                 aggregate: str = 'mean',
+                 quantile: float = 0.5,
+                 early_cutoff: bool = True,
+                 profiler: Optional[SimulationProfiler] = None,
+                 cache: Optional[FitnessCache] = None):
+        """
+        Args:
+            size (int): Number of stickers per face edge.
+            seeds (Sequence[int]): Scramble seeds played by each genome.
+            scramble_moves (int): Random moves of each scramble.
+            max_steps (int): Maximum moves per game.
+            aggregate (str): Aggregation of the fitness of the games: 'mean',
+                'min' or 'quantile'.
+            quantile (float): Quantile used by the 'quantile' aggregation.
+            early_cutoff (bool): If genomes that cannot beat the elite stop
+                playing their remaining seeds.
+            profiler (Optional[SimulationProfiler]): Profiler of the
+                simulations, if any.
+            cache (Optional[FitnessCache]): Cache of the game fitnesses, if
+                any.
+        """
+        super().__init__(seeds, aggregate, quantile, 2.0, early_cutoff, profiler, cache)
+        self.size = size
+        self.scramble_moves = scramble_moves
+        self.max_steps = max_steps
+
+    def game(self, seed: int, recorder: Optional[EpisodeRecorder] = None) -> Tuple[Simulator, GameState]:
+        """Creates the simulator and initial game state of a single game.
+
+        Args:
+            seed (int): Scramble seed.
+            recorder (Optional[EpisodeRecorder]): Recorder of the game, if
+                any.
+
+        Returns:
+            Simulator: Simulator of the game.
+            GameState: Initial game state.
+        """
+        state = GameStateRubik(self.size, seed=seed, scramble_moves=self.scramble_moves)
+        simulator = RubikSimulator(max_steps=self.max_steps, profiler=self.profiler, recorder=recorder)
+        return simulator, state
+
+    def _game(self) -> Optional[tuple]:
+        """Parameters defining the games besides their seed, used to key the
+        fitness cache.
+
+        Returns:
+            Optional[tuple]: Game parameters, None if games cannot be cached.
+        """
+        return 'rubik', self.size, self.scramble_moves, self.max_steps
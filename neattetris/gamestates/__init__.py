@@ -1,3 +1,4 @@
 from .gamestate import GameState
 from .gamestate_tetris import GameStateTetris
 from .gamestate_rubik import GameStateRubik
+from .gamestate_tetris_bitboard import GameStateTetrisBitboard
@@ -4,6 +4,8 @@ import numpy as np
 
 
 class GameState(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def pre_checks(self) -> bool:
         """Checks before decision execution.
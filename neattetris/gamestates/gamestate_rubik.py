@@ -1,4 +1,5 @@
-from typing import Tuple
+from functools import lru_cache
+from typing import Optional, Tuple
 import numpy as np
 from .gamestate import GameState
 import random
@@ -6,170 +7,227 @@ from termcolor import colored
 import colorama
 
 
-class Face:
-    def __init__(self, value, size):
-        self.size = size
-        self.data = [[value for y in range(size)] for x in range(size)]
-
-    def __getitem__(self, loc):
-        if loc[0] == -1:
-            if loc[1] == -1:
-                # Full Face
-                return self.data
-            else:
-                # Access to a column (:, y)
-                column = [0 for i in range(self.size)]
-                for j in range(self.size):
-                    column[j] = self.data[j][loc[1]]
-                return column
-        else:
-            if loc[1] == -1:
-                # Access to a line (x, :)
-                line = [0 for i in range(self.size)]
-                for j in range(self.size):
-                    line[j] = self.data[loc[0]][j]
-                return line
-            else:
-                # Access to a single element
-                return self.data[loc[0]][loc[1]]
-
-    def replace(self, new, x=-1, y=-1):
-
-        if y == -1:
-            # Replacement of a line
-            for i in range(self.size):
-                self.data[x][i] = new[i]
-        else:
-            # Replacement of a column
-            for i in range(self.size):
-                self.data[i][y] = new[i]
-
-    def rotate(self, direction):
-        if direction:
-            aux1 = self.data[0][0]
-            aux2 = self.data[0][1]
-            self.data[0][0] = self.data[2][0]
-            self.data[0][1] = self.data[1][0]
-            self.data[2][0] = self.data[2][2]
-            self.data[1][0] = self.data[2][1]
-            self.data[2][2] = self.data[0][2]
-            self.data[2][1] = self.data[1][2]
-            self.data[0][2] = aux1
-            self.data[1][2] = aux2
-        else:
-            aux1 = self.data[0][2]
-            aux2 = self.data[0][1]
-            self.data[0][2] = self.data[2][2]
-            self.data[0][1] = self.data[1][2]
-            self.data[2][2] = self.data[2][0]
-            self.data[1][2] = self.data[2][1]
-            self.data[2][0] = self.data[0][0]
-            self.data[2][1] = self.data[1][0]
-            self.data[0][0] = aux1
-            self.data[1][0] = aux2
-
-    def get_color(self, x, y):
-        colors = ['grey', 'red', 'green', 'magenta', 'blue', 'yellow']
-        return colors[self.data[x][y]]
+_COLORS = ['grey', 'red', 'green', 'magenta', 'blue', 'yellow']
+
+# Outward normal of every face, with x pointing right, y up and z to the front
+_NORMALS = np.array([[0, -1, 0], [0, 0, 1], [1, 0, 0], [0, 0, -1], [-1, 0, 0], [0, 1, 0]])
+
+
+def _sticker_points(size: int) -> np.ndarray:
+    """Position of every sticker of the cube in space.
+
+    Sticker (row, col) of a face is seen with row 0 at the top and col 0 at
+    the left: the side faces from outside with the up face on top, the up
+    face from above with the front face at the bottom and the down face from
+    below with the front face on top. Coordinates are doubled so every
+    sticker center is an integer point, with the faces at +-size.
+
+    Args:
+        size (int): Number of stickers per face edge.
+
+    Returns:
+        np.ndarray: (6 * size * size, 3) sticker positions.
+    """
+    rows, cols = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    a = (2 * cols - (size - 1)).ravel()
+    b = ((size - 1) - 2 * rows).ravel()
+    m = np.full(size * size, size)
+
+    return np.concatenate([np.stack([a, -m, b], axis=1),   # down
+                           np.stack([a, b, m], axis=1),    # front
+                           np.stack([m, b, -a], axis=1),   # right
+                           np.stack([-a, b, -m], axis=1),  # back
+                           np.stack([-m, b, a], axis=1),   # left
+                           np.stack([a, m, -b], axis=1)])  # up
+
+
+@lru_cache(maxsize=None)
+def _move_tables(size: int) -> np.ndarray:
+    """Permutations of the stickers for every quarter turn of the cube.
+
+    Move ``2 * face`` turns the face clockwise (seen from outside) and move
+    ``2 * face + 1`` counter-clockwise, with the faces in the order down,
+    front, right, back, left, up. Moving a cube is a gather:
+    ``stickers = stickers[tables[move]]``.
+
+    Args:
+        size (int): Number of stickers per face edge.
+
+    Returns:
+        np.ndarray: Read-only (12, 6 * size * size) array of indices.
+    """
+    points = _sticker_points(size)
+    index = {tuple(point): i for i, point in enumerate(points)}
+    tables = np.empty((12, len(points)), dtype=np.intp)
+    for face, normal in enumerate(_NORMALS):
+        # Stickers of the outer layer, rotated -90 degrees around the normal
+        layer = points @ normal >= size - 1
+        rotated = np.cross(-normal, points[layer]) + np.outer(points[layer] @ normal, normal)
+
+        table = np.arange(len(points))
+        table[[index[tuple(point)] for point in rotated]] = np.flatnonzero(layer)
+        tables[2 * face] = table
+        tables[2 * face + 1] = np.argsort(table)
+
+    tables.flags.writeable = False
+    return tables
+
+
+@lru_cache(maxsize=None)
+def _moved_stickers(size: int) -> Tuple[Tuple[np.ndarray, np.ndarray], ...]:
+    """Stickers changed by every quarter turn of the cube.
+
+    Args:
+        size (int): Number of stickers per face edge.
+
+    Returns:
+        Tuple[Tuple[np.ndarray, np.ndarray], ...]: (destinations, sources)
+            indices of the stickers moved by each move, so a move is
+            ``stickers[destinations] = stickers[sources]``.
+    """
+    moved = []
+    for table in _move_tables(size):
+        destinations = np.flatnonzero(table != np.arange(len(table)))
+        moved.append((destinations, table[destinations]))
+
+    return tuple(moved)
+
+
+@lru_cache(maxsize=None)
+def _input_stickers(size: int) -> np.ndarray:
+    """Stickers encoded as network input. Face turns never move the centers
+    of odd sized cubes, so they are left out.
+
+    Args:
+        size (int): Number of stickers per face edge.
+
+    Returns:
+        np.ndarray: Indices of the encoded stickers.
+    """
+    stickers = np.arange(6 * size * size)
+    if size % 2:
+        center = (size * size) // 2
+        stickers = stickers[stickers % (size * size) != center]
+
+    return stickers
+
+
+# One-hot encoding of every sticker color
+_ONE_HOT = np.eye(6)
 
 
 class GameStateRubik(GameState):
-    def __init__(self, size = 3):
+    """Rubik's cube game state stored as a flat array of sticker colors.
+
+    The stickers of face ``f`` (down, front, right, back, left, up) are
+    ``stickers[f * size * size:(f + 1) * size * size]``, row by row, and
+    every quarter turn is a precomputed permutation of the array.
+
+    The number of stickers matching the color of their face in the solved
+    cube, ``matches``, is updated with every move from the moved stickers
+    only. The fitness of a decision is the fraction of stickers it fixes
+    (negative if it breaks them), plus 1 when it solves the cube.
+    """
+    def __init__(self,
+                 size: int = 3,
+                 seed: Optional[int] = None,
+                 scramble_moves: int = 20):
+        """
+        Args:
+            size (int): Number of stickers per face edge.
+            seed (Optional[int]): Seed of the scramble, random if None.
+            scramble_moves (int): Random moves of the scramble.
+        """
         self.size = size
-        self.down = Face(0, size)
-        self.front = Face(1, size)
-        self.right = Face(2, size)
-        self.back = Face(3, size)
-        self.left = Face(4, size)
-        self.up = Face(5, size)
-        self._scramble()
-
-    def _scramble(self):
-        for i in range(20):
-            self.perform_action(random.randint(0, 11))
+        self.seed = seed
+        self.scramble_moves = scramble_moves
+        self.rng = random.Random(seed)
+        self.stickers = np.repeat(np.arange(6, dtype=np.uint8), size * size)
+        self._solved = self.stickers.copy()
+        self._moves = _move_tables(size)
+        self._moved = _moved_stickers(size)
+        self._inputs = _input_stickers(size)
+        self.matches = len(self.stickers)
+        self._scramble(scramble_moves)
+        self._scored_matches = self.matches
+
+    @staticmethod
+    def turn_batch(stickers: np.ndarray, moves: np.ndarray) -> np.ndarray:
+        """Applies one move to each cube of a batch.
+
+        Args:
+            stickers (np.ndarray): (batch, 6 * size * size) sticker colors.
+            moves (np.ndarray): (batch,) moves, ``2 * face`` for clockwise
+                and ``2 * face + 1`` for counter-clockwise turns.
+
+        Returns:
+            np.ndarray: Stickers of the cubes after the moves.
+        """
+        size = int(np.sqrt(stickers.shape[1] // 6))
+        return np.take_along_axis(stickers, _move_tables(size)[moves], axis=1)
+
+    def face(self, face: int) -> np.ndarray:
+        """Stickers of a face.
+
+        Args:
+            face (int): Face index (down, front, right, back, left, up).
+
+        Returns:
+            np.ndarray: (size, size) view of the face stickers.
+        """
+        n = self.size * self.size
+        return self.stickers[face * n:(face + 1) * n].reshape(self.size, self.size)
+
+    @property
+    def down(self) -> np.ndarray:
+        return self.face(0)
+
+    @property
+    def front(self) -> np.ndarray:
+        return self.face(1)
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.face(2)
+
+    @property
+    def back(self) -> np.ndarray:
+        return self.face(3)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.face(4)
+
+    @property
+    def up(self) -> np.ndarray:
+        return self.face(5)
+
+    def _scramble(self, moves: int):
+        for i in range(moves):
+            self.perform_action(self.rng.randint(0, 11))
+
+    @property
+    def solved(self) -> bool:
+        """If every face of the cube has a single color.
+
+        Returns:
+            bool: True if the cube is solved, False otherwise.
+        """
+        return self.matches == len(self.stickers)
+
+    def _visual_row(self, face: np.ndarray, row: int) -> str:
+        return ''.join(colored(u'\u25ae', _COLORS[color]) for color in face[row])
 
     def visual(self):
-        # colored(u'\u25ae', self.down.get_color(), self.down.get_on_color())
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.up.get_color(0, 0)) +
-              colored(u'\u25ae', self.up.get_color(0, 1)) +
-              colored(u'\u25ae', self.up.get_color(0, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
-
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.up.get_color(1, 0)) +
-              colored(u'\u25ae', self.up.get_color(1, 1)) +
-              colored(u'\u25ae', self.up.get_color(1, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
-
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.up.get_color(2, 0)) +
-              colored(u'\u25ae', self.up.get_color(2, 1)) +
-              colored(u'\u25ae', self.up.get_color(2, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
-
-        print(colored(u'\u25ae', self.left.get_color(0, 0)) +
-              colored(u'\u25ae', self.left.get_color(0, 1)) +
-              colored(u'\u25ae', self.left.get_color(0, 2)) + ' ' +
-              colored(u'\u25ae', self.front.get_color(0, 0)) +
-              colored(u'\u25ae', self.front.get_color(0, 1)) +
-              colored(u'\u25ae', self.front.get_color(0, 2)) + ' ' +
-              colored(u'\u25ae', self.right.get_color(0, 0)) +
-              colored(u'\u25ae', self.right.get_color(0, 1)) +
-              colored(u'\u25ae', self.right.get_color(0, 2)) + ' ' +
-              colored(u'\u25ae', self.back.get_color(0, 0)) +
-              colored(u'\u25ae', self.back.get_color(0, 1)) +
-              colored(u'\u25ae', self.back.get_color(0, 2)))
-
-        print(colored(u'\u25ae', self.left.get_color(1, 0)) +
-              colored(u'\u25ae', self.left.get_color(1, 1)) +
-              colored(u'\u25ae', self.left.get_color(1, 2)) + ' ' +
-              colored(u'\u25ae', self.front.get_color(1, 0)) +
-              colored(u'\u25ae', self.front.get_color(1, 1)) +
-              colored(u'\u25ae', self.front.get_color(1, 2)) + ' ' +
-              colored(u'\u25ae', self.right.get_color(1, 0)) +
-              colored(u'\u25ae', self.right.get_color(1, 1)) +
-              colored(u'\u25ae', self.right.get_color(1, 2)) + ' ' +
-              colored(u'\u25ae', self.back.get_color(1, 0)) +
-              colored(u'\u25ae', self.back.get_color(1, 1)) +
-              colored(u'\u25ae', self.back.get_color(1, 2)))
-
-        print(colored(u'\u25ae', self.left.get_color(2, 0)) +
-              colored(u'\u25ae', self.left.get_color(2, 1)) +
-              colored(u'\u25ae', self.left.get_color(2, 2)) + ' ' +
-              colored(u'\u25ae', self.front.get_color(2, 0)) +
-              colored(u'\u25ae', self.front.get_color(2, 1)) +
-              colored(u'\u25ae', self.front.get_color(2, 2)) + ' ' +
-              colored(u'\u25ae', self.right.get_color(2, 0)) +
-              colored(u'\u25ae', self.right.get_color(2, 1)) +
-              colored(u'\u25ae', self.right.get_color(2, 2)) + ' ' +
-              colored(u'\u25ae', self.back.get_color(2, 0)) +
-              colored(u'\u25ae', self.back.get_color(2, 1)) +
-              colored(u'\u25ae', self.back.get_color(2, 2)))
-
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.down.get_color(0, 0)) +
-              colored(u'\u25ae', self.down.get_color(0, 1)) +
-              colored(u'\u25ae', self.down.get_color(0, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
-
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.down.get_color(1, 0)) +
-              colored(u'\u25ae', self.down.get_color(1, 1)) +
-              colored(u'\u25ae', self.down.get_color(1, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
-
-        print(u'\u25af\u25af\u25af' + ' ' +
-              colored(u'\u25ae', self.down.get_color(2, 0)) +
-              colored(u'\u25ae', self.down.get_color(2, 1)) +
-              colored(u'\u25ae', self.down.get_color(2, 2)) +
-              ' ' + u'\u25af\u25af\u25af' +
-              ' ' + u'\u25af\u25af\u25af' + ' ')
+        blank = u'\u25af' * self.size
+        for row in range(self.size):
+            print(blank + ' ' + self._visual_row(self.up, row) + ' ' + blank + ' ' + blank + ' ')
+
+        for row in range(self.size):
+            print(' '.join(self._visual_row(face, row) for face in (self.left, self.front, self.right, self.back)))
+
+        for row in range(self.size):
+            print(blank + ' ' + self._visual_row(self.down, row) + ' ' + blank + ' ' + blank + ' ')
 
     def input(self):
         move = input("Move ( l | r | u | d | f | b )(' for counter-clockwise): ")
@@ -196,132 +254,71 @@ class GameStateRubik(GameState):
 
         return 0
 
+    def turn(self, face: int, clockwise: bool):
+        """Turns a face of the cube a quarter.
+
+        Args:
+            face (int): Face index (down, front, right, back, left, up).
+            clockwise (bool): Clockwise if truthy, counter-clockwise
+                otherwise.
+        """
+        destinations, sources = self._moved[2 * face + (0 if clockwise else 1)]
+        solved = self._solved[destinations]
+        self.matches -= int(np.count_nonzero(self.stickers[destinations] == solved))
+        self.stickers[destinations] = self.stickers[sources]
+        self.matches += int(np.count_nonzero(self.stickers[destinations] == solved))
+
     def m_left(self, direction):
-        self.left.rotate(direction)
-        # Accessed: F[-1,0] | U[-1,0] | B[-1,2] | D[-1,0]
-        aux = self.up[-1, 0]
-        if direction:
-            self.up.replace(self.back[-1, 2], -1, 0)
-            self.back.replace(self.down[-1, 0], -1, 2)
-            self.down.replace(self.front[-1, 0], -1, 0)
-            self.front.replace(aux, -1, 0)
-        else:
-            self.up.replace(self.front[-1, 0], -1, 0)
-            self.front.replace(self.down[-1, 0], -1, 0)
-            self.down.replace(self.back[-1, 2], -1, 0)
-            self.back.replace(aux, -1, 2)
+        self.turn(4, direction)
 
     def m_right(self, direction):
-        self.right.rotate(direction)
-        # Accessed: F[-1,2] | U[-1,2] | B[-1,0] | D[-1,2]
-        aux = self.up[-1, 2]
-        if direction:
-            self.up.replace(self.front[-1, 2], -1, 2)
-            self.front.replace(self.down[-1, 2], -1, 2)
-            self.down.replace(self.back[-1, 0], -1, 2)
-            self.back.replace(aux, -1, 0)
-        else:
-            self.up.replace(self.back[-1, 0], -1, 2)
-            self.back.replace(self.down[-1, 2], -1, 0)
-            self.down.replace(self.front[-1, 2], -1, 2)
-            self.front.replace(aux, -1, 2)
+        self.turn(2, direction)
 
     def m_up(self, direction):
-        self.up.rotate(direction)
-        # Accessed: F[0, -1] | R[0, -1] | B[0, -1] | L[0, -1]
-        aux = self.front[0, -1]
-        if direction:
-            self.front.replace(self.right[0, -1], 0, -1)
-            self.right.replace(self.back[0, -1], 0, -1)
-            self.back.replace(self.left[0, -1], 0, -1)
-            self.left.replace(aux, 0, -1)
-        else:
-            self.front.replace(self.left[0, -1], 0, -1)
-            self.left.replace(self.back[0, -1], 0, -1)
-            self.back.replace(self.right[0, -1], 0, -1)
-            self.right.replace(aux, 0, -1)
+        self.turn(5, direction)
 
     def m_down(self, direction):
-        self.down.rotate(direction)
-        # Accessed: F[2, -1] | R[2, -1] | B[2, -1] | L[2, -1]
-        aux = self.front[2, -1]
-        if direction:
-            self.front.replace(self.left[2, -1], 2, -1)
-            self.left.replace(self.back[2, -1], 2, -1)
-            self.back.replace(self.right[2, -1], 2, -1)
-            self.right.replace(aux, 2, -1)
-        else:
-            self.front.replace(self.right[2, -1], 2, -1)
-            self.right.replace(self.back[2, -1], 2, -1)
-            self.back.replace(self.left[2, -1], 2, -1)
-            self.left.replace(aux, 2, -1)
+        self.turn(0, direction)
 
     def m_front(self, direction):
-        self.front.rotate(direction)
-        # Accessed: U[2, -1] | R[-1,0] | D[0, -1] | L[-1,2]
-        aux = self.up[2, -1]
-        if direction:
-            self.up.replace(self.left[-1, 2], 2, -1)
-            self.left.replace(self.down[0, -1], -1, 2)
-            self.down.replace(self.right[-1, 0], 0, -1)
-            self.right.replace(aux, -1, 0)
-        else:
-            self.up.replace(self.right[-1, 0], 2, -1)
-            self.right.replace(self.down[0, -1], -1, 0)
-            self.down.replace(self.left[-1, 2], 0, -1)
-            self.left.replace(aux, -1, 2)
+        self.turn(1, direction)
 
     def m_back(self, direction):
-        self.back.rotate(direction)
-        # Accessed: U[0, -1] | R[-1,2] | D[2, -1] | L[-1,0]
-        aux = self.up[0, -1]
-        if direction:
-            self.up.replace(self.right[-1, 2], 0, -1)
-            self.right.replace(self.down[2, -1], -1, 2)
-            self.down.replace(self.left[-1, 0], 2, -1)
-            self.left.replace(aux, -1, 0)
-        else:
-            self.up.replace(self.left[-1, 0], 0, -1)
-            self.left.replace(self.down[2, -1], -1, 0)
-            self.down.replace(self.right[-1, 2], 2, -1)
-            self.right.replace(aux, -1, 2)
+        self.turn(3, direction)
 
     def pre_checks(self) -> bool:
         return True
 
     def perform_action(self, decision: int):
-        face = decision // 2
-        direction = -1 if decision % 2 else 1
+        """Turns a face of the cube.
 
-        if face == 1:
-            self.m_front(direction)
-        elif face == 2:
-            self.m_right(direction)
-        elif face == 3:
-            self.m_back(direction)
-        elif face == 4:
-            self.m_left(direction)
-        elif face == 5:
-            self.m_up(direction)
-        else:
-            self.m_down(direction)
+        Args:
+            decision (int): ``2 * face`` for a clockwise turn of the face and
+                ``2 * face + 1`` for a counter-clockwise one.
+        """
+        self.turn(decision // 2, decision % 2 == 0)
 
     def post_checks(self) -> Tuple[bool, float]:
-        faces = [self.down[:, :], self.front[:, :], self.right[:, :], self.back[:, :], self.left[:, :], self.up[:, :]]
-        for i in range(6):
-            if len(np.unique(faces[i])) > 1:
-                return True, -1.0
+        """Checks after decision execution.
 
-        return False, 0.0
+        Returns:
+            bool: True if the cube is not solved yet, False otherwise.
+            float: Fraction of the stickers fixed since the last check, plus
+                1 if the cube is solved.
+        """
+        delta = (self.matches - self._scored_matches) / len(self.stickers)
+        self._scored_matches = self.matches
+        if self.solved:
+            return False, delta + 1.0
+
+        return True, delta
 
     @property
     def data(self) -> np.ndarray:
-        faces = [self.down[:, :], self.front[:, :], self.right[:, :], self.back[:, :], self.left[:, :], self.up[:, :]]
-        state = np.zeros([6, 3, 3, 6])
-        for i in range(6):
-            for j in range(3):
-                for k in range(3):
-                    state[i, j, k, faces[i][j][k]] = 1.0
-
-        return state.flatten()
+        """One-hot encoding of the colors of the stickers, without the fixed
+        centers of odd sized cubes (288 inputs for a 3x3x3 cube).
 
+        Returns:
+            np.ndarray: Game state data.
+        """
+        return _ONE_HOT[self.stickers[self._inputs]].ravel()
@@ -1,5 +1,6 @@
-from typing import Tuple
+from typing import List, NamedTuple, Optional, Tuple, Union
 from .gamestate import GameState
+from functools import lru_cache
 import numpy as np
 import random
 
@@ -17,78 +18,394 @@ _N_PIECES = len(_PIECES)
 # _GRAVITY = [10, 10, 9, 9, 8, 8, 7, 7, 6, 6, 5, 5, 5, 4, 4, 4, 3, 3, 3, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1]
 _GRAVITY = [1] * 10
 _SCORE_MULTIPLIER = [0, 40, 100, 300, 1200]
+# Bags drawn from each child seed of the numpy piece streams
+_BAGS_PER_CHUNK = 64
+# Bags dealt when a game starts, doubled whenever the game runs out of them
+_INITIAL_BAGS = 4
+
+
+class PieceRotation(NamedTuple):
+    """Precomputed description of one rotation of a piece.
+
+    Offsets are relative to the piece position, with the same (x, y) layout
+    as the grid. Columns and rows are those of the trimmed bounding box,
+    i.e. the smallest box containing every filled cell of the piece.
+    """
+    grid: np.ndarray
+    cells: Tuple[Tuple[int, int], ...]
+    masks: Tuple[Tuple[int, int], ...]
+    left: int
+    right: int
+    bottom: int
+    top: int
+    col_bottoms: Tuple[int, ...]
+    col_heights: Tuple[int, ...]
+    inputs: np.ndarray
+
+    def x_range(self, grid_width: int) -> Tuple[int, int]:
+        """Valid horizontal positions of the piece inside a grid.
+
+        Args:
+            grid_width (int): Width of the grid.
+
+        Returns:
+            Tuple[int, int]: Minimum and maximum valid x positions.
+        """
+        return -self.left, grid_width - 1 - self.right
+
+
+def _build_rotations() -> Tuple[Tuple[PieceRotation, ...], ...]:
+    """Precomputes every rotation of every piece.
+
+    Rotation ``r`` of a piece is the grid obtained after ``r`` clockwise
+    rotations of its entry in ``_PIECES``.
+
+    Returns:
+        Tuple[Tuple[PieceRotation, ...], ...]: The four rotations of each
+            piece, indexed by (piece_id, rotation).
+    """
+    rotations = []
+    for piece in _PIECES:
+        piece_rotations = []
+        for r in range(4):
+            grid = np.ascontiguousarray(np.rot90(piece, -r))
+            grid.flags.writeable = False
+            cells = tuple((int(i), int(j)) for i, j in zip(*np.nonzero(grid)))
+            masks = []
+            for j in range(grid.shape[1]):
+                mask = sum(1 << i for i in range(grid.shape[0]) if grid[i][j])
+                if mask:
+                    masks.append((j, mask))
+            cols = np.nonzero(grid.any(axis=1))[0]
+            rows = np.nonzero(grid.any(axis=0))[0]
+            inputs = np.zeros([4, 4])
+            inputs[:grid.shape[0], :grid.shape[1]] = grid
+            inputs = inputs.flatten()
+            inputs.flags.writeable = False
+            col_bottoms = []
+            col_heights = []
+            for i in range(cols[0], cols[-1] + 1):
+                filled = np.nonzero(grid[i])[0]
+                col_bottoms.append(int(filled[0]))
+                col_heights.append(int(filled[-1]) + 1)
+            piece_rotations.append(PieceRotation(grid=grid,
+                                                 cells=cells,
+                                                 masks=tuple(masks),
+                                                 left=int(cols[0]),
+                                                 right=int(cols[-1]),
+                                                 bottom=int(rows[0]),
+                                                 top=int(rows[-1]),
+                                                 col_bottoms=tuple(col_bottoms),
+                                                 col_heights=tuple(col_heights),
+                                                 inputs=inputs))
+        rotations.append(tuple(piece_rotations))
+
+    return tuple(rotations)
+
+
+_ROTATIONS = _build_rotations()
+
+
+@lru_cache(maxsize=None)
+def _flat_offsets(grid_height: int) -> Tuple[Tuple[np.ndarray, ...], ...]:
+    """Offsets of the cells of every piece rotation in a flattened grid.
+
+    The cell (x, y) of a flattened (width, height) grid is at index
+    ``x * height + y``, so the cells of a piece at (x, y) are at
+    ``x * height + y`` plus these offsets.
+
+    Args:
+        grid_height (int): Height of the grid.
+
+    Returns:
+        Tuple[Tuple[np.ndarray, ...], ...]: Offsets indexed by
+            (piece_id, rotation).
+    """
+    return tuple(tuple(np.array([i * grid_height + j for i, j in rotation.cells], dtype=np.int64)
+                       for rotation in rotations)
+                 for rotations in _ROTATIONS)
+
+
+def _clear_full_rows(grids: np.ndarray) -> np.ndarray:
+    """Removes the complete rows of a grid or a stack of grids, shifting the
+    rows above them down.
+
+    Complete rows are found with a single reduction. The remaining rows of a
+    grid are compacted with a boolean mask gather, and those of a stack with
+    one index gather over the grids with complete rows, where a stable sort
+    moves the complete rows to the top keeping the order of the rest. The
+    rows left at the top are emptied.
+
+    Args:
+        grids (np.ndarray): (width, height) grid or (grids, width, height)
+            stack of grids, modified in place.
+
+    Returns:
+        np.ndarray: Complete rows, (height,) for a grid or (grids, height)
+            for a stack.
+    """
+    full = grids.all(axis=-2)
+    if not full.any():
+        return full
+
+    if grids.ndim == 2:
+        remaining = grids[:, ~full]
+        grids[:, :remaining.shape[1]] = remaining
+        grids[:, remaining.shape[1]:] = 0
+    else:
+        cleared = np.flatnonzero(full.any(axis=1))
+        order = np.argsort(full[cleared], axis=1, kind='stable')
+        compacted = np.take_along_axis(grids[cleared], order[:, np.newaxis, :], axis=2)
+        height = grids.shape[2]
+        kept = np.arange(height) < (height - full[cleared].sum(axis=1))[:, np.newaxis, np.newaxis]
+        grids[cleared] = np.where(kept, compacted, 0)
+
+    return full
+
+
+@lru_cache(maxsize=256)
+def piece_sequence(seed: Union[int, Tuple[int, ...]], n_bags: int) -> np.ndarray:
+    """Pieces dealt by ``GameStateTetris`` for a seed, pregenerated in bulk.
+
+    Pieces are dealt in bags, each one a shuffled permutation of the seven
+    pieces. Integer seeds shuffle the bags with ``random.Random(seed)``, so
+    they deal the pieces they always did, and tuples of integers, e.g.
+    (run seed, generation, genome, episode), get an independent numpy
+    stream where every chunk of bags is drawn from its own child
+    ``SeedSequence``. Sequences only depend on the seed and longer sequences
+    start with the shorter ones, so no generator state is shared between
+    games and the read-only arrays are shared by every game with the same
+    seed.
+
+    Args:
+        seed (Union[int, Tuple[int, ...]]): Integer seed or tuple of
+            non-negative integers.
+        n_bags (int): Number of bags dealt.
+
+    Returns:
+        np.ndarray: Read-only (n_bags * 7,) uint8 piece ids, in dealing
+            order.
+    """
+    if isinstance(seed, tuple):
+        n_chunks = -(-n_bags // _BAGS_PER_CHUNK)
+        bags = np.tile(np.arange(_N_PIECES, dtype=np.uint8), (_BAGS_PER_CHUNK, 1))
+        chunks = [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk,))).permuted(bags, axis=1)
+                  for chunk in range(n_chunks)]
+        sequence = np.concatenate(chunks or [bags[:0]]).ravel()[:n_bags * _N_PIECES]
+    else:
+        rng = random.Random(seed)
+        pieces = []
+        for _ in range(n_bags):
+            bag = list(range(_N_PIECES))
+            rng.shuffle(bag)
+            # Bags are dealt from their end
+            pieces.extend(reversed(bag))
+        sequence = np.array(pieces, dtype=np.uint8)
+
+    sequence.flags.writeable = False
+    return sequence
+
+
+class TetrisSnapshot(NamedTuple):
+    """State of a Tetris game saved by ``GameStateTetris.snapshot``.
+
+    The grid is saved as the engine stores it (a numpy grid or the bitmask
+    rows). The piece sequence only grows, so the position in it is enough to
+    restore the pieces to come.
+    """
+    grid: object
+    grid_data: np.ndarray
+    heights: List[int]
+    col_fills: List[int]
+    row_fills: List[int]
+    active_piece_id: int
+    active_rotation: int
+    active_piece_position: Tuple[int, int]
+    piece_index: int
+    level: int
+    lines_cleared: int
+    pieces_placed: int
+    t: int
 
 
 class GameStateTetris(GameState):
+    __slots__ = ('seed', 'pieces', 'piece_index', 'width', 'height', 'heights', 'col_fills', 'row_fills',
+                 '_features', 'grid', '_grid_data', '_data', '_data_cells', '_data_piece',
+                 'active_piece', 'active_piece_id', 'active_rotation', 'active_piece_position',
+                 'level', 'lines_cleared', 'pieces_placed', 't', '_history')
+
     def __init__(self,
                  grid_width: int = 16,
-                 grid_height: int = 26):
-        random.seed(0)
-        self.grid = np.zeros((grid_width, grid_height))
+                 grid_height: int = 26,
+                 seed: Union[int, Tuple[int, ...]] = 0,
+                 pieces: Optional[np.ndarray] = None):
+        """
+        Args:
+            grid_width (int): Width of the grid.
+            grid_height (int): Height of the grid.
+            seed (Union[int, Tuple[int, ...]]): Seed of the piece sequence,
+                see ``piece_sequence``.
+            pieces (Optional[np.ndarray]): Pregenerated
+                ``piece_sequence(seed, ...)``, e.g. shared by the games of an
+                evaluator. Generated when the game starts by default.
+        """
+        self.seed = seed
+        self.pieces = piece_sequence(seed, _INITIAL_BAGS) if pieces is None else pieces
+        self.piece_index = 0
+        self.width = grid_width
+        self.height = grid_height
+        self.heights = [0] * grid_width
+        self.col_fills = [0] * grid_width
+        self.row_fills = [0] * grid_height
+        self._features = None
+        self._init_grid()
+        self._init_data()
         self.active_piece = None
+        self.active_piece_id = None
+        self.active_rotation = 0
         self.active_piece_position = (0, 0)
-        self.next_pieces = []
         self.level = 0
         self.lines_cleared = 0
+        self.pieces_placed = 0
         self.t = 0
+        self._history = []
         self._next_piece()
 
+    def _init_grid(self):
+        """Creates the empty game grid.
+        """
+        self.grid = np.zeros((self.width, self.height))
+
+    def _init_data(self):
+        """Creates the NN input buffers.
+
+        ``_grid_data`` holds the flattened locked cells and ``_data`` the
+        same cells plus the active piece, which is moved lazily when ``data``
+        is read.
+        """
+        self._grid_data = np.zeros(self.width * self.height)
+        self._data = np.zeros(self.width * self.height)
+        self._data_cells = None
+        self._data_piece = None
+
     def _next_piece(self):
         """Updates the next piece in the game state.
 
-        Choses the next piece in the game state and regenerates the piece bag
-        if it is empty.
+        Deals the next piece of the sequence, which is replaced by one twice
+        as long when its last piece is reached, so the piece after the active
+        one is always known (``next_piece_id``).
         """
-        if len(self.next_pieces) == 0:
-            self.next_pieces = list(range(_N_PIECES))
-            random.shuffle(self.next_pieces)
-        self.active_piece = _PIECES[self.next_pieces[-1]]
-        self.active_piece_position = (self.grid.shape[0] // 2 - 2,
-                                      self.grid.shape[1] - self.active_piece.shape[1])
-        self.next_pieces = self.next_pieces[:-1]
+        self.active_piece_id = int(self.pieces[self.piece_index])
+        self.active_rotation = 0
+        self.active_piece = _ROTATIONS[self.active_piece_id][0].grid
+        self.active_piece_position = (self.width // 2 - 2,
+                                      self.height - self.active_piece.shape[1])
+        self.piece_index += 1
+        if self.piece_index == len(self.pieces):
+            self.pieces = piece_sequence(self.seed, max(2 * len(self.pieces) // _N_PIECES, _INITIAL_BAGS))
+
+    @property
+    def next_piece_id(self) -> int:
+        """Identifier of the piece after the active one.
+
+        Returns:
+            int: Piece identifier.
+        """
+        return int(self.pieces[self.piece_index])
 
     def _check_action(
             self,
             new_position: Tuple[int, int],
-            new_piece: np.ndarray
+            new_rotation: int
     ) -> bool:
-        """Checks if a certain action, described by the new position and grid
-        representation of the piece, is valid.
+        """Checks if a certain action, described by the new position and
+        rotation of the active piece, is valid.
 
         Args:
             new_position (Tuple[int, int]): Future position of the piece.
-            new_piece (np.ndarray): Future grid representation of the piece.
+            new_rotation (int): Future rotation of the piece.
 
         Returns:
             bool: True if future state is valid, False otherwise.
         """
-        # Check left grid bound
-        if new_position[0] < 0:
-            for col in range(-new_position[0]):
-                if np.sum(new_piece[col, :]) > 0:
-                    return False
-
-        # Check right bound
-        if new_position[0] + new_piece.shape[0] > self.grid.shape[0]:
-            relevant_cols = self.grid.shape[0] - (new_position[0] + new_piece.shape[0])
-            for col in range(relevant_cols, 0):
-                if np.sum(new_piece[col, :]) > 0:
-                    return False
-
-        # Check bottom bound
-        if new_position[1] < 0:
-            for row in range(-new_position[1]):
-                if np.sum(new_piece[:, row]) > 0:
-                    return False
+        piece = _ROTATIONS[self.active_piece_id][new_rotation]
+        x, y = new_position
+
+        # Check grid bounds
+        if x + piece.left < 0 or x + piece.right >= self.width or y + piece.bottom < 0:
+            return False
 
         # Check grid colisions
-        for j in range(new_piece.shape[1]):
-            for i in range(new_piece.shape[0]):
-                if new_piece[i][j] == 1 and self.grid[new_position[0] + i][new_position[1] + j] == 1:
-                    return False
+        grid = self.grid
+        for i, j in piece.cells:
+            if grid[x + i, y + j] == 1:
+                return False
 
         return True
 
+    def _clear_rows(self) -> List[int]:
+        """Removes complete rows from the grid, shifting the rows above them
+        down.
+
+        Returns:
+            List[int]: Indices of the complete rows found, in ascending order.
+        """
+        return np.flatnonzero(_clear_full_rows(self.grid)).tolist()
+
+    def _fill_piece(
+            self,
+            position: Tuple[int, int],
+            rotation: int
+    ):
+        """Fills the grid cells covered by the active piece.
+
+        Args:
+            position (Tuple[int, int]): Position of the piece.
+            rotation (int): Rotation of the piece.
+        """
+        x, y = position
+        for i, j in _ROTATIONS[self.active_piece_id][rotation].cells:
+            self.grid[x + i, y + j] = 1
+
+    def _column_height(
+            self,
+            col: int,
+            limit: int
+    ) -> int:
+        """Height of a column, only considering the rows below a limit.
+
+        Args:
+            col (int): Column of the grid.
+            limit (int): First row not considered.
+
+        Returns:
+            int: Index of the highest filled row below the limit plus one, or
+                0 if there is none.
+        """
+        filled = np.nonzero(self.grid[col, :limit])[0]
+        return int(filled[-1]) + 1 if len(filled) else 0
+
+    def _save_rows(self, low: int, high: int) -> np.ndarray:
+        """Copies a range of grid rows.
+
+        Args:
+            low (int): First row copied.
+            high (int): First row not copied.
+
+        Returns:
+            np.ndarray: Copy of the rows, restored by ``_restore_rows``.
+        """
+        return self.grid[:, low:high].copy()
+
+    def _restore_rows(self, low: int, rows: np.ndarray):
+        """Writes back rows copied by ``_save_rows``.
+
+        Args:
+            low (int): First row copied.
+            rows (np.ndarray): Copy of the rows.
+        """
+        self.grid[:, low:low + rows.shape[1]] = rows
+
     def _check_lines(self) -> int:
         """Searches for complete rows in the grid.
 
@@ -98,29 +415,64 @@ class GameStateTetris(GameState):
         Returns:
             int: Number of complete lines found.
         """
-        lines_found = []
-
-        # Search for complete lines
-        for row in range(self.grid.shape[1]):
-            if np.sum(self.grid[:, row]) == self.grid.shape[0]:
-                lines_found.append(row)
-                self.grid[:, row].fill(0)
-
-        # Shift rows if needed
-        shifts = 0
-        for line in lines_found:
-            self.grid[:, line - shifts:] = np.roll(self.grid[:, line - shifts:], -1, axis=1)
-            shifts += 1
+        lines_found = self._clear_rows()
+        lines = len(lines_found)
+
+        # Every complete row is below the top of every column, so columns
+        # only need to be scanned if their top row was cleared
+        if lines:
+            for col in range(self.width):
+                height = self.heights[col]
+                if height - 1 in lines_found:
+                    self.heights[col] = self._column_height(col, height - lines)
+                else:
+                    self.heights[col] = height - lines
+            self.col_fills = [fill - lines for fill in self.col_fills]
+            self.row_fills = [fill for fill in self.row_fills if fill != self.width] + [0] * lines
+            self._features = None
+            self._grid_data[:] = self.grid.ravel()
+            self._data[:] = self._grid_data
+            self._data_cells = None
+            self._data_piece = None
 
-        return len(lines_found)
+        return lines
 
     def _leave_piece(self):
         """The active piece is dropped into the grid, updating its values.
         """
-        for i in range(self.active_piece.shape[0]):
-            for j in range(self.active_piece.shape[1]):
-                if self.active_piece[i][j]:
-                    self.grid[self.active_piece_position[0] + i][self.active_piece_position[1] + j] = 1
+        self._fill_piece(self.active_piece_position, self.active_rotation)
+
+        x, y = self.active_piece_position
+        piece = _ROTATIONS[self.active_piece_id][self.active_rotation]
+        heights = self.heights
+        for col, col_height in enumerate(piece.col_heights, x + piece.left):
+            if y + col_height > heights[col]:
+                heights[col] = y + col_height
+        for i, j in piece.cells:
+            self.col_fills[x + i] += 1
+            self.row_fills[y + j] += 1
+        self._features = None
+        cells = _flat_offsets(self.height)[self.active_piece_id][self.active_rotation] + x * self.height + y
+        self._grid_data[cells] = 1
+        self._data[cells] = 1
+
+    def _landing_row(
+            self,
+            x: int,
+            piece: PieceRotation
+    ) -> int:
+        """Lowest row a piece can rest on when dropped from above the stack.
+
+        Args:
+            x (int): Horizontal position of the piece.
+            piece (PieceRotation): Rotation of the piece.
+
+        Returns:
+            int: Vertical position of the piece after the drop.
+        """
+        heights = self.heights
+        col = x + piece.left
+        return max([heights[col + k] - bottom for k, bottom in enumerate(piece.col_bottoms)])
 
     def _move(
             self,
@@ -140,7 +492,7 @@ class GameStateTetris(GameState):
         else:
             new_position = (self.active_piece_position[0] + direction,
                             self.active_piece_position[1])
-        if self._check_action(new_position, self.active_piece):
+        if self._check_action(new_position, self.active_rotation):
             self.active_piece_position = new_position
             return True
         else:
@@ -158,11 +510,11 @@ class GameStateTetris(GameState):
         Returns:
             bool: True if move has been performed, False otherwise.
         """
-        new_piece = np.copy(self.active_piece)
-        new_piece = np.rot90(new_piece, -direction)
+        new_rotation = (self.active_rotation + direction) % 4
 
-        if self._check_action(self.active_piece_position, new_piece):
-            self.active_piece = new_piece
+        if self._check_action(self.active_piece_position, new_rotation):
+            self.active_rotation = new_rotation
+            self.active_piece = _ROTATIONS[self.active_piece_id][new_rotation].grid
             return True
         else:
             return False
@@ -190,7 +542,7 @@ class GameStateTetris(GameState):
         Returns:
             bool: True if the game state can continue, false otherwise.
         """
-        return self._check_action(self.active_piece_position, self.active_piece)
+        return self._check_action(self.active_piece_position, self.active_rotation)
 
     def perform_action(self, decision: int):
         """Execution of action by game logic.
@@ -214,28 +566,64 @@ class GameStateTetris(GameState):
         else:
             return
 
-    def perform_action_coords(self, x_pos: int, rotation: int):
+    def perform_action_coords(self, x_pos: int, rotation: int) -> bool:
         """Instead of doing individual moves, the agent just chooses a
         horizontal coordinate and rotation for the piece and drops it.
 
+        The piece is rotated and moved at its spawn row, stopping at the first
+        blocked step, and then dropped. Collisions are resolved with the
+        column heights and the bottom profile of the piece, so the whole
+        placement costs O(piece width) unless the stack reaches the spawn
+        row, where it falls back to step by step moves.
+
         Args:
             x_pos (int): Horizontal position of the piece.
             rotation (int): Amount of rotations of the piece.
+
+        Returns:
+            bool: True if the requested placement was reachable, False if the
+                piece was stopped before it.
         """
         real_x_pos = x_pos - 2  # Possible x values go from -2 to width + 2
-        delta_x = real_x_pos - self.active_piece_position[0]
+        reachable = True
 
         # Rotation
         for i in range(rotation):
-            self._rotate(1)
+            if not self._rotate(1):
+                reachable = False
+                break
 
         # Horizontal movement
-        for i in range(abs(delta_x)):
-            self._move(np.sign(delta_x))
+        x, y = self.active_piece_position
+        piece = _ROTATIONS[self.active_piece_id][self.active_rotation]
+        x_min, x_max = piece.x_range(self.width)
+        target = min(max(real_x_pos, x_min), x_max)
+        if target != real_x_pos:
+            reachable = False
+
+        if target != x:
+            start = min(x, target) + piece.left
+            stop = max(x, target) + piece.right + 1
+            if max(self.heights[start:stop]) > y + min(piece.col_bottoms):
+                # The stack reaches the spawn row, move step by step
+                step = 1 if target > x else -1
+                while x != target and self._check_action((x + step, y), self.active_rotation):
+                    x += step
+                if x != target:
+                    reachable = False
+            else:
+                x = target
 
         # Drop until collision
-        while self._move_down():
-            continue
+        landing = self._landing_row(x, piece)
+        if landing <= y:
+            self.active_piece_position = (x, landing)
+        else:
+            self.active_piece_position = (x, y)
+            while self._move_down():
+                continue
+
+        return reachable
 
     def post_checks(self, no_gravity: bool = False) -> Tuple[bool, float]:
         """Post decision checks.
@@ -253,18 +641,19 @@ class GameStateTetris(GameState):
             float: Score update after checks (score delta).
         """
         # Check gravity
-        self.t = (self.t + 1) % _GRAVITY[self.level]
+        self.t = (self.t + 1) % _GRAVITY[min(self.level, len(_GRAVITY) - 1)]
 
         if (not self.t) or no_gravity:
             drop_flag = self._move_down()
 
             if not drop_flag:
                 # Check for end game if piece cannot be dropped
-                if self.active_piece_position[1] == self.grid.shape[1] - self.active_piece.shape[1]:
+                if self.active_piece_position[1] == self.height - self.active_piece.shape[1]:
                     return False, 0.0
 
                 # Put active piece into grid
                 self._leave_piece()
+                self.pieces_placed += 1
 
                 # Check for lines (and shift pieces down if lines are found)
                 # and create new piece
@@ -279,52 +668,174 @@ class GameStateTetris(GameState):
 
         return True, 0.0
 
+    def snapshot(self) -> TetrisSnapshot:
+        """Saves the state of the game, to be restored with ``restore``.
+
+        The grid and the small per column and per row lists are copied, the
+        rest of the state is immutable, so a snapshot costs a few
+        microseconds.
+
+        Returns:
+            TetrisSnapshot: State of the game.
+        """
+        return TetrisSnapshot(grid=self._save_rows(0, self.height),
+                              grid_data=self._grid_data.copy(),
+                              heights=self.heights[:],
+                              col_fills=self.col_fills[:],
+                              row_fills=self.row_fills[:],
+                              active_piece_id=self.active_piece_id,
+                              active_rotation=self.active_rotation,
+                              active_piece_position=self.active_piece_position,
+                              piece_index=self.piece_index,
+                              level=self.level,
+                              lines_cleared=self.lines_cleared,
+                              pieces_placed=self.pieces_placed,
+                              t=self.t)
+
+    def restore(self, snapshot: TetrisSnapshot):
+        """Restores a state saved by ``snapshot``. The same snapshot can be
+        restored any number of times, and the moves made since are
+        forgotten by ``unmake_move``.
+
+        Args:
+            snapshot (TetrisSnapshot): State of the game.
+        """
+        self._restore_rows(0, snapshot.grid)
+        self._grid_data[:] = snapshot.grid_data
+        self._data[:] = snapshot.grid_data
+        self._data_cells = None
+        self._data_piece = None
+        self._features = None
+        self.heights = snapshot.heights[:]
+        self.col_fills = snapshot.col_fills[:]
+        self.row_fills = snapshot.row_fills[:]
+        self.active_piece_id = snapshot.active_piece_id
+        self.active_rotation = snapshot.active_rotation
+        self.active_piece = _ROTATIONS[self.active_piece_id][self.active_rotation].grid
+        self.active_piece_position = snapshot.active_piece_position
+        self.piece_index = snapshot.piece_index
+        self.level = snapshot.level
+        self.lines_cleared = snapshot.lines_cleared
+        self.pieces_placed = snapshot.pieces_placed
+        self.t = snapshot.t
+        self._history = []
+
+    def make_move(self, x_pos: int, rotation: int) -> Tuple[bool, float]:
+        """Places the active piece as ``CoordSimulator`` does
+        (``perform_action_coords`` followed by ``post_checks`` without
+        gravity), saving what it changes so ``unmake_move`` can take it back.
+
+        Line clears never move the rows below the piece, so only the grid
+        rows from the piece to the top of the stack are saved.
+
+        Args:
+            x_pos (int): Horizontal position of the piece.
+            rotation (int): Amount of rotations of the piece.
+
+        Returns:
+            bool: True if the game state can continue, false otherwise.
+            float: Score update after the move (score delta).
+        """
+        previous = (self.active_piece_id, self.active_rotation, self.active_piece_position, self.piece_index,
+                    self.level, self.lines_cleared, self.pieces_placed, self.t)
+        lists = (self.heights[:], self.col_fills[:], self.row_fills[:])
+        self.perform_action_coords(x_pos, rotation)
+
+        x, y = self.active_piece_position
+        piece = _ROTATIONS[self.active_piece_id][self.active_rotation]
+        low = max(y + piece.bottom, 0)
+        high = min(max(max(self.heights), y + piece.top + 1), self.height)
+        rows = self._save_rows(low, high)
+        grid_data = self._grid_data.reshape(self.width, self.height)[:, low:high].copy()
+
+        result = self.post_checks(no_gravity=True)
+        self._history.append((previous, lists, low, rows, grid_data))
+        return result
+
+    def unmake_move(self):
+        """Takes back the last move made by ``make_move``.
+        """
+        previous, lists, low, rows, grid_data = self._history.pop()
+        self.active_piece_id, self.active_rotation, self.active_piece_position, self.piece_index, \
+            self.level, self.lines_cleared, self.pieces_placed, self.t = previous
+        self.active_piece = _ROTATIONS[self.active_piece_id][self.active_rotation].grid
+        self.heights, self.col_fills, self.row_fills = lists
+        self._features = None
+
+        self._restore_rows(low, rows)
+        high = low + grid_data.shape[1]
+        self._grid_data.reshape(self.width, self.height)[:, low:high] = grid_data
+        self._data.reshape(self.width, self.height)[:, low:high] = grid_data
+        if self._data_cells is not None:
+            self._data[self._data_cells] = self._grid_data[self._data_cells]
+        self._data_cells = None
+        self._data_piece = None
+
     @property
     def data(self) -> np.ndarray:
         """Game state data represented as NN input.
 
-        Provides the NN with the following information: Active piece grid,
-        active piece position and game grid.
+        Provides the NN with the game grid, with the cells of the active piece
+        filled in. The buffer is owned by the game state and only the cells of
+        the active piece are updated when it moves, so no copy of the grid is
+        made per frame.
 
         Returns:
-            np.ndarray: Game state data.
+            np.ndarray: Read only view of the game state data, valid until
+                the game state changes.
         """
-        """piece = np.zeros([4, 4])
-        piece[:self.active_piece.shape[0], :self.active_piece.shape[1]] = self.active_piece"""
-        state = np.copy(self.grid)
-        # Place the active piece into the grid
-        for i in range(self.active_piece.shape[0]):
-            for j in range(self.active_piece.shape[1]):
-                current_x, current_y = self.active_piece_position
-                try:
-                    state[i + current_x, j + current_y] = self.active_piece[i, j]
-                except:
-                    continue
-        # return np.concatenate([piece.flatten(), self.active_piece_position, self.grid.flatten()])
-        return state.flatten()
+        piece = (self.active_piece_id, self.active_rotation, self.active_piece_position)
+        if piece != self._data_piece:
+            if self._data_cells is not None:
+                self._data[self._data_cells] = self._grid_data[self._data_cells]
+            x, y = self.active_piece_position
+            self._data_cells = _flat_offsets(self.height)[self.active_piece_id][self.active_rotation] \
+                + x * self.height + y
+            self._data[self._data_cells] = 1
+            self._data_piece = piece
+
+        # The view is made on every read, a cached one would keep pointing to
+        # the buffer of the original game state after a copy or pickle
+        view = self._data.view()
+        view.flags.writeable = False
+        return view
 
     @property
-    def hand_picked_data(self) -> np.ndarray:
-        """
+    def features(self) -> np.ndarray:
+        """Hand crafted features of the grid.
 
-        Returns:
+        The features are kept up to date when pieces are locked and lines are
+        cleared, and cached until the grid changes.
 
+        Returns:
+            np.ndarray: Read only array with the height of each column, the
+                holes (empty cells below the top) of each column and the
+                bumpiness (sum of height differences between neighbouring
+                columns) of the grid.
         """
-        state = np.copy(self.grid)
-        heights = np.zeros(state.shape[0])
+        if self._features is None:
+            heights = np.array(self.heights, dtype=float)
+            holes = heights - self.col_fills
+            bumpiness = np.abs(np.diff(heights)).sum()
+            self._features = np.concatenate([heights, holes, [bumpiness]])
+            self._features.flags.writeable = False
 
-        for i in range(state.shape[0]):
-            for j in range(state.shape[1] - 1, -1):
-                if state[i, j] == 1.0:
-                    heights[i] = state.shape[1] - j
-                    break
+        return self._features
 
-        heights /= state.shape[0]
+    @property
+    def hand_picked_data(self) -> np.ndarray:
+        """Hand picked game state data represented as NN input.
+
+        Provides the NN with the height of each column, relative to the grid
+        height, and the grid of the active piece.
 
-        piece = np.zeros([4, 4])
-        piece[:self.active_piece.shape[0], :self.active_piece.shape[1]] = self.active_piece
+        Returns:
+            np.ndarray: Game state data.
+        """
+        heights = self.features[:self.width] / self.height
+        piece = _ROTATIONS[self.active_piece_id][self.active_rotation].inputs
 
-        return np.concatenate([heights, piece.flatten()])
+        return np.concatenate([heights, piece])
 
     def visual(self):
         """Visual representation of the game state information.
@@ -0,0 +1,158 @@
+from typing import List, Tuple
+from .gamestate_tetris import GameStateTetris, _ROTATIONS
+import numpy as np
+
+
+class GameStateTetrisBitboard(GameStateTetris):
+    """Tetris game state storing every grid row as an integer bitmask.
+
+    Bit ``i`` of ``rows[j]`` is set when cell (i, j) of the grid is filled.
+    Collisions, piece locking and line clearing become a handful of integer
+    operations per piece row, while the game logic (piece bag, gravity,
+    scoring) is shared with ``GameStateTetris``, so both engines produce the
+    same games for the same decisions.
+    """
+    __slots__ = ('rows', 'full_row')
+
+    def _init_grid(self):
+        """Creates the empty game grid.
+        """
+        self.rows = [0] * self.height
+        self.full_row = (1 << self.width) - 1
+
+    @property
+    def grid(self) -> np.ndarray:
+        """Grid representation of the bitboard, with the same layout as
+        ``GameStateTetris.grid``.
+
+        Returns:
+            np.ndarray: (width, height) grid of the locked cells.
+        """
+        rows = np.array(self.rows, dtype=np.int64)
+        bits = (rows[np.newaxis, :] >> np.arange(self.width)[:, np.newaxis]) & 1
+        return bits.astype(float)
+
+    def __getstate__(self) -> tuple:
+        """State copied and pickled, which leaves out the ``grid`` slot of
+        ``GameStateTetris`` since the grid is computed from the rows.
+
+        Returns:
+            tuple: No instance dictionary and the value of every slot.
+        """
+        slots = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != 'grid':
+                    slots[name] = getattr(self, name)
+
+        return None, slots
+
+    def _check_action(
+            self,
+            new_position: Tuple[int, int],
+            new_rotation: int
+    ) -> bool:
+        """Checks if a certain action, described by the new position and
+        rotation of the active piece, is valid.
+
+        Args:
+            new_position (Tuple[int, int]): Future position of the piece.
+            new_rotation (int): Future rotation of the piece.
+
+        Returns:
+            bool: True if future state is valid, False otherwise.
+        """
+        piece = _ROTATIONS[self.active_piece_id][new_rotation]
+        x, y = new_position
+
+        # Check grid bounds
+        if x + piece.left < 0 or x + piece.right >= self.width or y + piece.bottom < 0:
+            return False
+
+        # Check grid colisions
+        rows = self.rows
+        masks = piece.masks
+        if x >= 0:
+            for j, mask in masks:
+                if rows[y + j] & (mask << x):
+                    return False
+        else:
+            for j, mask in masks:
+                if rows[y + j] & (mask >> -x):
+                    return False
+
+        return True
+
+    def _clear_rows(self) -> List[int]:
+        """Removes complete rows from the grid, shifting the rows above them
+        down.
+
+        Returns:
+            List[int]: Indices of the complete rows found, in ascending order.
+        """
+        full_row = self.full_row
+        lines_found = [row for row, mask in enumerate(self.rows) if mask == full_row]
+        if lines_found:
+            remaining = [mask for mask in self.rows if mask != full_row]
+            self.rows = remaining + [0] * len(lines_found)
+
+        return lines_found
+
+    def _save_rows(self, low: int, high: int) -> List[int]:
+        """Copies a range of grid rows.
+
+        Args:
+            low (int): First row copied.
+            high (int): First row not copied.
+
+        Returns:
+            List[int]: Copy of the rows, restored by ``_restore_rows``.
+        """
+        return self.rows[low:high]
+
+    def _restore_rows(self, low: int, rows: List[int]):
+        """Writes back rows copied by ``_save_rows``.
+
+        Args:
+            low (int): First row copied.
+            rows (List[int]): Copy of the rows.
+        """
+        self.rows[low:low + len(rows)] = rows
+
+    def _fill_piece(
+            self,
+            position: Tuple[int, int],
+            rotation: int
+    ):
+        """Fills the grid cells covered by the active piece.
+
+        Args:
+            position (Tuple[int, int]): Position of the piece.
+            rotation (int): Rotation of the piece.
+        """
+        x, y = position
+        rows = self.rows
+        for j, mask in _ROTATIONS[self.active_piece_id][rotation].masks:
+            rows[y + j] |= mask << x if x >= 0 else mask >> -x
+
+    def _column_height(
+            self,
+            col: int,
+            limit: int
+    ) -> int:
+        """Height of a column, only considering the rows below a limit.
+
+        Args:
+            col (int): Column of the grid.
+            limit (int): First row not considered.
+
+        Returns:
+            int: Index of the highest filled row below the limit plus one, or
+                0 if there is none.
+        """
+        bit = 1 << col
+        for row in range(limit - 1, -1, -1):
+            if self.rows[row] & bit:
+                return row + 1
+
+        return 0
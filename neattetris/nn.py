@@ -0,0 +1,296 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from neat.graphs import feed_forward_layers
+import numpy as np
+
+
+def _median(x: np.ndarray) -> np.ndarray:
+    return np.median(x, axis=1) if x.shape[1] else np.zeros(len(x))
+
+
+def _maxabs(x: np.ndarray) -> np.ndarray:
+    return np.take_along_axis(x, np.abs(x).argmax(axis=1)[:, np.newaxis], axis=1)[:, 0]
+
+
+def _inv(z: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', over='ignore'):
+        inv = 1.0 / z
+    return np.where(np.isfinite(inv), inv, 0.0)
+
+
+# Vectorized versions of the built-in activation functions of neat-python,
+# with the same scaling and clamping
+_ACTIVATIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'sigmoid': lambda z: 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0))),
+    'tanh': lambda z: np.tanh(np.clip(2.5 * z, -60.0, 60.0)),
+    'sin': lambda z: np.sin(np.clip(5.0 * z, -60.0, 60.0)),
+    'gauss': lambda z: np.exp(-5.0 * np.clip(z, -3.4, 3.4) ** 2),
+    'relu': lambda z: np.where(z > 0.0, z, 0.0),
+    'softplus': lambda z: 0.2 * np.log1p(np.exp(np.clip(5.0 * z, -60.0, 60.0))),
+    'identity': lambda z: z,
+    'clamped': lambda z: np.clip(z, -1.0, 1.0),
+    'inv': _inv,
+    'log': lambda z: np.log(np.maximum(z, 1e-7)),
+    'exp': lambda z: np.exp(np.clip(z, -60.0, 60.0)),
+    'abs': np.abs,
+    'hat': lambda z: np.maximum(0.0, 1.0 - np.abs(z)),
+    'square': np.square,
+    'cube': lambda z: z ** 3,
+}
+
+# Vectorized versions of the built-in aggregation functions of neat-python,
+# reducing the weighted inputs of every sample (axis 1)
+_AGGREGATIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'product': lambda x: np.prod(x, axis=1),
+    'max': lambda x: np.max(x, axis=1),
+    'min': lambda x: np.min(x, axis=1),
+    'maxabs': _maxabs,
+    'median': _median,
+    'mean': lambda x: np.mean(x, axis=1),
+}
+
+
+class _Layer(NamedTuple):
+    """Nodes of a network evaluated at the same time.
+
+    The nodes of the layer own the value columns [start, end). Nodes with
+    sum aggregation are evaluated with a single matrix product over all the
+    previous columns, the rest through their own weighted inputs.
+    """
+    start: int
+    end: int
+    sum_nodes: np.ndarray
+    weights: Optional[np.ndarray]
+    other_nodes: List[Tuple[int, Callable, np.ndarray, np.ndarray]]
+    biases: np.ndarray
+    responses: np.ndarray
+    activations: List[Tuple[Callable, np.ndarray]]
+
+
+def _vectorize(function: Callable, aggregation: bool = False) -> Callable:
+    """Vectorizes a custom (scalar) neat-python function.
+
+    Args:
+        function (Callable): Activation or aggregation function.
+        aggregation (bool): If the function is an aggregation, reducing the
+            weighted inputs of each sample.
+
+    Returns:
+        Callable: Function working over arrays.
+    """
+    if aggregation:
+        return lambda x: np.array([function(list(row)) for row in x], dtype=float)
+    return np.vectorize(function, otypes=[float])
+
+
+class CompiledNetwork:
+    """Feed forward network compiled into layered NumPy weight matrices.
+
+    The topological layers of a genome are computed once, and every layer is
+    evaluated with one matrix product for all its nodes. The same network can
+    evaluate a single input, as ``neat.nn.FeedForwardNetwork.activate``, or a
+    batch of inputs (several frames or games) in a single call. Outputs match
+    ``FeedForwardNetwork`` up to floating point rounding.
+    """
+    def __init__(self,
+                 n_inputs: int,
+                 n_values: int,
+                 output_columns: np.ndarray,
+                 layers: List[_Layer]):
+        self.n_inputs = n_inputs
+        self.n_values = n_values
+        self.output_columns = output_columns
+        self.layers = layers
+
+    @staticmethod
+    def create(genome, config) -> 'CompiledNetwork':
+        """Compiles a genome into a network.
+
+        Args:
+            genome (neat.DefaultGenome): Feed forward genome.
+            config (neat.Config): NEAT configuration.
+
+        Returns:
+            CompiledNetwork: Network of the genome.
+        """
+        genome_config = config.genome_config
+        connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+        layers = feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections)
+
+        columns = {key: i for i, key in enumerate(genome_config.input_keys)}
+        incoming = {}
+        for key in connections:
+            incoming.setdefault(key[1], []).append((key[0], genome.connections[key].weight))
+
+        compiled_layers = []
+        for layer in layers:
+            nodes = sorted(layer)
+            start = len(columns)
+            sum_nodes = []
+            weights = np.zeros((start, len(nodes)))
+            other_nodes = []
+            activations = {}
+            for pos, node in enumerate(nodes):
+                gene = genome.nodes[node]
+                links = incoming.get(node, [])
+                if gene.aggregation == 'sum':
+                    sum_nodes.append(pos)
+                    for in_node, weight in links:
+                        weights[columns[in_node], pos] = weight
+                else:
+                    aggregation = _AGGREGATIONS.get(gene.aggregation)
+                    if aggregation is None:
+                        aggregation = _vectorize(
+                            genome_config.aggregation_function_defs.get(gene.aggregation), aggregation=True)
+                    other_nodes.append((pos,
+                                        aggregation,
+                                        np.array([columns[i] for i, _ in links], dtype=np.int64),
+                                        np.array([w for _, w in links])))
+                activations.setdefault(gene.activation, []).append(pos)
+
+            for pos, node in enumerate(nodes):
+                columns[node] = start + pos
+
+            activation_functions = []
+            for name, positions in activations.items():
+                activation = _ACTIVATIONS.get(name)
+                if activation is None:
+                    activation = _vectorize(genome_config.activation_defs.get(name))
+                activation_functions.append((activation, np.array(positions, dtype=np.int64)))
+
+            sum_nodes = np.array(sum_nodes, dtype=np.int64)
+            compiled_layers.append(_Layer(
+                start=start,
+                end=len(columns),
+                sum_nodes=sum_nodes,
+                weights=weights[:, sum_nodes] if len(sum_nodes) else None,
+                other_nodes=other_nodes,
+                biases=np.array([genome.nodes[node].bias for node in nodes]),
+                responses=np.array([genome.nodes[node].response for node in nodes]),
+                activations=activation_functions))
+
+        # Outputs never reached by the layers stay at 0, as in
+        # FeedForwardNetwork, reading an extra column that is never written
+        n_values = len(columns)
+        output_columns = np.array([columns.get(key, n_values) for key in genome_config.output_keys],
+                                  dtype=np.int64)
+
+        return CompiledNetwork(len(genome_config.input_keys), n_values, output_columns, compiled_layers)
+
+    def activate_batch(self, inputs: np.ndarray) -> np.ndarray:
+        """Evaluates the network for a batch of inputs.
+
+        Args:
+            inputs (np.ndarray): (batch, inputs) array.
+
+        Returns:
+            np.ndarray: (batch, outputs) array.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.ndim != 2 or inputs.shape[1] != self.n_inputs:
+            raise RuntimeError("Expected {0:n} inputs, got {1}".format(self.n_inputs, inputs.shape))
+
+        values = np.zeros((len(inputs), self.n_values + 1))
+        values[:, :self.n_inputs] = inputs
+        for layer in self.layers:
+            z = np.empty((len(inputs), layer.end - layer.start))
+            if layer.weights is not None:
+                z[:, layer.sum_nodes] = values[:, :layer.start] @ layer.weights
+            for pos, aggregation, columns, weights in layer.other_nodes:
+                z[:, pos] = aggregation(values[:, columns] * weights)
+            z = layer.biases + layer.responses * z
+            for activation, positions in layer.activations:
+                values[:, layer.start + positions] = activation(z[:, positions])
+
+        return values[:, self.output_columns]
+
+    def activate(self, inputs: np.ndarray) -> np.ndarray:
+        """Evaluates the network for a single input, with the same interface
+        as ``neat.nn.FeedForwardNetwork.activate``.
+
+        Args:
+            inputs (np.ndarray): Network inputs.
+
+        Returns:
+            np.ndarray: Network outputs.
+        """
+        return self.activate_batch(np.asarray(inputs, dtype=float)[np.newaxis])[0]
+
+
+class _NodeGene(NamedTuple):
+    bias: float
+    response: float
+    activation: str
+    aggregation: str
+
+
+class _ConnectionGene(NamedTuple):
+    key: Tuple[int, int]
+    weight: float
+    enabled: bool
+
+
+class ArrayGenome(NamedTuple):
+    """Network of a genome decoded by ``genome_from_array``, with the node
+    and (enabled) connection genes read by ``CompiledNetwork.create`` and
+    ``neattetris.cache.genome_key``, so it can be evaluated in place of the
+    genome.
+    """
+    key: int
+    nodes: Dict[int, _NodeGene]
+    connections: Dict[Tuple[int, int], _ConnectionGene]
+
+
+def _function_names(genome_config) -> Tuple[List[str], List[str]]:
+    """Activation and aggregation function names of a genome configuration,
+    in the order they are encoded by ``genome_to_array``.
+    """
+    return sorted(genome_config.activation_defs.functions), sorted(genome_config.aggregation_function_defs.functions)
+
+
+def genome_to_array(genome, config) -> np.ndarray:
+    """Encodes the network of a genome as a flat array of weights, much
+    cheaper to send to another process than the genome itself.
+
+    The array holds the genome key and the number of nodes and enabled
+    connections, followed by a (key, bias, response, activation,
+    aggregation) row per node and an (input, output, weight) row per enabled
+    connection. Functions are stored as their index among the functions of
+    the configuration.
+
+    Args:
+        genome (neat.DefaultGenome): Feed forward genome.
+        config (neat.Config): NEAT configuration.
+
+    Returns:
+        np.ndarray: Encoded genome.
+    """
+    activations, aggregations = _function_names(config.genome_config)
+    nodes = [(key, node.bias, node.response, activations.index(node.activation),
+              aggregations.index(node.aggregation)) for key, node in genome.nodes.items()]
+    connections = [(key[0], key[1], connection.weight)
+                   for key, connection in genome.connections.items() if connection.enabled]
+
+    return np.concatenate([[genome.key, len(nodes), len(connections)],
+                           np.ravel(nodes), np.ravel(connections)])
+
+
+def genome_from_array(array: np.ndarray, config) -> ArrayGenome:
+    """Decodes a genome encoded by ``genome_to_array``.
+
+    Args:
+        array (np.ndarray): Encoded genome.
+        config (neat.Config): NEAT configuration the genome was encoded with.
+
+    Returns:
+        ArrayGenome: Network of the genome.
+    """
+    activations, aggregations = _function_names(config.genome_config)
+    key, n_nodes, n_connections = (int(value) for value in array[:3])
+    nodes = array[3:3 + 5 * n_nodes].reshape(n_nodes, 5).tolist()
+    connections = array[3 + 5 * n_nodes:3 + 5 * n_nodes + 3 * n_connections].reshape(n_connections, 3).tolist()
+
+    return ArrayGenome(key,
+                       {int(node): _NodeGene(bias, response, activations[int(activation)],
+                                             aggregations[int(aggregation)])
+                        for node, bias, response, activation, aggregation in nodes},
+                       {(int(i), int(o)): _ConnectionGene((int(i), int(o)), weight, True) for i, o, weight in connections})
@@ -0,0 +1,514 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from multiprocessing import shared_memory
+from neattetris.nn import genome_from_array, genome_to_array
+import copy
+import multiprocessing
+import numpy as np
+import os
+
+
+# Evaluation function and NEAT configuration of the current worker process,
+# installed once when the worker starts.
+_eval_function = None
+_config = None
+
+
+def _init_worker(eval_function: Callable, config):
+    """Worker initializer, stores the evaluation context in the process.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        config (neat.Config): NEAT configuration.
+    """
+    global _eval_function, _config
+    _eval_function = eval_function
+    _config = config
+
+
+def _evaluate_genome(eval_function: Callable,
+                     genome,
+                     config,
+                     elite: Optional[float],
+                     known: Optional[list]) -> Tuple[float, Optional[Dict[int, float]]]:
+    """Evaluates a genome inside a worker process.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        genome (neat.DefaultGenome): Genome to evaluate.
+        config (neat.Config): NEAT configuration.
+        elite (Optional[float]): Elite fitness passed to the evaluation
+            function, if any.
+        known (Optional[list]): Cached fitness of the game of every seed,
+            given by ``_lookup``, None if the evaluation function has no
+            cache.
+
+    Returns:
+        float: Fitness of the genome.
+        Optional[Dict[int, float]]: Fitness of the games played, by seed
+            index, to cache in the parent process.
+    """
+    if known is not None:
+        return eval_function.games(genome, config, elite, known)
+    if elite is None:
+        return eval_function(genome, config), None
+    return eval_function(genome, config, elite), None
+
+
+def _evaluate_chunk(task: Tuple[list, Optional[float]]) -> List[Tuple[float, Optional[Dict[int, float]]]]:
+    """Evaluates a chunk of genomes inside a worker process.
+
+    Args:
+        task (Tuple[list, Optional[float]]): (genome, cached game fitnesses)
+            pairs to evaluate and elite fitness passed to the evaluation
+            function, if any.
+
+    Returns:
+        List[Tuple[float, Optional[Dict[int, float]]]]: Fitness and games
+            played of each genome, in the same order.
+    """
+    chunk, elite = task
+    return [_evaluate_genome(_eval_function, genome, _config, elite, known) for genome, known in chunk]
+
+
+def _worker_function(eval_function: Callable) -> Callable:
+    """Evaluation function sent to the workers, without the fitness cache,
+    which stays in the parent process.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+
+    Returns:
+        Callable: Evaluation function, or a copy without cache.
+    """
+    if getattr(eval_function, 'cache', None) is None:
+        return eval_function
+    eval_function = copy.copy(eval_function)
+    eval_function.cache = None
+    return eval_function
+
+
+def _lookup(eval_function: Callable, genomes: list, config, elite: Optional[float]) -> Tuple[List[int], list, list]:
+    """Looks up the games of a generation in the fitness cache of the
+    evaluation function, if it has one, setting the fitness of the genomes
+    whose games are all cached.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        genomes (list): Genomes to evaluate.
+        config (neat.Config): NEAT configuration.
+        elite (Optional[float]): Elite fitness passed to the evaluation
+            function, if any.
+
+    Returns:
+        List[int]: Indices of the genomes left to evaluate.
+        list: Cache keys of the games of every genome, for ``_store``.
+        list: Cached fitness of the games of every genome, sent to the
+            workers, None for every genome if there is no cache.
+    """
+    if getattr(eval_function, 'cache', None) is None:
+        return list(range(len(genomes))), [None] * len(genomes), [None] * len(genomes)
+
+    missing = []
+    keys = []
+    knowns = []
+    for i, genome in enumerate(genomes):
+        genome_keys, known = eval_function.lookup(genome)
+        keys.append(genome_keys)
+        knowns.append(known)
+        if genome_keys is not None and None not in known:
+            genome.fitness = eval_function.games(genome, config, elite, known)[0]
+        else:
+            missing.append(i)
+
+    return missing, keys, knowns
+
+
+def _store(eval_function: Callable, keys: Optional[list], played: Optional[Dict[int, float]]):
+    """Caches the games played by a worker in the parent process.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        keys (Optional[list]): Cache keys of the games of the genome.
+        played (Optional[Dict[int, float]]): Fitness of the games played,
+            None if the evaluation function has no cache.
+    """
+    if played is not None:
+        eval_function.store(keys, played)
+
+
+class ParallelEvaluator:
+    """Evaluates genomes in a pool of worker processes.
+
+    The pool is created on the first generation and kept alive until
+    ``close`` is called, so process startup, imports and the transfer of the
+    evaluation function and configuration are paid once per run. Each
+    generation only ships the genomes, grouped in chunks.
+
+    The ``FitnessCache`` of a ``neattetris.evaluation.Evaluator`` is kept
+    in this process: genomes whose games are all cached are not sent to the
+    workers, the others are sent with the fitness of their cached games,
+    and the games played by the workers are cached on return.
+
+    Instances can be passed directly as the fitness function of
+    ``neat.Population.run``::
+
+        with ParallelEvaluator(eval_genome, num_workers=32) as evaluator:
+            winner = p.run(evaluator.evaluate, 2000)
+    """
+    def __init__(self,
+                 eval_function: Callable,
+                 num_workers: Optional[int] = None,
+                 chunksize: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 elite_cutoff: bool = False):
+        """
+        Args:
+            eval_function (Callable): Function receiving a genome and the
+                NEAT configuration and returning its fitness. It must be
+                picklable (defined at module level).
+            num_workers (Optional[int]): Number of worker processes. Defaults
+                to the number of CPUs.
+            chunksize (Optional[int]): Genomes sent to a worker per task.
+                Defaults to splitting each generation in four tasks per
+                worker.
+            timeout (Optional[float]): Maximum seconds to wait for a
+                generation to be evaluated.
+            elite_cutoff (bool): If the best fitness of the previous
+                generation is passed to the evaluation function as a third
+                argument, the elite fitness used by
+                ``neattetris.evaluation.TetrisEvaluator`` to stop evaluating
+                genomes early. With elitism and deterministic evaluations the
+                best genome of a generation is kept in the next one with the
+                same fitness, so it is a lower bound of the next elite.
+        """
+        self.num_workers = num_workers or os.cpu_count()
+        self.eval_function = eval_function
+        self.chunksize = chunksize
+        self.timeout = timeout
+        self.elite_cutoff = elite_cutoff
+        self.best_fitness = None
+        self.pool = None
+        self._config = None
+
+    def _start(self, config):
+        """Starts the worker pool for a NEAT configuration.
+
+        Args:
+            config (neat.Config): NEAT configuration.
+        """
+        self.close()
+        self._config = config
+        self.pool = multiprocessing.Pool(self.num_workers,
+                                         initializer=_init_worker,
+                                         initargs=(_worker_function(self.eval_function), config))
+
+    def _chunks(self, genomes: list) -> List[list]:
+        """Splits the genomes of a generation in tasks.
+
+        Args:
+            genomes (list): Genomes to evaluate.
+
+        Returns:
+            List[list]: Consecutive chunks of genomes.
+        """
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = max(1, -(-len(genomes) // (self.num_workers * 4)))
+
+        return [genomes[i:i + chunksize] for i in range(0, len(genomes), chunksize)]
+
+    def evaluate(self, genomes: List[Tuple[int, object]], config):
+        """Evaluates a generation, setting the fitness of every genome.
+
+        Args:
+            genomes (List[Tuple[int, object]]): (genome_id, genome) pairs.
+            config (neat.Config): NEAT configuration.
+        """
+        if self.pool is None or config is not self._config:
+            self._start(config)
+
+        genomes = [genome for _, genome in genomes]
+        elite = self.best_fitness if self.elite_cutoff else None
+        missing, keys, knowns = _lookup(self.eval_function, genomes, config, elite)
+        if missing:
+            tasks = [([(genomes[i], knowns[i]) for i in chunk], elite) for chunk in self._chunks(missing)]
+            results = self.pool.map_async(_evaluate_chunk, tasks, chunksize=1)
+            index_iter = iter(missing)
+            for chunk in results.get(self.timeout):
+                for fitness, played in chunk:
+                    i = next(index_iter)
+                    genomes[i].fitness = fitness
+                    _store(self.eval_function, keys[i], played)
+
+        self.best_fitness = max(genome.fitness for genome in genomes)
+
+    def close(self):
+        """Stops the worker pool.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, 'pool', None) is not None:
+            self.close()
+
+
+# Evaluation context of the current shared memory worker process: the
+# evaluation function, NEAT configuration, name of the piece sequence block
+# and every shared memory block attached, by name.
+_shared_eval_function = None
+_shared_config = None
+_shared_pieces = None
+_shared_blocks: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attaches a shared memory block to the worker, once.
+
+    Args:
+        name (str): Name of the block.
+
+    Returns:
+        shared_memory.SharedMemory: Block.
+    """
+    block = _shared_blocks.get(name)
+    if block is None:
+        block = _shared_blocks[name] = shared_memory.SharedMemory(name=name)
+    return block
+
+
+def _detach_except(names: Tuple[str, ...]):
+    """Detaches the blocks replaced by the parent process.
+
+    Args:
+        names (Tuple[str, ...]): Names of the blocks still in use.
+    """
+    for name in [name for name in _shared_blocks if name not in names and name != _shared_pieces]:
+        _shared_blocks.pop(name).close()
+
+
+def _init_shared_worker(eval_function: Callable, config, pieces: Optional[Tuple[str, Tuple[int, int]]]):
+    """Shared memory worker initializer, stores the evaluation context in the
+    process and points the piece sequences of the evaluation function to the
+    shared block.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        config (neat.Config): NEAT configuration.
+        pieces (Optional[Tuple[str, Tuple[int, int]]]): Name and shape of
+            the block holding the piece sequence of every seed, if any.
+    """
+    global _shared_eval_function, _shared_config, _shared_pieces
+    _shared_eval_function = eval_function
+    _shared_config = config
+    if pieces is not None:
+        _shared_pieces, shape = pieces
+        sequences = np.ndarray(shape, dtype=np.uint8, buffer=_attach(_shared_pieces).buf)
+        sequences.flags.writeable = False
+        eval_function.pieces = dict(zip(eval_function.seeds, sequences))
+
+
+def _genome_block(block: shared_memory.SharedMemory) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Views of a block of encoded genomes, which holds the number of
+    genomes, the offset of every genome in the data and the data, the
+    genomes encoded by ``genome_to_array`` one after another.
+
+    Args:
+        block (shared_memory.SharedMemory): Block of genomes.
+
+    Returns:
+        int: Number of genomes.
+        np.ndarray: (genomes + 1,) offsets.
+        np.ndarray: Encoded genomes.
+    """
+    n_genomes = int(np.ndarray((1,), dtype=np.int64, buffer=block.buf)[0])
+    offsets = np.ndarray((n_genomes + 1,), dtype=np.int64, buffer=block.buf, offset=8)
+    data = np.ndarray((int(offsets[-1]),), dtype=np.float64, buffer=block.buf, offset=8 * (n_genomes + 2))
+    return n_genomes, offsets, data
+
+
+def _evaluate_shared_chunk(task: Tuple[str, str, int, int, Optional[float], list]) -> list:
+    """Evaluates a chunk of genomes inside a shared memory worker process.
+
+    Args:
+        task (Tuple[str, str, int, int, Optional[float], list]): Names of the
+            genome and result blocks, range of genomes to evaluate, elite
+            fitness passed to the evaluation function, if any, and cached
+            game fitnesses of the genomes in the range.
+
+    Returns:
+        list: Fitness of the games played by each genome in the range, None
+            if the evaluation function has no cache.
+    """
+    genomes_name, results_name, start, stop, elite, knowns = task
+    _detach_except((genomes_name, results_name))
+    n_genomes, offsets, data = _genome_block(_attach(genomes_name))
+    results = np.ndarray((n_genomes,), dtype=np.float64, buffer=_attach(results_name).buf)
+    games = []
+    for i, known in zip(range(start, stop), knowns):
+        genome = genome_from_array(data[offsets[i]:offsets[i + 1]], _shared_config)
+        results[i], played = _evaluate_genome(_shared_eval_function, genome, _shared_config, elite, known)
+        games.append(played)
+    return games
+
+
+class SharedMemoryEvaluator(ParallelEvaluator):
+    """Evaluates genomes in a pool of worker processes, exchanging them
+    through shared memory instead of pickling them.
+
+    Every generation, the genomes are encoded as flat weight arrays
+    (``neattetris.nn.genome_to_array``) into a shared block and the workers
+    write the fitnesses into a shared result array, so tasks only carry the
+    block names and a range of genomes. The piece sequences of a
+    ``neattetris.evaluation.TetrisEvaluator`` are placed in another block
+    when the pool starts and read in place by every worker.
+
+    Workers evaluate the decoded networks (``neattetris.nn.ArrayGenome``),
+    which the evaluators of ``neattetris.evaluation`` accept in place of
+    genomes. The fitness cache stays in this process, as in
+    ``ParallelEvaluator``. Blocks are freed by ``close``.
+    """
+    def __init__(self,
+                 eval_function: Callable,
+                 num_workers: Optional[int] = None,
+                 chunksize: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 elite_cutoff: bool = False):
+        """
+        Args:
+            eval_function (Callable): Function receiving a genome and the
+                NEAT configuration and returning its fitness, e.g. a
+                ``neattetris.evaluation.Evaluator``. It must be picklable.
+            num_workers (Optional[int]): Number of worker processes. Defaults
+                to the number of CPUs.
+            chunksize (Optional[int]): Genomes evaluated by a worker per
+                task. Defaults to splitting each generation in four tasks per
+                worker.
+            timeout (Optional[float]): Maximum seconds to wait for a
+                generation to be evaluated.
+            elite_cutoff (bool): If the best fitness of the previous
+                generation is passed to the evaluation function as a third
+                argument, see ``ParallelEvaluator``.
+        """
+        super().__init__(eval_function, num_workers, chunksize, timeout, elite_cutoff)
+        self._pieces = None
+        self._genomes = None
+        self._results = None
+
+    def _start(self, config):
+        """Starts the worker pool for a NEAT configuration, sharing the piece
+        sequences of the evaluation function.
+
+        Args:
+            config (neat.Config): NEAT configuration.
+        """
+        self.close()
+        self._config = config
+        eval_function = _worker_function(self.eval_function)
+        pieces = None
+        sequences = getattr(eval_function, 'pieces', None)
+        if sequences:
+            sequences = np.stack([sequences[seed] for seed in eval_function.seeds])
+            self._pieces = shared_memory.SharedMemory(create=True, size=sequences.nbytes)
+            np.ndarray(sequences.shape, dtype=np.uint8, buffer=self._pieces.buf)[:] = sequences
+            pieces = (self._pieces.name, sequences.shape)
+            # Workers get the sequences from the block
+            eval_function = copy.copy(eval_function)
+            eval_function.pieces = {}
+
+        self.pool = multiprocessing.Pool(self.num_workers,
+                                         initializer=_init_shared_worker,
+                                         initargs=(eval_function, config, pieces))
+
+    @staticmethod
+    def _block(block: Optional[shared_memory.SharedMemory], size: int) -> shared_memory.SharedMemory:
+        """Shared block of at least a given size, replacing a smaller one.
+
+        Args:
+            block (Optional[shared_memory.SharedMemory]): Current block, if
+                any.
+            size (int): Bytes needed.
+
+        Returns:
+            shared_memory.SharedMemory: Current block, or a new one twice as
+                large.
+        """
+        if block is not None and block.size >= size:
+            return block
+
+        if block is not None:
+            block.close()
+            block.unlink()
+        return shared_memory.SharedMemory(create=True, size=max(size, 2 * (block.size if block else 0)))
+
+    def evaluate(self, genomes: List[Tuple[int, object]], config):
+        """Evaluates a generation, setting the fitness of every genome.
+
+        Args:
+            genomes (List[Tuple[int, object]]): (genome_id, genome) pairs.
+            config (neat.Config): NEAT configuration.
+        """
+        if self.pool is None or config is not self._config:
+            self._start(config)
+
+        genomes = [genome for _, genome in genomes]
+        elite = self.best_fitness if self.elite_cutoff else None
+        missing, keys, knowns = _lookup(self.eval_function, genomes, config, elite)
+        self._evaluate_missing([genomes[i] for i in missing], [knowns[i] for i in missing],
+                               [keys[i] for i in missing], config, elite)
+        self.best_fitness = max(genome.fitness for genome in genomes)
+
+    def _evaluate_missing(self, genomes: list, knowns: list, keys: list, config, elite: Optional[float]):
+        """Evaluates the genomes not found in the fitness cache through the
+        shared blocks.
+
+        Args:
+            genomes (list): Genomes to evaluate.
+            knowns (list): Cached game fitnesses of every genome.
+            keys (list): Cache keys of the games of every genome.
+            config (neat.Config): NEAT configuration.
+            elite (Optional[float]): Elite fitness passed to the evaluation
+                function, if any.
+        """
+        if not genomes:
+            return
+
+        arrays = [genome_to_array(genome, config) for genome in genomes]
+        offsets = np.concatenate([[0], np.cumsum([len(array) for array in arrays])])
+        self._genomes = self._block(self._genomes, 8 * (len(genomes) + 2 + int(offsets[-1])))
+        self._results = self._block(self._results, 8 * len(genomes))
+        buffer = self._genomes.buf
+        np.ndarray((1,), dtype=np.int64, buffer=buffer)[0] = len(genomes)
+        np.ndarray((len(genomes) + 1,), dtype=np.int64, buffer=buffer, offset=8)[:] = offsets
+        np.ndarray((int(offsets[-1]),), dtype=np.float64, buffer=buffer,
+                   offset=8 * (len(genomes) + 2))[:] = np.concatenate(arrays)
+
+        chunks = self._chunks(list(range(len(genomes))))
+        tasks = [(self._genomes.name, self._results.name, chunk[0], chunk[-1] + 1, elite,
+                  knowns[chunk[0]:chunk[-1] + 1]) for chunk in chunks]
+        games = self.pool.map_async(_evaluate_shared_chunk, tasks, chunksize=1).get(self.timeout)
+
+        results = np.ndarray((len(genomes),), dtype=np.float64, buffer=self._results.buf)
+        for genome, genome_keys, fitness, played in zip(genomes, keys, results.tolist(),
+                                                        (played for chunk in games for played in chunk)):
+            genome.fitness = fitness
+            _store(self.eval_function, genome_keys, played)
+
+    def close(self):
+        """Stops the worker pool and frees the shared blocks.
+        """
+        super().close()
+        for name in ('_pieces', '_genomes', '_results'):
+            block = getattr(self, name, None)
+            if block is not None:
+                block.close()
+                block.unlink()
+                setattr(self, name, None)
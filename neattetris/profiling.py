@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Tuple
+from neat.reporting import BaseReporter
+import numpy as np
+
+
+# Phases of a simulation step, in execution order
+PHASES = ('pre_checks', 'data', 'activate', 'perform_action', 'post_checks')
+
+
+class SimulationProfiler:
+    """Per-phase counters of the simulation steps.
+
+    Simulators given a profiler time every phase of their steps with
+    ``time.perf_counter_ns`` and add it to plain integer counters, and record
+    the number of steps of every simulation along with the genome being
+    evaluated (``genome``, set by the evaluators). Simulators without a
+    profiler run their regular steps, so profiling costs nothing when it is
+    disabled.
+    """
+    def __init__(self):
+        self.genome = None
+        self.reset()
+
+    def reset(self):
+        """Clears the counters.
+        """
+        self.times = [0] * len(PHASES)
+        self.calls = [0] * len(PHASES)
+        self.episodes: List[Tuple[Optional[int], int]] = []
+
+    def record_step(self, *timestamps: int):
+        """Adds the phases of a step to the counters.
+
+        Args:
+            *timestamps (int): Nanosecond timestamps at the start of the step
+                and at the end of every phase executed, in order.
+        """
+        times = self.times
+        calls = self.calls
+        for phase in range(len(timestamps) - 1):
+            times[phase] += timestamps[phase + 1] - timestamps[phase]
+            calls[phase] += 1
+
+    def record_episode(self, steps: int):
+        """Records a finished simulation.
+
+        Args:
+            steps (int): Steps of the simulation.
+        """
+        self.episodes.append((self.genome, steps))
+
+    def summary(self, bins: int = 10) -> Dict:
+        """Summary of the counters.
+
+        Args:
+            bins (int): Bins of the histogram of steps per genome.
+
+        Returns:
+            Dict: Seconds, calls, mean microseconds per call and share of
+                the step time of every phase, and steps per genome with their
+                histogram.
+        """
+        total = sum(self.times)
+        phases = {}
+        for phase, name in enumerate(PHASES):
+            calls = self.calls[phase]
+            phases[name] = {
+                'seconds': self.times[phase] / 1e9,
+                'calls': calls,
+                'mean_us': self.times[phase] / calls / 1e3 if calls else 0.0,
+                'share': self.times[phase] / total if total else 0.0,
+            }
+
+        genome_steps = {}
+        for genome, steps in self.episodes:
+            genome_steps[genome] = genome_steps.get(genome, 0) + steps
+
+        counts, edges = np.histogram(list(genome_steps.values()), bins=bins) if genome_steps else ([], [])
+        return {
+            'phases': phases,
+            'episodes': len(self.episodes),
+            'steps': sum(steps for _, steps in self.episodes),
+            'genome_steps': genome_steps,
+            'steps_histogram': {'counts': list(map(int, counts)), 'edges': list(map(float, edges))},
+        }
+
+
+class ProfilingReporter(BaseReporter):
+    """Reports the simulation profile of every generation after it is
+    evaluated, and resets the profiler for the next one.
+
+    Only simulations run by the process owning the profiler are counted, so
+    it has to be used with serial evaluation: the workers of a
+    ``neattetris.parallel.ParallelEvaluator`` profile their own copies.
+    """
+    def __init__(self, profiler: SimulationProfiler, bins: int = 10, show: bool = True):
+        """
+        Args:
+            profiler (SimulationProfiler): Profiler of the simulators.
+            bins (int): Bins of the histogram of steps per genome.
+            show (bool): If the profile is printed every generation.
+        """
+        self.profiler = profiler
+        self.bins = bins
+        self.show = show
+        self.history: List[Dict] = []
+
+    def post_evaluate(self, config, population, species, best_genome):
+        summary = self.profiler.summary(self.bins)
+        self.history.append(summary)
+        self.profiler.reset()
+
+        if self.show:
+            print('Simulation profile: {} episodes, {} steps'.format(summary['episodes'], summary['steps']))
+            for name, phase in summary['phases'].items():
+                print('    {:<15} {:8.3f} s {:6.1%} {:10d} calls {:9.2f} us/call'.format(
+                    name, phase['seconds'], phase['share'], phase['calls'], phase['mean_us']))
+            histogram = summary['steps_histogram']
+            if histogram['counts']:
+                print('    Steps per genome: {}'.format(' '.join(
+                    '[{:.0f}, {:.0f}): {}'.format(start, end, count) for start, end, count in
+                    zip(histogram['edges'], histogram['edges'][1:], histogram['counts']))))
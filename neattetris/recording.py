@@ -0,0 +1,228 @@
+from typing import List, NamedTuple, Optional, Tuple, Union
+from neat.reporting import BaseReporter
+from neattetris.gamestates import GameStateRubik
+from neattetris.gamestates.gamestate import GameState
+from neattetris.nn import CompiledNetwork
+import numpy as np
+import struct
+
+
+# Magic, version, game, action format, width (or cube size), height (or
+# scramble moves), seed length (0 for an integer seed, the length of a tuple
+# seed otherwise), integer seed, fitness, number of pieces and number of
+# steps. The words of a tuple seed follow the header.
+_HEADER = struct.Struct('<4sBBBHHBqdII')
+_SEED_WORD = struct.Struct('<Q')
+# Version 1 headers, with integer seeds only
+_HEADER_V1 = struct.Struct('<4sBBBHHqdII')
+_MAGIC = b'NTEP'
+_VERSION = 2
+_GAMES = ('tetris', 'rubik')
+_ACTION_FORMATS = ('action', 'coords')
+
+
+class Episode(NamedTuple):
+    """Recorded game: how to create its game state and the decision of every
+    step, enough to replay it exactly.
+
+    Tetris games store the grid width and height, and rubik games the cube
+    size and scramble moves. The seed is an integer or, for Tetris, a tuple
+    of integers (see ``piece_sequence``). ``pieces`` holds the id of every
+    piece played (Tetris only) and ``decisions`` one action per step, or one
+    (x, rotation) row per step for the 'coords' format.
+    """
+    game: str
+    action_format: str
+    width: int
+    height: int
+    seed: Union[int, Tuple[int, ...]]
+    fitness: float
+    pieces: np.ndarray
+    decisions: np.ndarray
+
+    def to_bytes(self) -> bytes:
+        """Binary representation of the episode.
+
+        Returns:
+            bytes: Header followed by the words of a tuple seed, the pieces
+                and the decisions, one byte each.
+        """
+        words = self.seed if isinstance(self.seed, tuple) else ()
+        header = _HEADER.pack(_MAGIC, _VERSION, _GAMES.index(self.game),
+                              _ACTION_FORMATS.index(self.action_format),
+                              self.width, self.height, len(words), 0 if words else self.seed, self.fitness,
+                              len(self.pieces), len(self.decisions))
+        seed = b''.join(_SEED_WORD.pack(word) for word in words)
+        return header + seed + self.pieces.astype(np.uint8).tobytes() + self.decisions.astype(np.uint8).tobytes()
+
+    @staticmethod
+    def from_bytes(buffer: bytes, offset: int = 0) -> Tuple['Episode', int]:
+        """Reads an episode from its binary representation.
+
+        Args:
+            buffer (bytes): Buffer holding the episode.
+            offset (int): Position of the episode in the buffer.
+
+        Returns:
+            Episode: Episode read.
+            int: Position after the episode in the buffer.
+        """
+        magic, version = struct.unpack_from('<4sB', buffer, offset)
+        if magic != _MAGIC or version not in (1, _VERSION):
+            raise ValueError('No episode found at offset {}'.format(offset))
+        if version == 1:
+            _, _, game, action_format, width, height, seed, fitness, n_pieces, n_steps = \
+                _HEADER_V1.unpack_from(buffer, offset)
+            offset += _HEADER_V1.size
+        else:
+            _, _, game, action_format, width, height, seed_length, seed, fitness, n_pieces, n_steps = \
+                _HEADER.unpack_from(buffer, offset)
+            offset += _HEADER.size
+            if seed_length:
+                seed = tuple(_SEED_WORD.unpack_from(buffer, offset + i * _SEED_WORD.size)[0]
+                             for i in range(seed_length))
+                offset += seed_length * _SEED_WORD.size
+
+        pieces = np.frombuffer(buffer, dtype=np.uint8, count=n_pieces, offset=offset)
+        offset += n_pieces
+        action_format = _ACTION_FORMATS[action_format]
+        size = 2 if action_format == 'coords' else 1
+        decisions = np.frombuffer(buffer, dtype=np.uint8, count=n_steps * size, offset=offset)
+        offset += n_steps * size
+        if size == 2:
+            decisions = decisions.reshape(-1, 2)
+
+        return Episode(_GAMES[game], action_format, width, height, seed, fitness, pieces, decisions), offset
+
+
+def read_episodes(path: str) -> List[Episode]:
+    """Reads every episode of a file written by ``EpisodeRecorder``.
+
+    Args:
+        path (str): Episode file.
+
+    Returns:
+        List[Episode]: Episodes, in recording order.
+    """
+    with open(path, 'rb') as f:
+        buffer = f.read()
+
+    episodes = []
+    offset = 0
+    while offset < len(buffer):
+        episode, offset = Episode.from_bytes(buffer, offset)
+        episodes.append(episode)
+
+    return episodes
+
+
+class EpisodeRecorder:
+    """Records the simulations of the simulators it is given to.
+
+    Episodes are kept in ``episodes`` and/or appended to a binary file, and
+    are replayed with ``neattetris.simulator.EpisodeReplayer``. Recording only
+    stores the decision of every step, with no rendering.
+    """
+    def __init__(self, path: Optional[str] = None, keep: bool = True):
+        """
+        Args:
+            path (Optional[str]): File the episodes are appended to, if any.
+            keep (bool): If the episodes are kept in memory.
+        """
+        self.path = path
+        self.keep = keep
+        self.episodes: List[Episode] = []
+        self._game_state = None
+        self._action_format = None
+        self._pieces: List[int] = []
+        self._decisions: List[int] = []
+
+    def start(self, game_state: GameState, action_format: str):
+        """Starts recording a simulation.
+
+        Args:
+            game_state (GameState): Game state of the simulation, which must
+                have been created with an integer seed or a tuple of
+                non-negative integers.
+            action_format (str): 'action' for one action per step, 'coords'
+                for one (x, rotation) placement per step.
+        """
+        seed = getattr(game_state, 'seed', None)
+        if isinstance(seed, tuple):
+            if not all(isinstance(word, (int, np.integer)) and 0 <= word < 1 << 64 for word in seed):
+                raise ValueError('Only tuple seeds of non-negative 64 bit integers can be recorded')
+        elif not isinstance(seed, (int, np.integer)):
+            raise ValueError('Only games created with an integer or tuple seed can be recorded')
+
+        self._game_state = game_state
+        self._action_format = action_format
+        self._pieces = []
+        self._decisions = []
+
+    def record(self, decision):
+        """Records the decision of a step, before it is performed.
+
+        Args:
+            decision: Action or (x, rotation) placement.
+        """
+        game_state = self._game_state
+        if not isinstance(game_state, GameStateRubik) and game_state.pieces_placed == len(self._pieces):
+            self._pieces.append(game_state.active_piece_id)
+
+        if self._action_format == 'coords':
+            self._decisions.extend(decision)
+        else:
+            self._decisions.append(decision)
+
+    def finish(self, fitness: float) -> Episode:
+        """Finishes recording a simulation.
+
+        Args:
+            fitness (float): Fitness of the simulation.
+
+        Returns:
+            Episode: Recorded episode.
+        """
+        game_state = self._game_state
+        decisions = np.array(self._decisions, dtype=np.uint8)
+        if self._action_format == 'coords':
+            decisions = decisions.reshape(-1, 2)
+
+        if isinstance(game_state, GameStateRubik):
+            episode = Episode('rubik', self._action_format, game_state.size, game_state.scramble_moves,
+                              game_state.seed, float(fitness), np.zeros(0, dtype=np.uint8), decisions)
+        else:
+            episode = Episode('tetris', self._action_format, game_state.width, game_state.height,
+                              game_state.seed, float(fitness), np.array(self._pieces, dtype=np.uint8), decisions)
+
+        if self.keep:
+            self.episodes.append(episode)
+        if self.path is not None:
+            with open(self.path, 'ab') as f:
+                f.write(episode.to_bytes())
+
+        self._game_state = None
+        return episode
+
+
+class EliteRecorder(BaseReporter):
+    """Records the games of the best genome of every generation, playing its
+    seeds again once the generation is evaluated.
+    """
+    def __init__(self, evaluator, path: str):
+        """
+        Args:
+            evaluator (neattetris.evaluation.Evaluator): Evaluator of the
+                run, whose seeds are played.
+            path (str): File the episodes are appended to.
+        """
+        self.evaluator = evaluator
+        self.recorder = EpisodeRecorder(path, keep=False)
+
+    def post_evaluate(self, config, population, species, best_genome):
+        net = CompiledNetwork.create(best_genome, config)
+        for seed in self.evaluator.seeds:
+            # Replays are not part of the profiled evaluation
+            simulator, state = self.evaluator.game(seed, self.recorder)
+            simulator.profiler = None
+            simulator.simulation(net, state)
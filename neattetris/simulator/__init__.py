@@ -1 +1,7 @@
-from .simulator import Simulator
\ No newline at end of file
+from .simulator import Simulator, CoordSimulator, RubikSimulator
+from .batch_simulator import BatchSimulator
+from .search_simulator import SearchSimulator
+from .replay import EpisodeReplayer
+
+__all__ = ['Simulator', 'CoordSimulator', 'RubikSimulator', 'BatchSimulator', 'SearchSimulator',
+           'EpisodeReplayer']
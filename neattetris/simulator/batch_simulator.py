@@ -0,0 +1,383 @@
+from typing import List, Optional, Tuple, Union
+from neattetris.gamestates.gamestate_tetris import _ROTATIONS, _N_PIECES, _SCORE_MULTIPLIER, _clear_full_rows, \
+    piece_sequence
+from neat.nn import FeedForwardNetwork
+import numpy as np
+import time
+
+
+def _build_tables() -> Tuple[np.ndarray, ...]:
+    """Stacks the rotation table of ``GameStateTetris`` into arrays indexed
+    by (piece_id, rotation), so it can be gathered for a whole batch.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Cell offsets (7, 4, 4, 2), leftmost, rightmost
+            and lowest filled offsets (7, 4), bottom profiles padded to four
+            columns (7, 4, 4), piece sizes (7,) and NN encoding of the spawn
+            rotation (7, 16).
+    """
+    cells = np.zeros((_N_PIECES, 4, 4, 2), dtype=np.int64)
+    left = np.zeros((_N_PIECES, 4), dtype=np.int64)
+    right = np.zeros((_N_PIECES, 4), dtype=np.int64)
+    bottom = np.zeros((_N_PIECES, 4), dtype=np.int64)
+    # Missing columns get a huge bottom so they never define the landing row
+    col_bottoms = np.full((_N_PIECES, 4, 4), 1 << 20, dtype=np.int64)
+    sizes = np.zeros(_N_PIECES, dtype=np.int64)
+    inputs = np.zeros((_N_PIECES, 16))
+
+    for p, rotations in enumerate(_ROTATIONS):
+        sizes[p] = rotations[0].grid.shape[1]
+        inputs[p] = rotations[0].inputs
+        for r, rotation in enumerate(rotations):
+            cells[p, r] = rotation.cells
+            left[p, r] = rotation.left
+            right[p, r] = rotation.right
+            bottom[p, r] = rotation.bottom
+            col_bottoms[p, r, :len(rotation.col_bottoms)] = rotation.col_bottoms
+
+    return cells, left, right, bottom, col_bottoms, sizes, inputs
+
+
+_CELLS, _LEFT, _RIGHT, _BOTTOM, _COL_BOTTOMS, _SIZES, _PIECE_INPUTS = _build_tables()
+
+
+class BatchSimulator:
+    """Coordinate simulator stepping many Tetris games in lockstep.
+
+    The boards of all games are stacked in a single (games, width, height)
+    array, and the pre-decision checks, placements, line clears and feature
+    extraction of every step are vectorized over the games still running.
+    Finished games are dropped from the working arrays, so the cost of a step
+    follows the number of active games.
+
+    Every game follows the rules of ``GameStateTetris`` driven by
+    ``CoordSimulator``, so the fitness of each game is the same one
+    ``CoordSimulator.simulation`` returns for its network, including the
+    step, piece and wall clock budgets (every step places one piece).
+    """
+    def __init__(self,
+                 grid_width: int = 10,
+                 grid_height: int = 20,
+                 max_steps: Optional[int] = None,
+                 max_pieces: Optional[int] = None,
+                 max_time: Optional[float] = None,
+                 truncation_fitness: float = 0.0):
+        """
+        Args:
+            grid_width (int): Width of the grids.
+            grid_height (int): Height of the grids.
+            max_steps (Optional[int]): Maximum simulation steps.
+            max_pieces (Optional[int]): Maximum pieces placed.
+            max_time (Optional[float]): Maximum wall clock seconds.
+            truncation_fitness (float): Fitness added to truncated games.
+        """
+        self.width = grid_width
+        self.height = grid_height
+        self.max_steps = max_steps
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.truncation_fitness = truncation_fitness
+        self.truncated = np.zeros(0, dtype=bool)
+        self.sequences = np.zeros((0, 0), dtype=np.uint8)
+        self._seeds = []
+
+    def _reset_sequences(self, seeds: List[Union[int, Tuple[int, ...]]]):
+        """Restarts the piece sequences of the games.
+
+        Every seed gets the ``piece_sequence`` of ``GameStateTetris``, so
+        every game sees the same pieces as a ``GameStateTetris`` with the same
+        seed would.
+
+        Args:
+            seeds (List[Union[int, Tuple[int, ...]]]): Distinct seeds of the
+                games.
+        """
+        self._seeds = seeds
+        self.sequences = np.zeros((len(seeds), 0), dtype=np.uint8)
+
+    def _pieces(
+            self,
+            sequences: np.ndarray,
+            index: np.ndarray
+    ) -> np.ndarray:
+        """Pieces at given positions of the sequences, extending them with
+        new bags when needed.
+
+        Args:
+            sequences (np.ndarray): Sequence of each game.
+            index (np.ndarray): Position of each game in its sequence.
+
+        Returns:
+            np.ndarray: Piece ids.
+        """
+        needed = int(index.max()) + 1 if len(index) else 0
+        if needed > self.sequences.shape[1]:
+            n_bags = max(2 * self.sequences.shape[1], needed + _N_PIECES - 1) // _N_PIECES
+            self.sequences = np.stack([piece_sequence(seed, n_bags) for seed in self._seeds])
+
+        return self.sequences[sequences, index].astype(np.int64)
+
+    def _fits(
+            self,
+            grids: np.ndarray,
+            pieces: np.ndarray,
+            rotations: np.ndarray,
+            x: np.ndarray,
+            y: np.ndarray
+    ) -> np.ndarray:
+        """Checks if pieces fit in their grids.
+
+        Args:
+            grids (np.ndarray): Grids of the games.
+            pieces (np.ndarray): Piece of each game.
+            rotations (np.ndarray): Rotation of each piece.
+            x (np.ndarray): Horizontal position of each piece.
+            y (np.ndarray): Vertical position of each piece.
+
+        Returns:
+            np.ndarray: True for the pieces that fit in their grid.
+        """
+        inside = (x + _LEFT[pieces, rotations] >= 0) & \
+                 (x + _RIGHT[pieces, rotations] < self.width) & \
+                 (y + _BOTTOM[pieces, rotations] >= 0)
+        cells = _CELLS[pieces, rotations]
+        xs = np.clip(x[:, np.newaxis] + cells[..., 0], 0, self.width - 1)
+        ys = np.clip(y[:, np.newaxis] + cells[..., 1], 0, self.height - 1)
+        games = np.arange(len(grids))[:, np.newaxis]
+
+        return inside & ~grids[games, xs, ys].any(axis=1)
+
+    def _features(
+            self,
+            heights: np.ndarray,
+            pieces: np.ndarray
+    ) -> np.ndarray:
+        """NN inputs of every game, as ``GameStateTetris.hand_picked_data``.
+
+        Args:
+            heights (np.ndarray): Column heights of each game.
+            pieces (np.ndarray): Active piece of each game.
+
+        Returns:
+            np.ndarray: (games, inputs) array of NN inputs.
+        """
+        return np.concatenate([heights / self.height, _PIECE_INPUTS[pieces]], axis=1)
+
+    def _activate(
+            self,
+            nets: List[FeedForwardNetwork],
+            games: np.ndarray,
+            inputs: np.ndarray
+    ) -> np.ndarray:
+        """Evaluates the NN inputs of a group of games.
+
+        Games sharing a network are evaluated with a single call when the
+        network supports batches (``activate_batch``), and one input at a time
+        otherwise.
+
+        Args:
+            nets (List[FeedForwardNetwork]): Neural network of every game.
+            games (np.ndarray): Games to evaluate.
+            inputs (np.ndarray): NN inputs of those games.
+
+        Returns:
+            np.ndarray: (games, outputs) array of NN outputs.
+        """
+        groups = {}
+        for row, game in enumerate(games):
+            groups.setdefault(id(nets[game]), []).append(row)
+
+        outputs = None
+        for rows in groups.values():
+            net = nets[games[rows[0]]]
+            if hasattr(net, 'activate_batch'):
+                group_outputs = net.activate_batch(inputs[rows])
+            else:
+                group_outputs = np.array([net.activate(inputs[row]) for row in rows])
+            if outputs is None:
+                outputs = np.empty((len(games), group_outputs.shape[1]))
+            outputs[rows] = group_outputs
+
+        return outputs
+
+    def _place_slow(
+            self,
+            grid: np.ndarray,
+            piece: int,
+            rotation: int,
+            x: int,
+            y: int,
+            target: int
+    ) -> Tuple[int, int]:
+        """Step by step placement of a single piece, used when the stack
+        reaches the spawn row of the piece.
+
+        Args:
+            grid (np.ndarray): Grid of the game.
+            piece (int): Piece id.
+            rotation (int): Rotation of the piece.
+            x (int): Horizontal spawn position.
+            y (int): Vertical spawn position.
+            target (int): Horizontal target position.
+
+        Returns:
+            Tuple[int, int]: Final position of the piece.
+        """
+        def fits(new_x, new_y):
+            return self._fits(grid[np.newaxis],
+                              np.array([piece]),
+                              np.array([rotation]),
+                              np.array([new_x]),
+                              np.array([new_y]))[0]
+
+        step = 1 if target > x else -1
+        while x != target and fits(x + step, y):
+            x += step
+        while fits(x, y - 1):
+            y -= 1
+
+        return x, y
+
+    def _clear_lines(self, grids: np.ndarray) -> np.ndarray:
+        """Removes the complete rows of every grid, shifting the rows above
+        them down.
+
+        Args:
+            grids (np.ndarray): Grids of the games, modified in place.
+
+        Returns:
+            np.ndarray: Number of lines cleared in each grid.
+        """
+        return _clear_full_rows(grids).sum(axis=1)
+
+    def simulation(
+            self,
+            nets: List[FeedForwardNetwork],
+            seeds: Optional[List[Union[int, Tuple[int, ...]]]] = None
+    ) -> np.ndarray:
+        """Simulation of a batch of neural networks, one game per network.
+
+        The same network can appear several times in the batch, each
+        occurrence playing its own game, e.g. to score a network over several
+        seeds.
+
+        Args:
+            nets (List[FeedForwardNetwork]): Neural network agents deciding
+                the placements of each game.
+            seeds (Optional[List[Union[int, Tuple[int, ...]]]]): Piece
+                sequence seed of each game. Defaults to 0 for every game.
+
+        Returns:
+            np.ndarray: Fitness of each game. Games stopped by a budget are
+                flagged in ``truncated``.
+        """
+        n_games = len(nets)
+        width, height = self.width, self.height
+        if seeds is None:
+            seeds = [0] * n_games
+        distinct_seeds = {seed: i for i, seed in enumerate(dict.fromkeys(seeds))}
+        sequences = np.array([distinct_seeds[seed] for seed in seeds], dtype=np.int64)
+        self._reset_sequences(list(distinct_seeds))
+        fitness = np.zeros(n_games)
+
+        # Working arrays, only holding the games still running
+        games = np.arange(n_games)
+        grids = np.zeros((n_games, width, height), dtype=bool)
+        heights = np.zeros((n_games, width), dtype=np.int64)
+        counts = np.zeros(n_games, dtype=np.int64)
+        lines_cleared = np.zeros(n_games, dtype=np.int64)
+        spawn_x = width // 2 - 2
+        self.truncated = np.zeros(n_games, dtype=bool)
+        max_steps = min([budget for budget in (self.max_steps, self.max_pieces) if budget is not None],
+                        default=None)
+        deadline = time.perf_counter() + self.max_time if self.max_time is not None else None
+        step = 0
+
+        while len(games):
+            if (max_steps is not None and step >= max_steps) or \
+                    (deadline is not None and time.perf_counter() >= deadline):
+                self.truncated[games] = True
+                fitness[games] += self.truncation_fitness
+                break
+            step += 1
+
+            pieces = self._pieces(sequences, counts)
+            x = np.full(len(games), spawn_x)
+            y = height - _SIZES[pieces]
+            rotations = np.zeros(len(games), dtype=np.int64)
+
+            # 0. Pre-decision checks
+            alive = self._fits(grids, pieces, rotations, x, y)
+
+            # 1. Evaluation of game states by the agents
+            inputs = self._features(heights, pieces)
+            targets = np.zeros(len(games), dtype=np.int64)
+            requested = np.zeros(len(games), dtype=np.int64)
+            deciding = np.nonzero(alive)[0]
+            if len(deciding):
+                outputs = self._activate(nets, games[deciding], inputs[deciding])
+                targets[deciding] = outputs[:, :-4].argmax(axis=1) - 2  # Possible x values go from -2 to width + 2
+                requested[deciding] = outputs[:, -4:].argmax(axis=1)
+
+            # 2. Placement: rotations at the spawn row, stopping at the first
+            # blocked one
+            rotating = alive.copy()
+            for r in range(1, 4):
+                rotating &= requested >= r
+                if not rotating.any():
+                    break
+                rotating &= self._fits(grids, pieces, np.full(len(games), r), x, y)
+                rotations[rotating] = r
+
+            # Horizontal movement and drop resolved from the column heights
+            targets = np.clip(targets, -_LEFT[pieces, rotations], width - 1 - _RIGHT[pieces, rotations])
+            start = np.minimum(x, targets) + _LEFT[pieces, rotations]
+            stop = np.maximum(x, targets) + _RIGHT[pieces, rotations]
+            columns = np.arange(width)
+            span = (columns >= start[:, np.newaxis]) & (columns <= stop[:, np.newaxis])
+            span_height = np.where(span, heights, 0).max(axis=1)
+            col_bottoms = _COL_BOTTOMS[pieces, rotations]
+            path_free = span_height <= y + col_bottoms.min(axis=1)
+
+            piece_cols = np.clip(targets[:, np.newaxis] + _LEFT[pieces, rotations][:, np.newaxis] + np.arange(4),
+                                 0, width - 1)
+            landing = (np.take_along_axis(heights, piece_cols, axis=1) - col_bottoms).max(axis=1)
+            fast = path_free & (landing <= y)
+            x = np.where(fast, targets, x)
+            new_y = np.where(fast, landing, y)
+            for i in np.nonzero(alive & ~fast)[0]:
+                x[i], new_y[i] = self._place_slow(grids[i], pieces[i], rotations[i], x[i], y[i], targets[i])
+
+            # 3. Post-decision checks: pieces that cannot leave the spawn row
+            # end the game, the rest are locked into the grid
+            alive &= new_y != y
+            locking = np.nonzero(alive)[0]
+            cells = _CELLS[pieces[locking], rotations[locking]]
+            xs = x[locking, np.newaxis] + cells[..., 0]
+            ys = new_y[locking, np.newaxis] + cells[..., 1]
+            grids[locking[:, np.newaxis], xs, ys] = True
+            for k in range(4):
+                col_heights = heights[locking, xs[:, k]]
+                heights[locking, xs[:, k]] = np.maximum(col_heights, ys[:, k] + 1)
+
+            lines = self._clear_lines(grids)
+            cleared = np.nonzero(lines)[0]
+            if len(cleared):
+                filled = grids[cleared][:, :, ::-1]
+                heights[cleared] = np.where(filled.any(axis=2), height - filled.argmax(axis=2), 0)
+
+            scores = np.take(_SCORE_MULTIPLIER, lines) * (lines_cleared // 10 + 1)
+            lines_cleared += lines
+            fitness[games[alive]] += 1.0 + scores[alive]
+            counts += 1
+
+            # Drop finished games from the working arrays
+            if not alive.all():
+                games = games[alive]
+                sequences = sequences[alive]
+                grids = grids[alive]
+                heights = heights[alive]
+                counts = counts[alive]
+                lines_cleared = lines_cleared[alive]
+
+        return fitness
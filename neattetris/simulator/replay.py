@@ -0,0 +1,123 @@
+from typing import Iterator
+from neattetris.gamestates import GameStateRubik, GameStateTetrisBitboard
+from neattetris.gamestates.gamestate import GameState
+from neattetris.recording import Episode
+from .simulator import Simulator, CoordSimulator, RubikSimulator
+import numpy as np
+
+
+class _ReplayNet:
+    """Network whose outputs repeat the decisions of an episode, one step
+    after another.
+    """
+    def __init__(self, episode: Episode):
+        self.decisions = iter(episode.decisions.tolist())
+        self.coords = episode.action_format == 'coords'
+
+    def activate(self, inputs: np.ndarray) -> np.ndarray:
+        decision = next(self.decisions)
+        if self.coords:
+            # Columns in the first outputs, rotations in the last four
+            x, rotation = decision
+            output = np.zeros(max(x + 1, 1) + 4)
+            output[x] = 1.0
+            output[-4 + rotation] = 1.0
+        else:
+            output = np.zeros(decision + 1)
+            output[decision] = 1.0
+        return output
+
+
+class EpisodeReplayer:
+    """Rebuilds the frames of a recorded episode by simulating it again.
+
+    Games are deterministic for a seed, so replaying the recorded decisions
+    with the simulator of the episode reproduces every frame. Rendering is
+    optional and independent of the recording.
+    """
+    def __init__(self, episode: Episode, tetris_game_state=GameStateTetrisBitboard):
+        """
+        Args:
+            episode (Episode): Recorded episode.
+            tetris_game_state: GameStateTetris class of Tetris replays.
+        """
+        self.episode = episode
+        self.tetris_game_state = tetris_game_state
+
+    def game_state(self) -> GameState:
+        """Creates the initial game state of the episode.
+
+        Returns:
+            GameState: Game state before the first step.
+        """
+        episode = self.episode
+        if episode.game == 'rubik':
+            return GameStateRubik(episode.width, seed=episode.seed, scramble_moves=episode.height)
+
+        return self.tetris_game_state(episode.width, episode.height, seed=episode.seed)
+
+    def simulator(self, frame_delay: float = 0.0) -> Simulator:
+        """Creates the simulator of the episode, bounded by its steps.
+
+        Args:
+            frame_delay (float): Seconds every frame is shown in visual
+                replays.
+
+        Returns:
+            Simulator: Simulator of the episode.
+        """
+        steps = len(self.episode.decisions)
+        if self.episode.game == 'rubik':
+            return RubikSimulator(max_steps=steps, frame_delay=frame_delay)
+        elif self.episode.action_format == 'coords':
+            return CoordSimulator(max_steps=steps, frame_delay=frame_delay)
+
+        return Simulator(max_steps=steps, frame_delay=frame_delay)
+
+    def frames(self) -> Iterator[GameState]:
+        """Iterates over the game state after every step. The same game state
+        is updated and yielded at every step.
+
+        Yields:
+            GameState: Game state after each step.
+        """
+        simulator = self.simulator()
+        simulator.game_state = self.game_state()
+        net = _ReplayNet(self.episode)
+        for _ in range(len(self.episode.decisions)):
+            flag = simulator.simulation_step(net)
+            yield simulator.game_state
+            if not flag:
+                break
+
+    def frame(self, step: int) -> GameState:
+        """Game state after a number of steps.
+
+        Args:
+            step (int): Steps played, 0 for the initial game state.
+
+        Returns:
+            GameState: Game state after the steps.
+        """
+        if step == 0:
+            return self.game_state()
+
+        for i, game_state in enumerate(self.frames(), 1):
+            if i == step:
+                return game_state
+
+        raise IndexError('The episode has {} steps'.format(len(self.episode.decisions)))
+
+    def replay(self, visual: bool = False, frame_delay: float = 0.0) -> float:
+        """Plays the whole episode again.
+
+        Args:
+            visual (bool): If every frame is shown.
+            frame_delay (float): Seconds every frame is shown.
+
+        Returns:
+            float: Fitness of the replay. It matches the recorded fitness
+                unless the recorded game was truncated with a truncation
+                fitness.
+        """
+        return self.simulator(frame_delay).simulation(_ReplayNet(self.episode), self.game_state(), visual)
@@ -0,0 +1,425 @@
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+from neattetris.gamestates.gamestate_tetris import GameStateTetris, PieceRotation, _ROTATIONS
+from .simulator import CoordSimulator
+import numpy as np
+
+
+# Missing columns get a huge bottom so they never define the landing row
+_NO_BOTTOM = 1 << 20
+
+
+class _Placements(NamedTuple):
+    """Distinct placements of a piece on a grid, as lists for the exact
+    placements and as (placements, width) arrays over the grid columns for the
+    vectorized ones.
+
+    Rotations leaving the same cells (e.g. the four rotations of the square)
+    are only enumerated once, with the lowest rotation. ``spawns`` holds the
+    spawn row of each placement: landing on it ends the game, as in
+    ``GameStateTetris.post_checks``. Columns not
+    covered by a placement get a huge bottom and a huge negative top, so they
+    never define its landing row nor change the column heights.
+    """
+    rotations: Tuple[int, ...]
+    xs: Tuple[int, ...]
+    pieces: Tuple[PieceRotation, ...]
+    spawns: np.ndarray
+    bottoms: np.ndarray
+    tops: np.ndarray
+    col_cells: np.ndarray
+    row_cells: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def _placement_tables(grid_width: int, grid_height: int) -> Tuple[_Placements, ...]:
+    """Precomputes every placement of every piece on a grid.
+
+    Args:
+        grid_width (int): Width of the grid.
+        grid_height (int): Height of the grid.
+
+    Returns:
+        Tuple[_Placements, ...]: Placements indexed by piece_id.
+    """
+    tables = []
+    for rotations in _ROTATIONS:
+        shapes = set()
+        placements = []
+        for r, piece in enumerate(rotations):
+            shape = frozenset((i - piece.left, j - piece.bottom) for i, j in piece.cells)
+            if shape in shapes:
+                continue
+            shapes.add(shape)
+            x_min, x_max = piece.x_range(grid_width)
+            placements.extend((r, x, piece) for x in range(x_min, x_max + 1))
+
+        n = len(placements)
+        spawns = np.full(n, grid_height - rotations[0].grid.shape[1], dtype=np.int64)
+        bottoms = np.full((n, grid_width), _NO_BOTTOM, dtype=np.int64)
+        tops = np.full((n, grid_width), -_NO_BOTTOM, dtype=np.int64)
+        col_cells = np.zeros((n, grid_width), dtype=np.int64)
+        row_cells = np.zeros((n, 4), dtype=np.int64)
+        for p, (r, x, piece) in enumerate(placements):
+            col = x + piece.left
+            bottoms[p, col:col + len(piece.col_bottoms)] = piece.col_bottoms
+            tops[p, col:col + len(piece.col_heights)] = piece.col_heights
+            for i, j in piece.cells:
+                col_cells[p, x + i] += 1
+                row_cells[p, j] += 1
+
+        tables.append(_Placements(rotations=tuple(r for r, _, _ in placements),
+                                  xs=tuple(x for _, x, _ in placements),
+                                  pieces=tuple(piece for _, _, piece in placements),
+                                  spawns=spawns,
+                                  bottoms=bottoms,
+                                  tops=tops,
+                                  col_cells=col_cells,
+                                  row_cells=row_cells))
+
+    return tuple(tables)
+
+
+def _leaf_features(
+        heights: np.ndarray,
+        col_fills: np.ndarray,
+        row_fills: np.ndarray,
+        lines: np.ndarray,
+        placements: _Placements,
+        grid_height: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Value network inputs of the boards left by every placement of a piece
+    on a set of boards, vectorized over boards and placements.
+
+    Placements clearing rows shift the grid and are only flagged, so they can
+    be evaluated exactly with ``_SearchBoard.place``.
+
+    Args:
+        heights (np.ndarray): (boards, width) column heights.
+        col_fills (np.ndarray): (boards, width) filled cells per column.
+        row_fills (np.ndarray): (boards, height + 4) filled cells per row,
+            padded with empty rows above the top of the grid.
+        lines (np.ndarray): (boards,) lines cleared to reach each board.
+        placements (_Placements): Placements of the piece.
+        grid_height (int): Height of the grid.
+
+    Returns:
+        np.ndarray: (boards, placements, inputs) network inputs.
+        np.ndarray: (boards, placements) legal placements.
+        np.ndarray: (boards, placements) legal placements clearing rows,
+            whose inputs are not filled in.
+    """
+    n_boards, width = heights.shape
+    y = (heights[:, np.newaxis, :] - placements.bottoms).max(axis=2)
+    legal = y < placements.spawns
+
+    new_heights = np.maximum(heights[:, np.newaxis, :], y[:, :, np.newaxis] + placements.tops)
+    holes = new_heights - (col_fills[:, np.newaxis, :] + placements.col_cells)
+
+    # Rows reached by the placements, landing rows are never below -3
+    rows = np.maximum(y[:, :, np.newaxis] + np.arange(4), 0)
+    reached = np.take_along_axis(row_fills, rows.reshape(n_boards, -1), axis=1).reshape(rows.shape)
+    full = (placements.row_cells > 0) & (reached + placements.row_cells == width)
+    clears = legal & full.any(axis=2)
+
+    features = np.empty(new_heights.shape[:2] + (2 * width + 2,))
+    features[..., :width] = new_heights / grid_height
+    features[..., width:-2] = holes / grid_height
+    features[..., -2] = np.abs(np.diff(new_heights, axis=2)).sum(axis=2) / grid_height
+    features[..., -1] = lines[:, np.newaxis] / 4
+
+    return features, legal, clears
+
+
+class _SearchBoard:
+    """Copy of the locked cells of a Tetris game state where pieces are
+    placed and removed again while searching.
+
+    Rows are bitmasks as in ``GameStateTetrisBitboard``, along with the
+    column heights and the cells per column and row, which are updated
+    incrementally by ``place`` and restored by ``undo``.
+    """
+    __slots__ = ('width', 'height', 'full_row', 'rows', 'heights', 'col_fills', 'row_fills')
+
+    def __init__(self, game_state: GameStateTetris):
+        """
+        Args:
+            game_state (GameStateTetris): Game state whose grid is copied.
+        """
+        self.width = game_state.width
+        self.height = game_state.height
+        self.full_row = (1 << self.width) - 1
+        rows = getattr(game_state, 'rows', None)
+        if rows is None:
+            bits = game_state.grid.astype(np.int64) << np.arange(self.width, dtype=np.int64)[:, np.newaxis]
+            rows = bits.sum(axis=0).tolist()
+        self.rows = list(rows)
+        self.heights = list(game_state.heights)
+        self.col_fills = list(game_state.col_fills)
+        self.row_fills = list(game_state.row_fills)
+
+    def place(self, piece: PieceRotation, x: int, spawn: int) -> Optional[tuple]:
+        """Drops a piece from above the stack and clears the complete rows.
+
+        Args:
+            piece (PieceRotation): Rotation of the piece.
+            x (int): Horizontal position of the piece.
+            spawn (int): Spawn row of the piece.
+
+        Returns:
+            Optional[tuple]: Record to undo the placement, None if the piece
+                lands on or above its spawn row, which ends the game.
+        """
+        heights = self.heights
+        col = x + piece.left
+        y = max([heights[col + k] - bottom for k, bottom in enumerate(piece.col_bottoms)])
+        if y >= spawn:
+            return None
+
+        rows = self.rows
+        for j, mask in piece.masks:
+            rows[y + j] |= mask << x if x >= 0 else mask >> -x
+        previous = heights[col:col + len(piece.col_heights)]
+        for k, col_height in enumerate(piece.col_heights, col):
+            if y + col_height > heights[k]:
+                heights[k] = y + col_height
+        col_fills = self.col_fills
+        row_fills = self.row_fills
+        for i, j in piece.cells:
+            col_fills[x + i] += 1
+            row_fills[y + j] += 1
+
+        full = [y + j for j, _ in piece.masks if row_fills[y + j] == self.width]
+        if not full:
+            return piece, x, y, previous, None, 0
+
+        # Rows are rebuilt into new lists, the old ones are the undo record
+        saved = (rows, heights, col_fills, row_fills)
+        lines = len(full)
+        full_row = self.full_row
+        self.rows = [mask for mask in rows if mask != full_row] + [0] * lines
+        self.heights = [self._column_height(c, height - lines) if height - 1 in full else height - lines
+                        for c, height in enumerate(heights)]
+        self.col_fills = [fill - lines for fill in col_fills]
+        self.row_fills = [fill for fill in row_fills if fill != self.width] + [0] * lines
+
+        return piece, x, y, previous, saved, lines
+
+    def undo(self, record: tuple):
+        """Removes a piece placed by ``place``, restoring the cleared rows.
+
+        Args:
+            record (tuple): Record returned by ``place``.
+        """
+        piece, x, y, previous, saved, _ = record
+        if saved is not None:
+            self.rows, self.heights, self.col_fills, self.row_fills = saved
+
+        rows = self.rows
+        for j, mask in piece.masks:
+            rows[y + j] ^= mask << x if x >= 0 else mask >> -x
+        col = x + piece.left
+        self.heights[col:col + len(previous)] = previous
+        col_fills = self.col_fills
+        row_fills = self.row_fills
+        for i, j in piece.cells:
+            col_fills[x + i] -= 1
+            row_fills[y + j] -= 1
+
+    def _column_height(self, col: int, limit: int) -> int:
+        """Height of a column, only considering the rows below a limit.
+
+        Args:
+            col (int): Column of the grid.
+            limit (int): First row not considered.
+
+        Returns:
+            int: Index of the highest filled row below the limit plus one, or
+                0 if there is none.
+        """
+        bit = 1 << col
+        rows = self.rows
+        for row in range(limit - 1, -1, -1):
+            if rows[row] & bit:
+                return row + 1
+
+        return 0
+
+    def arrays(self) -> Tuple[List[int], List[int], List[int]]:
+        """Copies of the column heights, cells per column and cells per row,
+        padded as taken by ``_leaf_features``.
+
+        Returns:
+            Tuple[List[int], List[int], List[int]]: Heights, column fills and
+                row fills.
+        """
+        return self.heights[:], self.col_fills[:], self.row_fills + [0] * 4
+
+    def features(self, lines: int) -> np.ndarray:
+        """Value network inputs of the board, see ``SearchSimulator``.
+
+        Args:
+            lines (int): Lines cleared to reach the board.
+
+        Returns:
+            np.ndarray: Network inputs.
+        """
+        heights = np.array(self.heights, dtype=float)
+        holes = heights - self.col_fills
+        bumpiness = np.abs(np.diff(heights)).sum()
+        return np.concatenate([heights / self.height, holes / self.height,
+                               [bumpiness / self.height, lines / 4]])
+
+
+class _ValueNetwork:
+    """Network scoring a batch of boards, the first output of a network
+    being the value of each board.
+    """
+    def __init__(self, net):
+        self.net = net
+
+    def activate(self, inputs: np.ndarray) -> np.ndarray:
+        if len(inputs) == 0:
+            return np.zeros(0)
+        if hasattr(self.net, 'activate_batch'):
+            return self.net.activate_batch(inputs)[:, 0]
+
+        return np.array([self.net.activate(row)[0] for row in inputs])
+
+
+class SearchSimulator(CoordSimulator):
+    """Coordinate simulator choosing every placement by searching over the
+    placements of the active piece and the next piece of the bag.
+
+    Every legal (x, rotation) placement of the active piece is tried and, for
+    ``plies=2``, followed by every legal placement of the next piece. The
+    network is used as a value function: its first output scores each
+    resulting board, and the placement of the active piece leading to the best
+    board is performed. The network inputs of a board are the heights and
+    holes of its columns and its bumpiness, relative to the grid height, and
+    the lines cleared to reach it divided by four, i.e. ``2 * width + 2``
+    inputs (see ``config_search``).
+
+    Placements are precomputed per piece and grid size, and rotations leaving
+    the same cells are tried once. The active piece is placed and undone
+    incrementally on a bitmask copy of the grid, and the boards left by the
+    last ply are computed at once with numpy, except the few ones clearing
+    rows, which are placed exactly. All the boards of a step are evaluated
+    with a single batched network call when the network supports it
+    (``neattetris.nn.CompiledNetwork``).
+
+    Placements are assumed reachable by dropping the piece from above the
+    stack, as ``GameStateTetris.perform_action_coords`` does, and decisions are
+    recorded as coordinates, so recorded episodes are replayed with
+    ``CoordSimulator``.
+    """
+    def __init__(self, *args, plies: int = 2, **kwargs):
+        """
+        Args:
+            *args: Arguments of ``Simulator``.
+            plies (int): Pieces searched, 1 for the active piece only or 2
+                for the active and the next piece.
+            **kwargs: Keyword arguments of ``Simulator``.
+        """
+        super().__init__(*args, **kwargs)
+        if plies not in (1, 2):
+            raise ValueError('Only 1 and 2 plies are supported, got {}'.format(plies))
+        self.plies = plies
+        self._first = None
+        self._candidates = np.zeros(0, dtype=np.int64)
+
+    def simulation(self, net, game_state: GameStateTetris, visual: bool = False) -> float:
+        return super().simulation(_ValueNetwork(net), game_state, visual)
+
+    def _inputs(self) -> np.ndarray:
+        """Enumerates the boards reachable from the current game state.
+
+        Returns:
+            np.ndarray: (boards, inputs) network inputs, one row per board.
+                ``_candidates`` holds the placement of the active piece
+                leading to each board.
+        """
+        game_state = self.game_state
+        board = _SearchBoard(game_state)
+        tables = _placement_tables(board.width, board.height)
+        first = tables[game_state.active_piece_id]
+        self._first = first
+
+        # Boards the last ply is played on, with the first placement leading
+        # to each of them
+        if self.plies == 2:
+            parents = []
+            arrays = []
+            lines = []
+            for p, piece in enumerate(first.pieces):
+                record = board.place(piece, first.xs[p], first.spawns[p])
+                if record is not None:
+                    parents.append(p)
+                    arrays.append(board.arrays())
+                    lines.append(record[-1])
+                    board.undo(record)
+            if parents:
+                features, candidates = self._leaves(board, first, tables[game_state.next_piece_id],
+                                                    parents, arrays, lines)
+                if len(candidates):
+                    self._candidates = candidates
+                    return features
+
+        # A single ply, also when no placement leaves room for the next piece
+        features, candidates = self._leaves(board, first, first, [None], [board.arrays()], [0])
+        self._candidates = candidates
+        return features
+
+    @staticmethod
+    def _leaves(board, first, last, parents: list, arrays: list, lines: list) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluates the legal placements of the last ply.
+
+        Args:
+            board (_SearchBoard): Board of the current game state.
+            first: Placements of the active piece.
+            last: Placements of the piece of the last ply.
+            parents (list): Placement of the active piece leading to every
+                board the last ply is played on, [None] for a single ply.
+            arrays (list): Arrays of every board, as given by
+                ``_SearchBoard.arrays``.
+            lines (list): Lines cleared to reach every board.
+
+        Returns:
+            np.ndarray: (boards, inputs) network inputs, one row per leaf.
+            np.ndarray: Placement of the active piece leading to every leaf.
+        """
+        heights, col_fills, row_fills = (np.array(a, dtype=np.int64) for a in zip(*arrays))
+        features, legal, clears = _leaf_features(heights, col_fills, row_fills, np.array(lines),
+                                                 last, board.height)
+
+        # Boards left after clearing rows are evaluated exactly
+        for b in np.flatnonzero(clears.any(axis=1)).tolist():
+            p = parents[b]
+            record = board.place(first.pieces[p], first.xs[p], first.spawns[p]) if p is not None else None
+            for q in np.flatnonzero(clears[b]).tolist():
+                leaf = board.place(last.pieces[q], last.xs[q], last.spawns[q])
+                features[b, q] = board.features(lines[b] + leaf[-1])
+                board.undo(leaf)
+            if record is not None:
+                board.undo(record)
+
+        boards, placements = np.nonzero(legal)
+        candidates = placements if parents[0] is None else np.array(parents, dtype=np.int64)[boards]
+        return features[boards, placements], candidates
+
+    def _decision(self, output: np.ndarray) -> Tuple[int, int]:
+        """Placement of the active piece leading to the best board.
+
+        Args:
+            output (np.ndarray): Value of every board.
+
+        Returns:
+            Tuple[int, int]: Horizontal coordinate (as taken by
+                ``perform_action_coords``) and rotation of the piece. With no
+                legal placement, the piece is dropped where it is.
+        """
+        if len(output) == 0:
+            return self.game_state.active_piece_position[0] + 2, 0
+
+        p = self._candidates[int(np.argmax(output))]
+        return self._first.xs[p] + 2, self._first.rotations[p]
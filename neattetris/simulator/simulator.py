@@ -1,13 +1,102 @@
+from typing import Optional, Tuple
 from neattetris.gamestates.gamestate import GameState
+from neattetris.profiling import SimulationProfiler
+from neattetris.recording import EpisodeRecorder
+from neattetris.viewer import FramePublisher
 from neat.nn import FeedForwardNetwork
 import numpy as np
 import time
 
 
 class Simulator:
-    def __init__(self):
+    """Simulator of a game state driven by a neural network, one action per
+    step.
+
+    Simulations can be bounded by a number of steps, a number of placed pieces
+    (for game states counting them in ``pieces_placed``) and wall clock
+    seconds. When a budget runs out the simulation stops, ``truncated`` is set
+    and the fitness is the one accumulated until then plus
+    ``truncation_fitness``, so surviving until the budget is never worse than
+    losing at the same point.
+
+    With a ``SimulationProfiler``, steps run through
+    ``_profiled_simulation_step``, which times every phase of the step. With
+    an ``EpisodeRecorder``, the decision of every step is recorded so the
+    game can be replayed later without rendering it now. With a
+    ``FramePublisher``, frames are sent to a live viewer in another process
+    (see ``neattetris.viewer``) instead of being printed.
+
+    Subclasses define the network inputs and how its outputs are turned into
+    actions through ``_inputs``, ``_decision``, ``_perform`` and
+    ``_post_checks``.
+    """
+    # Fitness of every step that does not end the game
+    step_fitness = 1.0
+    # Decisions of the steps, as recorded by an EpisodeRecorder
+    action_format = 'action'
+
+    def __init__(self,
+                 max_steps: Optional[int] = None,
+                 max_pieces: Optional[int] = None,
+                 max_time: Optional[float] = None,
+                 truncation_fitness: float = 0.0,
+                 profiler: Optional[SimulationProfiler] = None,
+                 recorder: Optional[EpisodeRecorder] = None,
+                 frame_delay: float = 0.5,
+                 publisher: Optional[FramePublisher] = None):
+        """
+        Args:
+            max_steps (Optional[int]): Maximum simulation steps.
+            max_pieces (Optional[int]): Maximum pieces placed.
+            max_time (Optional[float]): Maximum wall clock seconds.
+            truncation_fitness (float): Fitness added to truncated
+                simulations.
+            profiler (Optional[SimulationProfiler]): Profiler of the steps,
+                if any.
+            recorder (Optional[EpisodeRecorder]): Recorder of the
+                simulations, if any.
+            frame_delay (float): Seconds every frame is shown in visual
+                simulations, or published.
+            publisher (Optional[FramePublisher]): Publisher of the frames
+                of the simulations, if any.
+        """
         self.fitness = 0
         self.game_state = None
+        self.max_steps = max_steps
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.truncation_fitness = truncation_fitness
+        self.profiler = profiler
+        self.recorder = recorder
+        self.frame_delay = frame_delay
+        self.publisher = publisher
+        self.steps = 0
+        self.truncated = False
+        self._deadline = None
+
+    def _start_budget(self):
+        """Resets the budget counters before a simulation.
+        """
+        self.steps = 0
+        self.truncated = False
+        self._deadline = time.perf_counter() + self.max_time if self.max_time is not None else None
+
+    def _budget_exhausted(self) -> bool:
+        """Checks if the simulation has run out of budget, truncating it if
+        so.
+
+        Returns:
+            bool: True if the simulation has to stop, False otherwise.
+        """
+        if (self.max_steps is not None and self.steps >= self.max_steps) or \
+                (self.max_pieces is not None and
+                 getattr(self.game_state, 'pieces_placed', 0) >= self.max_pieces) or \
+                (self._deadline is not None and time.perf_counter() >= self._deadline):
+            self.truncated = True
+            self.fitness += self.truncation_fitness
+            return True
+
+        return False
 
     def simulation(
             self,
@@ -33,19 +122,74 @@ class Simulator:
         # 1. Initialize game state and needed simulation variables
         self.game_state = game_state
         self.fitness = 0.0
+        self._start_budget()
+        if self.recorder is not None:
+            self.recorder.start(game_state, self.action_format)
 
         # 2. While the game is not over, execute simulation steps
         if visual:
             self.game_state.visual()
+        elif self.publisher is not None:
+            self.publisher.publish(self.game_state, self.steps, self.fitness)
 
-        while self.simulation_step(net):
-            self.fitness += 1.0
+        step = self.simulation_step if self.profiler is None else self._profiled_simulation_step
+        while not self._budget_exhausted():
+            self.steps += 1
+            flag = step(net)
             if visual:
                 self.game_state.visual()
-                time.sleep(0.5)
+                time.sleep(self.frame_delay)
+            elif self.publisher is not None:
+                self.publisher.publish(self.game_state, self.steps, self.fitness)
+                time.sleep(self.frame_delay)
+
+            if not flag:
+                break
+            self.fitness += self.step_fitness
+
+        if self.profiler is not None:
+            self.profiler.record_episode(self.steps)
+        if self.recorder is not None:
+            self.recorder.finish(self.fitness)
 
         return self.fitness
 
+    def _inputs(self) -> np.ndarray:
+        """Network inputs for the current game state.
+
+        Returns:
+            np.ndarray: Game state data.
+        """
+        return self.game_state.data
+
+    def _decision(self, output: np.ndarray):
+        """Action chosen from the network outputs.
+
+        Args:
+            output (np.ndarray): Network outputs.
+
+        Returns:
+            int: Identifier for the action.
+        """
+        return int(np.argmax(output))
+
+    def _perform(self, decision):
+        """Executes an action in the game state.
+
+        Args:
+            decision: Action chosen by ``_decision``.
+        """
+        self.game_state.perform_action(decision)
+
+    def _post_checks(self) -> Tuple[bool, float]:
+        """Checks after decision execution.
+
+        Returns:
+            bool: True if the game state can continue, false otherwise.
+            float: Fitness delta after the decision is executed.
+        """
+        return self.game_state.post_checks()
+
     def simulation_step(
             self,
             net: FeedForwardNetwork
@@ -67,29 +211,24 @@ class Simulator:
             return False
 
         # 1. Evaluation of game state by the agent and selection of action
-        output = net.activate(self.game_state.data)
-        decision = np.argmax(output)
+        decision = self._decision(net.activate(self._inputs()))
+        if self.recorder is not None:
+            self.recorder.record(decision)
 
         # 2. Performing of selected action (if possible)
-        self.game_state.perform_action(decision)
+        self._perform(decision)
 
         # 3. Post-decision checks and updates
-        end_flag, fitness_delta = self.game_state.post_checks()
+        end_flag, fitness_delta = self._post_checks()
         self.fitness += fitness_delta
 
         return end_flag
 
-
-class CoordSimulator(Simulator):
-    def simulation_step(
+    def _profiled_simulation_step(
             self,
             net: FeedForwardNetwork
     ) -> bool:
-        """Simulation step for a given neural network.
-
-        Executes a simulation step for a given neural network agent. The step
-        consists in the evalutation of the game state by the network and the
-        corresponding execution of the action chosen by the agent.
+        """Simulation step recording the time of every phase in the profiler.
 
         Args:
             net: Neural network agent to decide the action.
@@ -97,62 +236,63 @@ class CoordSimulator(Simulator):
         Returns:
             bool: True if the game state can continue, false otherwise.
         """
-        # 0. Pre-decision checks and updates
+        clock = time.perf_counter_ns
+        t0 = clock()
         if not self.game_state.pre_checks():
+            self.profiler.record_step(t0, clock())
             return False
-
-        # 1. Evaluation of game state by the agent and selection of action
-        output = net.activate(self.game_state.hand_picked_data)
-        x_coord = np.argmax(output[:-4])
-        rotation = np.argmax(output[-4:])
-
-        # 2. Performing of selected action (if possible)
-        self.game_state.perform_action_coords(x_coord, rotation)
-
-        # 3. Post-decision checks and updates
-        end_flag, fitness_delta = self.game_state.post_checks(no_gravity=True)
+        t1 = clock()
+        inputs = self._inputs()
+        t2 = clock()
+        decision = self._decision(net.activate(inputs))
+        t3 = clock()
+        if self.recorder is not None:
+            self.recorder.record(decision)
+        self._perform(decision)
+        t4 = clock()
+        end_flag, fitness_delta = self._post_checks()
         self.fitness += fitness_delta
+        self.profiler.record_step(t0, t1, t2, t3, t4, clock())
 
         return end_flag
 
 
-class RubikSimulator(Simulator):
-    def simulation(
-            self,
-            net: FeedForwardNetwork,
-            game_state: GameState,
-            visual: bool = False
-    ) -> float:
-        """Simulation of a given neural network.
+class CoordSimulator(Simulator):
+    """Simulator choosing the final column and rotation of every piece, which
+    is dropped at once.
 
-        Simulates the game logic with a given neural network agent. For each
-        frame, the simulator calculates the agent's response to the game state
-        and executes the action.
+    The first outputs of the network score the columns and the last four the
+    rotations.
+    """
+    action_format = 'coords'
 
-        Args:
-            net (FeedForwardNetwork): Neural network agent to decide the
-                actions taken through the simulation.
-            game_state (GameState): Initialized GameState to simulate.
-            visual (bool): If the execution should be shown or not.
+    def _inputs(self) -> np.ndarray:
+        return self.game_state.hand_picked_data
 
-        Returns:
-            float: Fitness of the given neural network provided.
-        """
-        # 1. Initialize game state and needed simulation variables
-        self.game_state = game_state
-        self.fitness = 0.0
+    def _decision(self, output: np.ndarray) -> Tuple[int, int]:
+        return int(np.argmax(output[:-4])), int(np.argmax(output[-4:]))
 
-        # 2. While the game is not over, execute simulation steps
-        if visual:
-            self.game_state.visual()
+    def _perform(self, decision: Tuple[int, int]):
+        self.game_state.perform_action_coords(*decision)
 
-        for _ in range(500):
-            flag = self.simulation_step(net)
-            if visual:
-                self.game_state.visual()
-                time.sleep(0.5)
+    def _post_checks(self) -> Tuple[bool, float]:
+        return self.game_state.post_checks(no_gravity=True)
 
-            if not flag:
-                break
 
-        return self.fitness
+class RubikSimulator(Simulator):
+    """Simulator of a Rubik's cube, one face turn per step. The fitness is the
+    one given by the cube after every move, see ``GameStateRubik``.
+    """
+    step_fitness = 0.0
+
+    def __init__(self,
+                 max_steps: Optional[int] = 500,
+                 max_pieces: Optional[int] = None,
+                 max_time: Optional[float] = None,
+                 truncation_fitness: float = 0.0,
+                 profiler: Optional[SimulationProfiler] = None,
+                 recorder: Optional[EpisodeRecorder] = None,
+                 frame_delay: float = 0.5,
+                 publisher: Optional[FramePublisher] = None):
+        super().__init__(max_steps, max_pieces, max_time, truncation_fitness, profiler, recorder, frame_delay,
+                         publisher)
@@ -0,0 +1,307 @@
+from typing import Callable, Dict, Optional
+from neat.population import CompleteExtinctionException
+from neattetris.nn import genome_from_array, genome_to_array
+from neattetris.parallel import _evaluate_genome, _lookup, _store, _worker_function
+import collections
+import multiprocessing
+import os
+import queue
+import random
+
+
+# Evaluation function and NEAT configuration of the current worker process,
+# installed once when the worker starts.
+_eval_function = None
+_config = None
+
+
+def _init_worker(eval_function: Callable, config):
+    """Worker initializer, stores the evaluation context in the process.
+
+    Args:
+        eval_function (Callable): Function evaluating a single genome.
+        config (neat.Config): NEAT configuration.
+    """
+    global _eval_function, _config
+    _eval_function = eval_function
+    _config = config
+
+
+def _evaluate(task) -> tuple:
+    """Evaluates a genome inside a worker process.
+
+    Args:
+        task (Tuple[np.ndarray, Optional[float], Optional[list]]): Genome
+            encoded by ``genome_to_array``, elite fitness passed to the
+            evaluation function, if any, and cached game fitnesses of the
+            genome.
+
+    Returns:
+        float: Fitness of the genome.
+        Optional[Dict[int, float]]: Fitness of the games played, by seed
+            index.
+    """
+    array, elite, known = task
+    genome = genome_from_array(array, _config)
+    return _evaluate_genome(_eval_function, genome, _config, elite, known)
+
+
+class SteadyStateEvolution:
+    """Asynchronous steady-state evolution of a ``neat.Population``.
+
+    Instead of evaluating whole generations, up to ``max_in_flight`` genomes
+    are evaluated at once in a pool of worker processes, so a long game only
+    keeps its own worker busy. As soon as an evaluation completes, the genome
+    joins the population and, once the population is full, the genome with
+    the lowest fitness shared within its species is removed (never the best
+    one). A new child is then sent for evaluation: its first parent is the
+    winner of a fitness tournament over the population and the second one
+    of a tournament over the species of the first, followed by the usual
+    NEAT crossover and mutation.
+
+    Every ``pop_size`` completed evaluations count as a generation: the
+    population is speciated again, the reporters of the population are
+    notified and the fitness threshold is checked, as in
+    ``neat.Population.run``. Then the stagnation of the population
+    (``max_stagnation``, ``species_elitism``) removes the stagnant species
+    and their members, refilled with children of the remaining species.
+    Children join the species of their first parent until the next
+    generation.
+
+    The fitness cache of the evaluation function stays in this process, as
+    in ``neattetris.parallel.ParallelEvaluator``.
+
+    The population given to the reporters at the end of a generation, and
+    so saved by ``neattetris.checkpoint.AsyncCheckpointer``, also holds the
+    genomes still being evaluated, without fitness, so a resumed run
+    evaluates them again instead of losing them.
+    """
+    def __init__(self,
+                 population,
+                 eval_function: Callable,
+                 num_workers: Optional[int] = None,
+                 max_in_flight: Optional[int] = None,
+                 tournament_size: int = 3,
+                 elite_cutoff: bool = False,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            population (neat.Population): Population evolved, whose genomes
+                are the first ones evaluated.
+            eval_function (Callable): Function receiving a genome and the
+                NEAT configuration and returning its fitness, e.g. a
+                ``neattetris.evaluation.Evaluator``. It must be picklable.
+            num_workers (Optional[int]): Number of worker processes. Defaults
+                to the number of CPUs.
+            max_in_flight (Optional[int]): Maximum genomes being evaluated at
+                once. Defaults to twice the number of workers.
+            tournament_size (int): Genomes competing to be a parent.
+            elite_cutoff (bool): If the lowest fitness of the full
+                population is passed to the evaluation function as a third
+                argument, the elite fitness used by
+                ``neattetris.evaluation.TetrisEvaluator`` to stop evaluating
+                genomes early, since genomes not beating it are removed.
+            seed (Optional[int]): Seed of the parent selection.
+        """
+        self.population = population
+        self.config = population.config
+        self.eval_function = eval_function
+        self.num_workers = num_workers or os.cpu_count()
+        self.max_in_flight = max_in_flight or 2 * self.num_workers
+        self.tournament_size = tournament_size
+        self.elite_cutoff = elite_cutoff
+        self.evaluations = 0
+        self.rng = random.Random(seed)
+        self._members = {}
+        self._waiting = collections.deque()
+        self._in_flight = {}
+        self._species_of: Dict[int, int] = {}
+        self._sizes = collections.Counter()
+
+    def _insert(self, genome):
+        """Adds an evaluated genome to the population, removing the genome
+        with the lowest shared fitness once it is full.
+
+        Args:
+            genome (neat.DefaultGenome): Evaluated genome.
+        """
+        self._members[genome.key] = genome
+        self._sizes[self._species_of[genome.key]] += 1
+        if len(self._members) <= self.config.pop_size:
+            return
+
+        best = max(self._members.values(), key=lambda g: g.fitness)
+        lowest = min(g.fitness for g in self._members.values())
+        worst = min((g for g in self._members.values() if g is not best),
+                    key=lambda g: (g.fitness - lowest) / self._sizes[self._species_of[g.key]])
+        del self._members[worst.key]
+        self._sizes[self._species_of[worst.key]] -= 1
+
+    def _tournament(self, genomes: list):
+        """Selects the fittest of a few random genomes.
+
+        Args:
+            genomes (list): Candidate genomes.
+
+        Returns:
+            neat.DefaultGenome: Selected genome.
+        """
+        return max(self.rng.sample(genomes, min(self.tournament_size, len(genomes))), key=lambda g: g.fitness)
+
+    def _child(self):
+        """Breeds a new genome from the population.
+
+        Returns:
+            neat.DefaultGenome: Child genome, not evaluated yet.
+        """
+        members = list(self._members.values())
+        parent1 = self._tournament(members)
+        species = self._species_of[parent1.key]
+        parent2 = self._tournament([g for g in members if self._species_of[g.key] == species])
+
+        reproduction = self.population.reproduction
+        key = next(reproduction.genome_indexer)
+        child = self.config.genome_type(key)
+        child.configure_crossover(parent1, parent2, self.config.genome_config)
+        child.mutate(self.config.genome_config)
+        reproduction.ancestors[key] = (parent1.key, parent2.key)
+        self._species_of[key] = species
+        return child
+
+    def _speciate(self):
+        """Speciates the current population again. Species left without
+        members are dropped first, since every species needs a member to
+        be represented.
+        """
+        population = self.population
+        species_set = population.species
+        for sid in [sid for sid in species_set.species if not self._sizes[sid]]:
+            del species_set.species[sid]
+        species_set.speciate(self.config, self._members, population.generation)
+        self._species_of.update(species_set.genome_to_species)
+        self._sizes = collections.Counter(self._species_of[key] for key in self._members)
+
+    def _remove_stagnant(self):
+        """Removes the stagnant species and their members, as
+        ``neat.DefaultReproduction.reproduce`` does.
+
+        Raises:
+            CompleteExtinctionException: If every species is stagnant and
+                the configuration does not reset the population.
+        """
+        population = self.population
+        species_set = population.species
+        for sid, species, stagnant in population.reproduction.stagnation.update(species_set, population.generation):
+            if not stagnant:
+                continue
+            population.reporters.species_stagnant(sid, species)
+            for key in species.members:
+                self._members.pop(key, None)
+                self._species_of.pop(key, None)
+                species_set.genome_to_species.pop(key, None)
+            del species_set.species[sid]
+            del self._sizes[sid]
+
+        if not species_set.species:
+            population.reporters.complete_extinction()
+            if not self.config.reset_on_extinction:
+                raise CompleteExtinctionException()
+            self._members = {}
+            self._sizes = collections.Counter()
+            new = population.reproduction.create_new(self.config.genome_type, self.config.genome_config,
+                                                     self.config.pop_size)
+            for genome in new.values():
+                self._species_of[genome.key] = -1
+            self._waiting.extend(new.values())
+
+    def run(self, n: Optional[int] = None):
+        """Evolves the population for at most n generations (``pop_size``
+        evaluations each), stopping early once the fitness threshold is
+        reached.
+
+        Args:
+            n (Optional[int]): Maximum generations, unbounded if None.
+
+        Returns:
+            neat.DefaultGenome: Best genome found.
+        """
+        population = self.population
+        config = self.config
+        if config.no_fitness_termination and n is None:
+            raise RuntimeError("Cannot have no generational limit with no fitness termination")
+
+        # The first genomes evaluated are those of the population, those
+        # not speciated yet join no species
+        waiting = self._waiting = collections.deque(population.population.values())
+        for genome in waiting:
+            self._species_of.setdefault(genome.key, population.species.genome_to_species.get(genome.key, -1))
+        self._members = {}
+        self._sizes = collections.Counter()
+        completed = queue.Queue()
+        in_flight = self._in_flight = {}
+        cache_keys = {}
+        pool = multiprocessing.Pool(self.num_workers, initializer=_init_worker,
+                                    initargs=(_worker_function(self.eval_function), config))
+        try:
+            k = 0
+            population.reporters.start_generation(population.generation)
+            while n is None or k < n:
+                # Keep the workers busy, breeding once the first genomes are
+                # evaluated
+                while len(in_flight) < self.max_in_flight and (waiting or self._members):
+                    genome = waiting.popleft() if waiting else self._child()
+                    elite = None
+                    if self.elite_cutoff and len(self._members) >= config.pop_size:
+                        elite = min(g.fitness for g in self._members.values())
+                    in_flight[genome.key] = genome
+                    # Genomes whose games are all cached are not sent
+                    missing, keys, knowns = _lookup(self.eval_function, [genome], config, elite)
+                    if not missing:
+                        completed.put((genome.key, (genome.fitness, None)))
+                        continue
+                    cache_keys[genome.key] = keys[0]
+                    pool.apply_async(_evaluate, ((genome_to_array(genome, config), elite, knowns[0]),),
+                                     callback=lambda result, key=genome.key: completed.put((key, result)),
+                                     error_callback=lambda error, key=genome.key: completed.put((key, error)))
+
+                key, result = completed.get()
+                if isinstance(result, BaseException):
+                    raise result
+                genome = in_flight.pop(key)
+                genome.fitness, played = result
+                _store(self.eval_function, cache_keys.pop(key, None), played)
+                self._insert(genome)
+                self.evaluations += 1
+                if population.best_genome is None or genome.fitness > population.best_genome.fitness:
+                    population.best_genome = genome
+
+                if self.evaluations % config.pop_size:
+                    continue
+
+                # A generation worth of evaluations completed
+                k += 1
+                self._speciate()
+                members = population.population = dict(self._members)
+                best = max(members.values(), key=lambda g: g.fitness)
+                population.reporters.post_evaluate(config, members, population.species, best)
+                if not config.no_fitness_termination:
+                    fitness = population.fitness_criterion(g.fitness for g in members.values())
+                    if fitness >= config.fitness_threshold:
+                        population.reporters.found_solution(config, population.generation, best)
+                        break
+
+                self._remove_stagnant()
+                population.population = dict(self._members)
+                population.population.update(in_flight)
+                population.reporters.end_generation(config, population.population, population.species)
+                population.generation += 1
+                population.reporters.start_generation(population.generation)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        population.population = dict(self._members)
+        if config.no_fitness_termination:
+            population.reporters.found_solution(config, population.generation, population.best_genome)
+
+        return population.best_genome
@@ -0,0 +1,300 @@
+from typing import NamedTuple, Optional, Tuple
+from neat.reporting import BaseReporter
+from neattetris.gamestates import GameStateRubik
+from neattetris.gamestates.gamestate import GameState
+from neattetris.gamestates.gamestate_tetris import _ROTATIONS
+from neattetris.nn import CompiledNetwork
+import asyncio
+import numpy as np
+import socket
+import struct
+import threading
+import time
+
+
+DEFAULT_PORT = 47474
+
+# Magic, version, game, width (or cube size), height, generation, step and
+# fitness, followed by one byte per cell (or sticker)
+_HEADER = struct.Struct('<4sBBHHiId')
+_MAGIC = b'NTFR'
+_VERSION = 1
+_GAMES = ('tetris', 'rubik')
+_CLEAR_SCREEN = '\033[2J\033[H'
+
+
+class Frame(NamedTuple):
+    """Picture of a game state, small enough for a single datagram.
+
+    Tetris frames hold the (width, height) grid with 1 for the locked cells
+    and 2 for the cells of the active piece, and rubik frames the stickers of
+    the cube, with the cube size as width.
+    """
+    game: str
+    width: int
+    height: int
+    generation: int
+    step: int
+    fitness: float
+    cells: np.ndarray
+
+    def to_bytes(self) -> bytes:
+        """Binary representation of the frame.
+
+        Returns:
+            bytes: Header followed by the cells, one byte each.
+        """
+        header = _HEADER.pack(_MAGIC, _VERSION, _GAMES.index(self.game), self.width, self.height,
+                              self.generation, self.step, self.fitness)
+        return header + self.cells.astype(np.uint8).tobytes()
+
+    @staticmethod
+    def from_bytes(buffer: bytes) -> 'Frame':
+        """Reads a frame from its binary representation.
+
+        Args:
+            buffer (bytes): Datagram holding the frame.
+
+        Returns:
+            Frame: Frame read.
+        """
+        if len(buffer) < _HEADER.size:
+            raise ValueError('Datagram too short for a frame')
+        magic, version, game, width, height, generation, step, fitness = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('Datagram is not a frame')
+
+        cells = np.frombuffer(buffer, dtype=np.uint8, offset=_HEADER.size)
+        if _GAMES[game] == 'tetris':
+            cells = cells.reshape(width, height)
+        return Frame(_GAMES[game], width, height, generation, step, fitness, cells)
+
+
+def capture(game_state: GameState, generation: int = 0, step: int = 0, fitness: float = 0.0) -> Frame:
+    """Takes the frame of a game state.
+
+    Args:
+        game_state (GameState): Tetris or rubik game state.
+        generation (int): Generation of the genome playing.
+        step (int): Simulation step.
+        fitness (float): Fitness accumulated.
+
+    Returns:
+        Frame: Frame of the game state.
+    """
+    if isinstance(game_state, GameStateRubik):
+        return Frame('rubik', game_state.size, 0, generation, step, fitness, game_state.stickers.copy())
+
+    cells = np.array(game_state.grid, dtype=np.uint8)
+    x, y = game_state.active_piece_position
+    for i, j in _ROTATIONS[game_state.active_piece_id][game_state.active_rotation].cells:
+        if 0 <= x + i < game_state.width and 0 <= y + j < game_state.height:
+            cells[x + i, y + j] = 2
+
+    return Frame('tetris', game_state.width, game_state.height, generation, step, fitness, cells)
+
+
+def show(frame: Frame):
+    """Prints a frame, with the same look as the ``visual`` method of its
+    game state.
+
+    Args:
+        frame (Frame): Frame to show.
+    """
+    print('generation {}  step {}  fitness {:g}'.format(frame.generation, frame.step, frame.fitness))
+    if frame.game == 'rubik':
+        cube = GameStateRubik(frame.width, scramble_moves=0)
+        cube.stickers[:] = frame.cells
+        cube.visual()
+        return
+
+    rows = ['=' * frame.width]
+    for j in range(frame.height - 1, -1, -1):
+        rows.append(''.join('#' if cell else '-' for cell in frame.cells[:, j]))
+    rows.append('=' * frame.width)
+    print('\n'.join(rows))
+
+
+class FramePublisher:
+    """Publishes frames to a viewer through a local UDP socket.
+
+    Publishing never blocks: frames are dropped when they come faster than
+    ``max_fps`` or the socket is not ready, and nobody has to be listening.
+    Frames are watched with ``watch``, e.g. ``python main.py view``.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, max_fps: float = 30.0):
+        """
+        Args:
+            host (str): Host of the viewer.
+            port (int): UDP port of the viewer.
+            max_fps (float): Maximum frames published per second.
+        """
+        self.address = (host, port)
+        self.min_interval = 1.0 / max_fps
+        self.generation = 0
+        self.sent = 0
+        self.dropped = 0
+        self._last = -np.inf
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def publish(self, game_state: GameState, step: int = 0, fitness: float = 0.0) -> bool:
+        """Publishes the frame of a game state, unless it comes too soon after
+        the previous one.
+
+        Args:
+            game_state (GameState): Game state to publish.
+            step (int): Simulation step.
+            fitness (float): Fitness accumulated.
+
+        Returns:
+            bool: True if the frame was sent, False if it was dropped.
+        """
+        now = time.monotonic()
+        if now - self._last < self.min_interval:
+            self.dropped += 1
+            return False
+
+        try:
+            self._socket.sendto(capture(game_state, self.generation, step, fitness).to_bytes(), self.address)
+        except OSError:
+            self.dropped += 1
+            return False
+
+        self._last = now
+        self.sent += 1
+        return True
+
+    def close(self):
+        """Closes the socket.
+        """
+        self._socket.close()
+
+
+class LiveViewReporter(BaseReporter):
+    """Plays the best genome of the latest generation in a background thread,
+    publishing its frames to a live viewer.
+
+    The game is paced by ``frame_delay``, so the thread is idle most of the
+    time and the evaluation is not slowed down. When a game ends, the best
+    genome of the latest generation evaluated meanwhile is played, so
+    generations evaluated during a game are skipped.
+    """
+    def __init__(self,
+                 evaluator,
+                 publisher: FramePublisher,
+                 seed: Optional[int] = None,
+                 frame_delay: float = 0.05,
+                 max_game_time: Optional[float] = 60.0):
+        """
+        Args:
+            evaluator (neattetris.evaluation.Evaluator): Evaluator of the
+                run, which creates the games.
+            publisher (FramePublisher): Publisher of the frames.
+            seed (Optional[int]): Seed of the games shown, the first seed of
+                the evaluator by default.
+            frame_delay (float): Seconds between the frames of a game.
+            max_game_time (Optional[float]): Maximum seconds a game is shown.
+        """
+        self.evaluator = evaluator
+        self.publisher = publisher
+        self.seed = evaluator.seeds[0] if seed is None else seed
+        self.frame_delay = frame_delay
+        self.max_game_time = max_game_time
+        self.generation = 0
+        self._pending: Optional[Tuple[int, object, object]] = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        with self._condition:
+            self._pending = (self.generation, best_genome, config)
+            self._condition.notify()
+
+    def _run(self):
+        """Plays the pending genomes until the reporter is closed.
+        """
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                generation, genome, config = self._pending
+                self._pending = None
+
+            net = CompiledNetwork.create(genome, config)
+            simulator, state = self.evaluator.game(self.seed)
+            simulator.profiler = None
+            simulator.publisher = self.publisher
+            simulator.frame_delay = self.frame_delay
+            simulator.max_time = self.max_game_time
+            self.publisher.generation = generation
+            simulator.simulation(net, state)
+
+    def close(self):
+        """Stops the thread once the game being shown ends. The thread does
+        not keep the process alive.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+
+class _FrameProtocol(asyncio.DatagramProtocol):
+    """Keeps the latest frame received.
+    """
+    def __init__(self):
+        self.frame: Optional[Frame] = None
+        self.received = asyncio.Event()
+
+    def datagram_received(self, data, addr):
+        try:
+            self.frame = Frame.from_bytes(data)
+        except ValueError:
+            return
+        self.received.set()
+
+
+async def watch(host: str = '127.0.0.1',
+                port: int = DEFAULT_PORT,
+                max_fps: float = 20.0,
+                frames: Optional[int] = None,
+                clear: bool = True) -> Optional[Frame]:
+    """Shows the frames published by a ``FramePublisher``, always the latest
+    one, so a slow terminal only skips frames.
+
+    Args:
+        host (str): Host the viewer listens on.
+        port (int): UDP port the viewer listens on.
+        max_fps (float): Maximum frames shown per second.
+        frames (Optional[int]): Frames shown before returning, forever if
+            None.
+        clear (bool): If the terminal is cleared before every frame.
+
+    Returns:
+        Optional[Frame]: Last frame shown.
+    """
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(_FrameProtocol, local_addr=(host, port))
+    frame = None
+    try:
+        shown = 0
+        while frames is None or shown < frames:
+            await protocol.received.wait()
+            protocol.received.clear()
+            frame = protocol.frame
+            if clear:
+                print(_CLEAR_SCREEN, end='')
+            show(frame)
+            shown += 1
+            await asyncio.sleep(1.0 / max_fps)
+    finally:
+        transport.close()
+
+    return frame
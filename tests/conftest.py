@@ -0,0 +1,57 @@
+import os
+import neat
+import numpy as np
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config(name: str = 'config') -> neat.Config:
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                       os.path.join(ROOT, name))
+
+
+def play(game_state, actions: np.random.RandomState, coords: bool, steps: int = 1000) -> list:
+    """Plays random actions, returning the trace of the game."""
+    trace = []
+    for _ in range(steps):
+        if not game_state.pre_checks():
+            break
+        if coords:
+            game_state.perform_action_coords(actions.randint(0, game_state.width + 4), actions.randint(0, 4))
+            alive, delta = game_state.post_checks(no_gravity=True)
+        else:
+            game_state.perform_action(actions.randint(0, 5))
+            alive, delta = game_state.post_checks()
+        trace.append((delta, game_state.active_piece_position, game_state.grid.tobytes(),
+                      game_state.data.tobytes(), game_state.hand_picked_data.tobytes()))
+        if not alive:
+            break
+    return trace
+
+
+class LinearNet:
+    """Random linear network, deterministic for a seed."""
+    def __init__(self, n_inputs: int, n_outputs: int, seed: int = 0):
+        self.weights = np.random.default_rng(seed).normal(size=(n_inputs, n_outputs))
+
+    def activate(self, inputs):
+        return np.asarray(inputs) @ self.weights
+
+
+@pytest.fixture(scope='session')
+def config() -> neat.Config:
+    return load_config()
+
+
+@pytest.fixture
+def genomes(config) -> list:
+    """(genome_id, genome) pairs of a population with mutated networks."""
+    population = neat.Population(config)
+    items = sorted(population.population.items())[:24]
+    rng = np.random.RandomState(0)
+    for _, genome in items:
+        for _ in range(rng.randint(0, 30)):
+            genome.mutate(config.genome_config)
+    return items
@@ -0,0 +1,36 @@
+import pytest
+from conftest import LinearNet
+from neattetris.evaluation import TetrisEvaluator
+from neattetris.gamestates import GameStateTetris, GameStateTetrisBitboard
+from neattetris.simulator import BatchSimulator, CoordSimulator
+
+
+SEEDS = [0, 1, (5, 2)]
+
+
+@pytest.mark.parametrize('size', [(10, 20), (6, 12)])
+@pytest.mark.parametrize('max_pieces', [None, 20])
+def test_batch_fitness_matches_coord_simulator(size, max_pieces):
+    width, height = size
+    n_inputs = len(GameStateTetris(width, height).hand_picked_data)
+    nets = [LinearNet(n_inputs, width + 8, seed) for seed in range(8)]
+    games = [(net, seed) for net in nets for seed in SEEDS]
+
+    simulator = BatchSimulator(width, height, max_pieces=max_pieces)
+    fitnesses = simulator.simulation([net for net, _ in games], [seed for _, seed in games])
+    for engine in (GameStateTetris, GameStateTetrisBitboard):
+        expected = []
+        truncated = []
+        for net, seed in games:
+            coord = CoordSimulator(max_pieces=max_pieces)
+            expected.append(coord.simulation(net, engine(width, height, seed=seed)))
+            truncated.append(coord.truncated)
+        assert fitnesses.tolist() == expected
+        assert simulator.truncated.tolist() == truncated
+
+
+def test_batch_evaluator_matches_sequential_evaluator(config, genomes):
+    batch = TetrisEvaluator(seeds=SEEDS, max_pieces=80, batch=True)
+    sequential = TetrisEvaluator(seeds=SEEDS, max_pieces=80, early_cutoff=False)
+    for _, genome in genomes:
+        assert batch(genome, config) == sequential(genome, config)
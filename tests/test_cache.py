@@ -0,0 +1,48 @@
+import copy
+import pytest
+from neattetris.cache import FitnessCache, genome_key
+from neattetris.evaluation import TetrisEvaluator
+from neattetris.parallel import ParallelEvaluator, SharedMemoryEvaluator
+
+
+def test_save_and_load_round_trip(tmp_path):
+    cache = FitnessCache()
+    for i in range(50):
+        cache.put(FitnessCache.key(bytes([i]) * 16, i, 'game'), float(i) / 3)
+    path = str(tmp_path / 'cache.npz')
+    cache.save(path)
+
+    loaded = FitnessCache(path=path)
+    assert list(loaded.entries.items()) == list(cache.entries.items())
+
+
+def test_genome_key_ignores_fitness_and_id(config, genomes):
+    _, genome = genomes[-1]
+    clone = copy.deepcopy(genome)
+    clone.key += 1000
+    clone.fitness = 123.0
+    assert genome_key(clone) == genome_key(genome)
+
+    connection = next(iter(clone.connections.values()))
+    connection.weight += 1.0
+    assert genome_key(clone) != genome_key(genome) or not connection.enabled
+
+
+@pytest.mark.parametrize('evaluator_type', [ParallelEvaluator, SharedMemoryEvaluator])
+def test_parallel_evaluation_uses_the_parent_cache(config, genomes, evaluator_type):
+    seeds = [0, 1]
+    expected = [TetrisEvaluator(seeds=seeds, max_pieces=30)(genome, config) for _, genome in genomes]
+
+    cache = FitnessCache()
+    with evaluator_type(TetrisEvaluator(seeds=seeds, max_pieces=30, cache=cache), num_workers=1) as evaluator:
+        evaluator.evaluate(genomes, config)
+        assert [genome.fitness for _, genome in genomes] == expected
+        assert cache.hits == 0
+        assert len(cache) == len({genome_key(genome) for _, genome in genomes}) * len(seeds)
+
+        # Every game is cached, so no genome reaches the workers
+        evaluator.pool.terminate()
+        evaluator.pool.join()
+        evaluator.evaluate(genomes, config)
+        assert [genome.fitness for _, genome in genomes] == expected
+        assert cache.misses == len(genomes) * len(seeds)
@@ -0,0 +1,66 @@
+import os
+import neat
+from conftest import load_config
+from neattetris.cache import FitnessCache
+from neattetris.checkpoint import AsyncCheckpointer
+from neattetris.evaluation import TetrisEvaluator
+
+
+class FitnessRecorder(neat.reporting.BaseReporter):
+    def __init__(self):
+        self.generations = []
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.generations.append(sorted((key, genome.fitness) for key, genome in population.items()))
+
+
+def evaluator(cache=None) -> TetrisEvaluator:
+    return TetrisEvaluator(seeds=[0, 1, 2], aggregate='min', max_pieces=30, cache=cache)
+
+
+def test_resume_replays_the_same_generations(tmp_path):
+    config = load_config()
+    config.pop_size = 20
+    population = neat.Population(config)
+    stats = neat.StatisticsReporter()
+    cache = FitnessCache()
+    recorder = FitnessRecorder()
+    population.add_reporter(stats)
+    population.add_reporter(recorder)
+    full = evaluator(cache)
+    prefix = str(tmp_path / 'checkpoint-')
+    with AsyncCheckpointer(population, 1, prefix=prefix, stats=stats, cache=cache, evaluator=full) as checkpointer:
+        population.add_reporter(checkpointer)
+        population.run(full.evaluate, 5)
+
+    restored, restored_stats, restored_cache, best_fitness = AsyncCheckpointer.restore(prefix + '3')
+    assert len(restored_stats.most_fit_genomes) == 3
+    assert 0 < len(restored_cache) <= len(cache)
+    resumed = evaluator(restored_cache)
+    resumed.best_fitness = best_fitness
+    resumed_recorder = FitnessRecorder()
+    restored.add_reporter(resumed_recorder)
+    restored.run(resumed.evaluate, 2)
+
+    assert resumed_recorder.generations == recorder.generations[3:]
+
+
+def test_resumed_run_keeps_the_checkpoint_interval(tmp_path):
+    config = load_config()
+    config.pop_size = 10
+    population = neat.Population(config)
+    run = evaluator()
+    prefix = str(tmp_path / 'checkpoint-')
+    with AsyncCheckpointer(population, 2, prefix=prefix, evaluator=run) as checkpointer:
+        population.add_reporter(checkpointer)
+        population.run(run.evaluate, 4)
+
+    restored, _, _, best_fitness = AsyncCheckpointer.restore(prefix + '4')
+    resumed = evaluator()
+    resumed.best_fitness = best_fitness
+    with AsyncCheckpointer(restored, 2, prefix=prefix, evaluator=resumed) as checkpointer:
+        restored.add_reporter(checkpointer)
+        restored.run(resumed.evaluate, 5)
+
+    assert sorted(os.listdir(tmp_path), key=lambda name: int(name[len('checkpoint-'):])) == \
+        ['checkpoint-2', 'checkpoint-4', 'checkpoint-6', 'checkpoint-8']
@@ -0,0 +1,60 @@
+import socket
+import threading
+import pytest
+from neattetris.cache import FitnessCache
+from neattetris.distributed import DistributedEvaluator, run_worker
+from neattetris.evaluation import TetrisEvaluator
+
+
+def start_worker(address, authkey=b'key') -> threading.Thread:
+    thread = threading.Thread(target=run_worker, args=(address, authkey), daemon=True)
+    thread.start()
+    return thread
+
+
+def test_empty_authkey_is_refused():
+    evaluator = TetrisEvaluator(max_pieces=10)
+    with pytest.raises(ValueError):
+        DistributedEvaluator(evaluator, ('127.0.0.1', 0), b'')
+    with pytest.raises(ValueError):
+        run_worker(('127.0.0.1', 1), b'')
+
+
+def test_wrong_authkey_is_rejected():
+    with DistributedEvaluator(TetrisEvaluator(max_pieces=10), ('127.0.0.1', 0), b'key') as coordinator:
+        with pytest.raises(Exception):
+            run_worker(coordinator.address, b'other')
+
+
+def test_matches_serial_evaluation_with_a_stalled_client(config, genomes):
+    evaluator = TetrisEvaluator(seeds=[0, 1], max_pieces=40)
+    expected = [evaluator(genome, config) for _, genome in genomes]
+
+    with DistributedEvaluator(evaluator, ('127.0.0.1', 0), b'key', lease_size=3, timeout=60) as coordinator:
+        # Connects and never answers the authentication challenge
+        stalled = socket.create_connection(coordinator.address)
+        workers = [start_worker(coordinator.address) for _ in range(2)]
+        coordinator.evaluate(genomes, config)
+        assert [genome.fitness for _, genome in genomes] == expected
+        stalled.close()
+
+    for worker in workers:
+        worker.join(10)
+        assert not worker.is_alive()
+
+
+def test_cache_stays_in_the_coordinator(config, genomes):
+    expected = [TetrisEvaluator(max_pieces=40)(genome, config) for _, genome in genomes]
+    cache = FitnessCache()
+    with DistributedEvaluator(TetrisEvaluator(max_pieces=40, cache=cache), ('127.0.0.1', 0), b'key') as coordinator:
+        worker = start_worker(coordinator.address)
+        coordinator.evaluate(genomes, config)
+        assert [genome.fitness for _, genome in genomes] == expected
+        assert len(cache) and not cache.hits
+
+        coordinator.evaluate(genomes, config)
+        assert [genome.fitness for _, genome in genomes] == expected
+        assert cache.hits == len(genomes)
+
+    worker.join(10)
+    assert not worker.is_alive()
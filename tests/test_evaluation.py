@@ -0,0 +1,53 @@
+import pytest
+from neattetris.evaluation import TetrisEvaluator
+from neattetris.parallel import ParallelEvaluator, SharedMemoryEvaluator
+
+
+SEEDS = [0, 1, 2, 3]
+
+
+def evaluator(**kwargs) -> TetrisEvaluator:
+    return TetrisEvaluator(seeds=SEEDS, aggregate='min', max_pieces=40, **kwargs)
+
+
+def fitnesses(genomes) -> list:
+    return [genome.fitness for _, genome in genomes]
+
+
+def test_cut_off_fitness_never_exceeds_the_games_played(config, genomes):
+    full = [evaluator(early_cutoff=False)(genome, config) for _, genome in genomes]
+    first = [TetrisEvaluator(seeds=SEEDS[:1], max_pieces=40)(genome, config) for _, genome in genomes]
+    elite = sorted(full)[len(full) // 2]
+    cut = [evaluator()(genome, config, elite) for _, genome in genomes]
+
+    assert cut != full
+    for cut_fitness, fitness, first_fitness in zip(cut, full, first):
+        # Cut off genomes keep at most the score of the games they played
+        assert cut_fitness == fitness or cut_fitness <= min(elite, first_fitness)
+
+
+@pytest.mark.parametrize('evaluator_type', [ParallelEvaluator, SharedMemoryEvaluator])
+def test_parallel_matches_serial_with_early_cutoff(config, genomes, evaluator_type):
+    serial = evaluator()
+    expected = []
+    for _ in range(2):
+        serial.evaluate(genomes, config)
+        expected.append(fitnesses(genomes))
+
+    with evaluator_type(evaluator(), num_workers=1, elite_cutoff=True) as parallel:
+        for generation in expected:
+            parallel.evaluate(genomes, config)
+            assert fitnesses(genomes) == generation
+
+
+def test_mean_cuts_off_with_the_pieces_bound(config, genomes):
+    mean = TetrisEvaluator(seeds=SEEDS[:2], max_pieces=40)
+    bound = mean.max_seed_fitness
+    assert bound < float('inf')
+
+    for _, genome in genomes:
+        fitness, played = mean.games(genome, config)
+        assert len(played) == 2 and max(played.values()) <= bound
+        # The remaining game cannot lift the mean above the elite
+        fitness, played = mean.games(genome, config, bound - 1)
+        assert list(played) == [0] and fitness <= bound - 1
@@ -0,0 +1,138 @@
+import copy
+import pickle
+import numpy as np
+import pytest
+from conftest import play
+from neattetris.gamestates import GameStateTetris, GameStateTetrisBitboard
+
+
+@pytest.mark.parametrize('coords', [True, False])
+@pytest.mark.parametrize('size', [(10, 20), (6, 12), (4, 14)])
+def test_bitboard_engine_matches_numpy_engine(coords, size):
+    for seed in range(8):
+        width, height = size
+        expected = play(GameStateTetris(width, height, seed=seed), np.random.RandomState(seed), coords)
+        actual = play(GameStateTetrisBitboard(width, height, seed=seed), np.random.RandomState(seed), coords)
+        assert actual == expected
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+def test_incremental_features_match_grid(engine):
+    state = engine(10, 20, seed=3)
+    actions = np.random.RandomState(3)
+    for _ in range(300):
+        if not state.pre_checks():
+            break
+        state.perform_action_coords(actions.randint(0, 14), actions.randint(0, 4))
+        alive, _ = state.post_checks(no_gravity=True)
+        grid = np.asarray(state.grid, dtype=bool)
+        heights = [int(np.flatnonzero(column)[-1]) + 1 if column.any() else 0 for column in grid]
+        assert state.heights == heights
+        assert state.col_fills == grid.sum(axis=1).tolist()
+        assert state.row_fills == grid.sum(axis=0).tolist()
+        if not alive:
+            break
+
+
+def fingerprint(state) -> tuple:
+    return (state.grid.tobytes(), state.data.tobytes(), state.hand_picked_data.tobytes(), tuple(state.heights),
+            tuple(state.col_fills), tuple(state.row_fills), state.active_piece_id, state.active_rotation,
+            state.active_piece_position, state.piece_index, state.lines_cleared, state.pieces_placed)
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+def test_make_unmake_and_snapshot_restore_are_identities(engine):
+    state = engine(6, 12, seed=5)
+    actions = np.random.RandomState(5)
+    for _ in range(200):
+        if not state.pre_checks():
+            break
+        before = fingerprint(state)
+        snapshot = state.snapshot()
+        for _ in range(3):
+            state.make_move(actions.randint(0, 10), actions.randint(0, 4))
+        for _ in range(3):
+            state.unmake_move()
+        assert fingerprint(state) == before
+
+        state.make_move(actions.randint(0, 10), actions.randint(0, 4))
+        state.restore(snapshot)
+        assert fingerprint(state) == before
+
+        alive, _ = state.make_move(actions.randint(0, 10), actions.randint(0, 4))
+        if not alive:
+            break
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+@pytest.mark.parametrize('duplicate', [copy.deepcopy, lambda state: pickle.loads(pickle.dumps(state))])
+def test_copies_read_their_own_data(engine, duplicate):
+    state = engine(10, 20, seed=2)
+    state.data
+    clone = duplicate(state)
+    reference = engine(10, 20, seed=2)
+    original = fingerprint(state)
+    actions = np.random.RandomState(2)
+    for _ in range(20):
+        x, rotation = actions.randint(0, 14), actions.randint(0, 4)
+        clone.make_move(x, rotation)
+        reference.make_move(x, rotation)
+        assert fingerprint(clone) == fingerprint(reference)
+    assert fingerprint(state) == original
+
+
+def legacy_place(state, x_pos: int, rotation: int):
+    """Coordinate placement made of single moves, as before the direct
+    placement."""
+    for _ in range(rotation):
+        state._rotate(1)
+    delta_x = x_pos - 2 - state.active_piece_position[0]
+    for _ in range(abs(delta_x)):
+        state._move(int(np.sign(delta_x)))
+    while state._move_down():
+        continue
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+@pytest.mark.parametrize('size', [(10, 20), (6, 8)])
+def test_direct_placement_matches_single_moves(engine, size):
+    for seed in range(4):
+        state = engine(*size, seed=seed)
+        actions = np.random.RandomState(seed)
+        for _ in range(300):
+            if not state.pre_checks():
+                break
+            x_pos, rotation = actions.randint(0, state.width + 4), actions.randint(0, 4)
+            legacy = copy.deepcopy(state)
+            legacy_place(legacy, x_pos, rotation)
+            state.perform_action_coords(x_pos, rotation)
+            assert (state.active_piece_position, state.active_rotation) == \
+                (legacy.active_piece_position, legacy.active_rotation)
+            alive, _ = state.post_checks(no_gravity=True)
+            if not alive:
+                break
+
+
+def overlay(state) -> np.ndarray:
+    """Grid with the filled cells of the active piece, flattened."""
+    grid = np.array(state.grid, dtype=float)
+    x, y = state.active_piece_position
+    for i, j in zip(*np.nonzero(state.active_piece)):
+        grid[x + i, y + j] = 1
+    return grid.ravel()
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+def test_data_overlays_the_active_piece(engine):
+    state = engine(8, 16, seed=6)
+    actions = np.random.RandomState(6)
+    for _ in range(2000):
+        if not state.pre_checks():
+            break
+        data = state.data
+        assert np.array_equal(data, overlay(state))
+        assert not data.flags.writeable
+        state.perform_action(actions.randint(0, 5))
+        alive, _ = state.post_checks()
+        if not alive:
+            break
@@ -0,0 +1,40 @@
+import neat
+import numpy as np
+from neattetris.cache import genome_key
+from neattetris.nn import CompiledNetwork, genome_from_array, genome_to_array
+
+
+ACTIVATIONS = ['sigmoid', 'tanh', 'relu', 'identity', 'clamped', 'gauss', 'sin', 'abs']
+AGGREGATIONS = ['sum', 'product', 'max', 'min', 'maxabs', 'median', 'mean']
+
+
+def diversify(genomes) -> list:
+    """Gives the nodes of the genomes a variety of activation and
+    aggregation functions."""
+    rng = np.random.RandomState(1)
+    for _, genome in genomes:
+        for node in genome.nodes.values():
+            node.activation = ACTIVATIONS[rng.randint(len(ACTIVATIONS))]
+            node.aggregation = AGGREGATIONS[rng.randint(len(AGGREGATIONS))]
+    return genomes
+
+
+def test_compiled_network_matches_feed_forward_network(config, genomes):
+    inputs = np.random.RandomState(0).uniform(-1, 1, size=(16, config.genome_config.num_inputs))
+    for _, genome in diversify(genomes):
+        expected = neat.nn.FeedForwardNetwork.create(genome, config)
+        net = CompiledNetwork.create(genome, config)
+        rows = [expected.activate(row) for row in inputs]
+        np.testing.assert_allclose(net.activate_batch(inputs), rows, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(net.activate(inputs[0]), rows[0], rtol=1e-9, atol=1e-12)
+
+
+def test_genome_array_round_trip(config, genomes):
+    inputs = np.random.RandomState(0).uniform(-1, 1, size=(8, config.genome_config.num_inputs))
+    for _, genome in diversify(genomes):
+        decoded = genome_from_array(genome_to_array(genome, config), config)
+        assert decoded.key == genome.key
+        assert genome_key(decoded) == genome_key(genome)
+        assert set(decoded.connections) == {key for key, gene in genome.connections.items() if gene.enabled}
+        assert np.array_equal(CompiledNetwork.create(decoded, config).activate_batch(inputs),
+                              CompiledNetwork.create(genome, config).activate_batch(inputs))
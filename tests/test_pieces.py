@@ -0,0 +1,45 @@
+import random
+import numpy as np
+import pytest
+from conftest import play
+from neattetris.gamestates import GameStateTetris, GameStateTetrisBitboard
+from neattetris.gamestates.gamestate_tetris import piece_sequence
+
+
+def legacy_sequence(seed: int, n_bags: int) -> list:
+    """Pieces dealt before the sequences were pregenerated: bags shuffled
+    by a private random.Random and dealt from their end."""
+    rng = random.Random(seed)
+    pieces = []
+    for _ in range(n_bags):
+        bag = list(range(7))
+        rng.shuffle(bag)
+        pieces.extend(reversed(bag))
+    return pieces
+
+
+@pytest.mark.parametrize('seed', [0, 1, 12345])
+def test_integer_seeds_deal_the_legacy_pieces(seed):
+    assert piece_sequence(seed, 30).tolist() == legacy_sequence(seed, 30)
+
+
+@pytest.mark.parametrize('seed', [0, 7, (0,), (3, 1, 4, 1), (2 ** 63, 5)])
+def test_longer_sequences_start_with_shorter_ones(seed):
+    long = piece_sequence(seed, 200)
+    for n_bags in (1, 63, 64, 65, 130):
+        assert np.array_equal(piece_sequence(seed, n_bags), long[:n_bags * 7])
+    assert (np.sort(long.reshape(-1, 7), axis=1) == np.arange(7)).all()
+    assert not long.flags.writeable
+
+
+def test_tuple_seeds_are_independent():
+    assert not np.array_equal(piece_sequence((1, 2), 10), piece_sequence((2, 1), 10))
+    assert not np.array_equal(piece_sequence((1,), 10), piece_sequence(1, 10))
+
+
+@pytest.mark.parametrize('engine', [GameStateTetris, GameStateTetrisBitboard])
+@pytest.mark.parametrize('seed', [4, (4, 2)])
+def test_games_extend_short_sequences(engine, seed):
+    short = engine(6, 30, seed=seed, pieces=piece_sequence(seed, 1))
+    long = engine(6, 30, seed=seed, pieces=piece_sequence(seed, 100))
+    assert play(short, np.random.RandomState(0), True) == play(long, np.random.RandomState(0), True)
@@ -0,0 +1,43 @@
+import struct
+import numpy as np
+from neattetris.evaluation import TetrisEvaluator
+from neattetris.nn import CompiledNetwork
+from neattetris.profiling import SimulationProfiler
+from neattetris.recording import EliteRecorder, Episode, read_episodes
+from neattetris.simulator.replay import EpisodeReplayer
+
+
+def test_elite_games_with_tuple_seeds_replay(config, genomes, tmp_path):
+    seeds = [3, (7, 1, 2, 0), (2 ** 63 + 5, 4)]
+    evaluator = TetrisEvaluator(seeds=seeds, max_pieces=40)
+    path = str(tmp_path / 'episodes')
+    _, genome = genomes[-1]
+    EliteRecorder(evaluator, path).post_evaluate(config, dict(genomes), None, genome)
+
+    episodes = read_episodes(path)
+    assert [episode.seed for episode in episodes] == seeds
+    net = CompiledNetwork.create(genome, config)
+    for episode, seed in zip(episodes, seeds):
+        assert episode.fitness == evaluator.play(net, seed)
+        assert EpisodeReplayer(episode).replay() == episode.fitness
+
+
+def test_elite_games_are_not_profiled(config, genomes, tmp_path):
+    profiler = SimulationProfiler()
+    evaluator = TetrisEvaluator(seeds=[0, 1], max_pieces=40, profiler=profiler)
+    _, genome = genomes[-1]
+    EliteRecorder(evaluator, str(tmp_path / 'episodes')).post_evaluate(config, dict(genomes), None, genome)
+
+    assert profiler.episodes == [] and sum(profiler.calls) == 0
+
+
+def test_version_1_episodes_are_read():
+    pieces = np.array([1, 2], dtype=np.uint8)
+    decisions = np.array([[3, 1], [4, 0]], dtype=np.uint8)
+    buffer = struct.pack('<4sBBBHHqdII', b'NTEP', 1, 0, 1, 10, 20, 9, 12.5, 2, 2) + pieces.tobytes() \
+        + decisions.tobytes()
+    episode, offset = Episode.from_bytes(buffer)
+    assert offset == len(buffer)
+    assert (episode.game, episode.action_format, episode.width, episode.height, episode.seed, episode.fitness) \
+        == ('tetris', 'coords', 10, 20, 9, 12.5)
+    assert episode.decisions.tolist() == decisions.tolist()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from neattetris.gamestates import GameStateRubik
+from neattetris.gamestates.gamestate_rubik import _move_tables
+
+
+@pytest.mark.parametrize('size', [2, 3, 4])
+def test_quarter_turns_are_cube_permutations(size):
+    tables = _move_tables(size)
+    identity = np.arange(6 * size * size)
+    for face in range(6):
+        clockwise, counter = tables[2 * face], tables[2 * face + 1]
+        assert np.array_equal(np.sort(clockwise), identity)
+        assert np.array_equal(clockwise[counter], identity)
+        assert np.array_equal(clockwise[clockwise][clockwise][clockwise], identity)
+        # The face and one ring of stickers on its four neighbours move
+        moved = np.count_nonzero(clockwise != identity)
+        assert moved == size * size - (size % 2) + 4 * size
+
+    # Opposite faces commute
+    for face, opposite in ((0, 5), (1, 3), (2, 4)):
+        assert np.array_equal(tables[2 * face][tables[2 * opposite]], tables[2 * opposite][tables[2 * face]])
+
+
+@pytest.mark.parametrize('size', [2, 3])
+def test_turns_match_tables_and_batches(size):
+    state = GameStateRubik(size, seed=1, scramble_moves=0)
+    rng = np.random.RandomState(size)
+    moves = rng.randint(0, 12, size=60)
+    batch = np.tile(state.stickers, (len(moves), 1))
+    for i, move in enumerate(moves):
+        expected = state.stickers[_move_tables(size)[move]]
+        batch[i:] = GameStateRubik.turn_batch(batch[i:], np.full(len(moves) - i, move))
+        state.perform_action(move)
+        assert np.array_equal(state.stickers, expected)
+        assert np.array_equal(batch[i], state.stickers)
+        assert state.matches == np.count_nonzero(state.stickers == np.repeat(np.arange(6), size * size))
+
+    for move in reversed(moves):
+        state.perform_action(move ^ 1)
+    assert state.solved
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from neattetris.gamestates import GameStateTetrisBitboard
+from neattetris.simulator.search_simulator import SearchSimulator, _SearchBoard, _leaf_features, _placement_tables
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_placements_match_the_engine(seed):
+    """Search boards and leaf features agree with the engine on landing,
+    line clears and game over, including landings on the spawn row."""
+    rng = np.random.RandomState(seed)
+    state = GameStateTetrisBitboard(6, 10, seed=seed)
+    tables = _placement_tables(state.width, state.height)
+    game_overs = 0
+    while game_overs < 20:
+        table = tables[state.active_piece_id]
+        p = rng.randint(len(table.xs))
+        board = _SearchBoard(state)
+        _, legal, _ = _leaf_features(np.array([board.heights]), np.array([board.col_fills]),
+                                     np.array([board.row_fills + [0] * 4]), np.zeros(1), table, state.height)
+        record = board.place(table.pieces[p], table.xs[p], table.spawns[p])
+        assert legal[0, p] == (record is not None)
+
+        snapshot = state.snapshot()
+        reachable = state.perform_action_coords(table.xs[p] + 2, table.rotations[p])
+        alive, _ = state.post_checks(no_gravity=True)
+        if reachable:
+            assert alive == (record is not None)
+            if alive:
+                assert board.rows == list(state.rows)
+        if not alive:
+            # Keep playing from the board before the game over
+            game_overs += 1
+            state.restore(snapshot)
+            if not state.pre_checks():
+                break
+
+
+def test_two_plies_fall_back_to_one_without_a_follow_up():
+    """An O piece still fits on top of a nearly full board, while no S piece
+    fits after it, so the 2-ply search scores the 1-ply boards."""
+    width, height, stack = 6, 10, 7
+    state = GameStateTetrisBitboard(width, height, pieces=np.array([3, 4] * 8, dtype=np.uint8))
+    state.pre_checks()
+    # Full rows except for the first column, so no row is cleared
+    state.rows = [state.full_row & ~1] * stack + [0] * (height - stack)
+    state.heights = [0] + [stack] * (width - 1)
+    state.col_fills = [0] + [stack] * (width - 1)
+    state.row_fills = [width - 1] * stack + [0] * (height - stack)
+
+    one = SearchSimulator(plies=1)
+    two = SearchSimulator(plies=2)
+    one.game_state = two.game_state = state
+    expected = one._inputs()
+    assert len(expected)
+    assert np.array_equal(two._inputs(), expected)
+    assert np.array_equal(two._candidates, one._candidates)
+    output = np.arange(len(expected))
+    assert two._decision(output) == one._decision(output)
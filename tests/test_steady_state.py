@@ -0,0 +1,71 @@
+import neat
+import pytest
+from neat.population import CompleteExtinctionException
+from conftest import load_config
+from neattetris.steady_state import SteadyStateEvolution
+
+
+def constant_fitness(genome, config) -> float:
+    return 1.0
+
+
+def size_fitness(genome, config) -> float:
+    return float(len(genome.connections))
+
+
+class Recorder(neat.reporting.BaseReporter):
+    def __init__(self):
+        self.stagnant = []
+        self.populations = []
+
+    def species_stagnant(self, sid, species):
+        self.stagnant.append(sid)
+
+    def end_generation(self, config, population, species_set):
+        self.populations.append({key: genome.fitness for key, genome in population.items()})
+
+
+def small_config(compatibility_threshold: float = 3.0, **stagnation) -> neat.Config:
+    config = load_config()
+    config.pop_size = 20
+    config.no_fitness_termination = True
+    config.species_set_config.compatibility_threshold = compatibility_threshold
+    for name, value in stagnation.items():
+        setattr(config.stagnation_config, name, value)
+    return config
+
+
+def test_stagnant_species_are_removed():
+    config = small_config(0.5, max_stagnation=1, species_elitism=1)
+    population = neat.Population(config)
+    recorder = Recorder()
+    population.add_reporter(recorder)
+    evolution = SteadyStateEvolution(population, size_fitness, num_workers=1, max_in_flight=4, seed=0)
+    evolution.run(6)
+
+    assert recorder.stagnant
+    assert not set(recorder.stagnant) & set(population.species.species)
+    for key, genome in evolution._members.items():
+        assert population.species.genome_to_species[key] in population.species.species
+
+
+def test_complete_extinction_without_reset():
+    config = small_config(max_stagnation=1)
+    config.reset_on_extinction = False
+    population = neat.Population(config)
+    evolution = SteadyStateEvolution(population, constant_fitness, num_workers=1, max_in_flight=4, seed=0)
+    with pytest.raises(CompleteExtinctionException):
+        evolution.run(10)
+
+
+def test_checkpointed_population_holds_genomes_in_flight():
+    config = small_config()
+    population = neat.Population(config)
+    recorder = Recorder()
+    population.add_reporter(recorder)
+    SteadyStateEvolution(population, size_fitness, num_workers=1, max_in_flight=4, seed=0).run(3)
+
+    for fitnesses in recorder.populations:
+        # The genome completing the generation has just left the workers
+        assert sum(fitness is not None for fitness in fitnesses.values()) == config.pop_size
+        assert sum(fitness is None for fitness in fitnesses.values()) == 3